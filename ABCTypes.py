@@ -10,9 +10,13 @@ from collections import OrderedDict
 from typing import Any
 from typing import Callable
 
+from CommandTypes import Commands
 from Configuration import CompileConfiguration
 from Configuration import GlobalConfiguration
+from DispatchTools import AdapterTable
+from DispatchTools import GeneratorTable
 from ParameterTypes import ABCParameter
+from ScoreboardTools import SymbolTable
 
 
 class ABCNamespace(ABC):
@@ -29,6 +33,7 @@ class ABCNamespace(ABC):
         self._base_ns = base_namespace
         self.namespace_tree: OrderedDict[str, OrderedDict[str, ...]] = OrderedDict()
         self.temp_ns: OrderedDict[str, list[str]] = OrderedDict()
+        self.temp_reserved: dict[str, set[str]] = {}
 
     @abstractmethod
     def split_base(self, namespace: str) -> tuple[str, str]:
@@ -89,6 +94,20 @@ class ABCNamespace(ABC):
         :rtype: None
         """
 
+    @abstractmethod
+    def alloc_temp(self, namespace: str) -> str:
+        """
+        预留一个当前未被使用的MCF运行时临时命名空间 (寄存器)
+
+        写入值后调用 append_temp 添加到临时命名空间存储 (调用函数时会被保存),
+        使用完毕后调用 remove_temp 释放, 释放后可以被同一命名空间下的其他表达式复用
+
+        :param namespace: 存储目标命名空间
+        :type namespace: str
+        :return: MCF运行时临时命名空间
+        :rtype: str
+        """
+
     @abstractmethod
     def init_root(self, namespace: str, ns_type: str) -> None:
         """
@@ -162,20 +181,26 @@ class ABCNamespace(ABC):
     def store_local(
             self,
             g_conf: GlobalConfiguration,
-            comment_gen: Callable[[str], str],
-            namespace: str
-    ) -> tuple[str, str]:
+            comment_gen: Callable[[str], Commands],
+            namespace: str,
+            live_names: set[str] | None = None,
+            frame: bool = False
+    ) -> tuple[Commands, Commands]:
         """
-        将当前命名空间下的所有变量和临时变量存储到data storage
+        将当前命名空间下的变量和临时变量存储到data storage
 
         :param g_conf: 全局配置
         :type g_conf: GlobalConfiguration
         :param comment_gen: 注释生成器
-        :type comment_gen: Callable[[str], str]
+        :type comment_gen: Callable[[str], Commands]
         :param namespace: 目标命名空间
         :type namespace: str
+        :param live_names: 只存储这些名称的变量, 为None时存储所有变量
+        :type live_names: set[str] | None
+        :param frame: 是否打包为一个复合标签压入 LocalFrames 栈
+        :type frame: bool
         :returns: (保存用命令, 加载用命令)
-        :rtype: tuple[str, str]
+        :rtype: tuple[Commands, Commands]
         """
 
 
@@ -253,11 +278,17 @@ class ABCEnvironment(ABC):
     Environment的抽象类，用于定义环境的基本行为和属性。
     """
 
-    code_generators: dict[str, dict[str, Any]]
+    code_generators: GeneratorTable
+    breakpoint_processors: AdapterTable
     namespace: ABCNamespace
     file_namespace: ABCFileNamespace
 
-    def __init__(self, c_conf: CompileConfiguration, g_conf: GlobalConfiguration = None) -> None:
+    def __init__(
+            self,
+            c_conf: CompileConfiguration,
+            g_conf: GlobalConfiguration = None,
+            symbols: SymbolTable | None = None
+    ) -> None:
         """
         初始化
 
@@ -265,16 +296,40 @@ class ABCEnvironment(ABC):
         :type c_conf: CompileConfiguration
         :param g_conf: 全局配置
         :type g_conf: GlobalConfiguration
+        :param symbols: 计分目标编码表, 为None时使用新的编码表 (共享模块的多个编译环境需要使用同一个编码表)
+        :type symbols: SymbolTable | None
         :return: None
         :rtype: None
         """
         if g_conf is None:
             g_conf = GlobalConfiguration()
+        if symbols is None:
+            symbols = SymbolTable()
         self.c_conf: CompileConfiguration = c_conf
         self.g_conf: GlobalConfiguration = g_conf
+        self.symbols: SymbolTable = symbols
 
         self.func_args: dict[str, OrderedDict[str, ABCParameter]] = {}
+        self.func_calls: dict[str, set[str]] = {}
+        """{函数命名空间: 函数中调用的函数命名空间}"""
         self._global_ids: dict[str, int] = {}
+        self.constant_pools: list[set[int]] = []
+        """正在编译的模块的常量池栈, 导入的模块的常量也会加入导入方的常量池"""
+        self.module_constants: dict[str, set[int]] = {}
+        """{模块命名空间: 模块及其导入的模块中使用的常量}, 由模块的常量初始化函数赋值"""
+        self.loaded_modules: set[str] = set()
+        """已经编译过的源码文件绝对路径"""
+        self.template_funcs: dict[str, Callable] = {}
+        """{模板函数名: 编译用函数}, 只包含本次编译导入过的模板文件中的函数"""
+        self.template_states: dict[str, dict[str, Any]] = {}
+        """{模板模块名: 模板函数编译时使用的状态}"""
+
+        self.module_cache = None
+        """模块编译缓存 (CacheTools.ModuleCache), 未启用时为None"""
+        self.profiler = None
+        """编译性能分析器 (ProfilerTools.CompileProfiler), 未启用时为None"""
+        self.import_graph: dict[str, set[str]] = {}
+        """{导入方源码文件绝对路径: 被导入的源码文件和模板文件绝对路径}"""
 
     def newID(self, name: str):
         """
@@ -291,8 +346,64 @@ class ABCEnvironment(ABC):
             self._global_ids[name] = 0
         return self._global_ids[name]
 
+    @property
+    def global_ids(self) -> dict[str, int]:
+        """
+        获取各名称最后生成的ID
+
+        :return: {名称: 最后生成的ID} 的副本
+        :rtype: dict[str, int]
+        """
+        return dict(self._global_ids)
+
+    def reserve_ids(self, ids: dict[str, int]) -> None:
+        """
+        保留已经被使用的ID, 之后 newID 只会生成更大的ID
+
+        :param ids: {名称: 已经使用的最大ID}
+        :type ids: dict[str, int]
+        :return: None
+        :rtype: None
+        """
+        for name, value in ids.items():
+            self._global_ids[name] = max(self._global_ids.get(name, value), value)
+
+    def func_may_reach(self, func_ns: str, namespace: str) -> bool:
+        """
+        检查调用函数时是否可能再次执行到当前命名空间所在的函数 (会覆盖其局部变量和临时变量)
+
+        正在编译的函数 (当前函数及其外层函数) 之后还可能调用任意函数, 执行到它们也视为可能执行到当前函数
+
+        :param func_ns: 被调用函数的命名空间
+        :type func_ns: str
+        :param namespace: 调用处的命名空间
+        :type namespace: str
+        :return: 是否可能执行到
+        :rtype: bool
+        """
+        visited: set[str] = set()
+        waiting = [func_ns]
+        while waiting:
+            ns = waiting.pop()
+            if ns in visited:
+                continue
+            visited.add(ns)
+            if ns == namespace or namespace.startswith(f"{ns}\\"):
+                return True
+            # 没有记录的函数 (如来自旧缓存) 无法确定
+            if ns not in self.func_calls:
+                return True
+            waiting.extend(self.func_calls[ns])
+        return False
+
     @abstractmethod
-    def generate_code(self, node: Any, namespace: str, file_namespace: str) -> str:
+    def generate_code(
+            self,
+            node: Any,
+            namespace: str,
+            file_namespace: str,
+            destination: tuple[str, str] | None = None
+    ) -> Commands:
         """
         为给定的节点生成MCF
 
@@ -301,8 +412,10 @@ class ABCEnvironment(ABC):
         :param namespace: 命名空间
         :type namespace: str
         :param file_namespace: 文件命名空间
-        :return: 生成的MCF
-        :rtype: str
+        :param destination: 表达式结果的保存位置 (计分目标, 计分项), 为None时保存到 {namespace}{ResultExt}
+        :type destination: tuple[str, str] | None
+        :return: 生成的命令 (代码生成器返回的字符串会被解析为命令)
+        :rtype: Commands
         """
 
     @abstractmethod
@@ -397,14 +510,16 @@ class ABCEnvironment(ABC):
         """
 
     @abstractmethod
-    def ns_store_local(self, namespace: str) -> tuple[str, str]:
+    def ns_store_local(self, namespace: str, live_names: set[str] | None = None) -> tuple[Commands, Commands]:
         """
-        将当前命名空间下的所有变量和临时变量存储到data storage
+        将当前命名空间下的变量和临时变量存储到data storage
 
         :param namespace: 目标命名空间
         :type namespace: str
+        :param live_names: 只存储这些名称的变量, 为None时存储所有变量
+        :type live_names: set[str] | None
         :returns: (保存用命令, 加载用命令)
-        :rtype: tuple[str, str]
+        :rtype: tuple[Commands, Commands]
         """
 
     @abstractmethod
@@ -444,6 +559,19 @@ class ABCEnvironment(ABC):
         :rtype: None
         """
 
+    @abstractmethod
+    def temp_ns_alloc(self, namespace: str) -> str:
+        """
+        预留一个可复用的MCF运行时临时命名空间 (寄存器)
+
+        写入值后通过 temp_ns_append 标记为存活, 直到 temp_ns_remove 释放, 调用函数时只会保存和恢复存活的寄存器
+
+        :param namespace: 存储目标命名空间
+        :type namespace: str
+        :return: MCF运行时临时命名空间
+        :rtype: str
+        """
+
     @abstractmethod
     def file_ns_init(self, file_namespace: str, level: str | None, file_ns_type: str, ns: str) -> None:
         """
@@ -544,16 +672,16 @@ class ABCEnvironment(ABC):
         """
 
     @abstractmethod
-    def COMMENT(self, *texts: str, **kv_texts: str) -> str:
+    def COMMENT(self, *texts: str, **kv_texts: str) -> Commands:
         """
-        生成注释文本 (可以安全的包含换行符)
+        生成注释 (可以安全的包含换行符)
 
         :param texts: 调试文本
         :type texts: str
         :param kv_texts: 调试键值对
         :type kv_texts: str
         :return: 生成的注释
-        :rtype: str
+        :rtype: Commands
         """
 
 
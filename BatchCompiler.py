@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# cython: language_level = 3
+"""
+使用进程池批量编译多个入口文件
+"""
+
+import fnmatch
+import functools
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+from typing import Iterable
+
+from Compiler import Compiler
+from Configuration import CompileConfiguration
+from DependencyTools import scan_dependencies
+from Environment import Environment
+from ScoreboardTools import SymbolTable
+
+SB_ID_BLOCK: int = 62 ** 3
+"""每个编译组在每个计分项中可使用的计分目标编码数量, 用于避免不同编译组之间的编码冲突"""
+
+
+def expand_entries(read_path: str, patterns: Iterable[str]) -> list[str]:
+    """
+    将入口文件名或通配符展开为入口文件名列表
+
+    :param read_path: 源码文件夹
+    :type read_path: str
+    :param patterns: 入口文件名 (不含.py后缀) 或 通配符 (如 "*", "*_test")
+    :type patterns: Iterable[str]
+    :return: 去重并排序后的入口文件名列表
+    :rtype: list[str]
+    """
+    available = sorted(
+        os.path.splitext(file)[0] for file in os.listdir(read_path)
+        if file.endswith(".py") and os.path.isfile(os.path.join(read_path, file))
+    )
+
+    entries: set[str] = set()
+    for pattern in patterns:
+        if pattern.endswith(".py"):
+            pattern = pattern[:-3]
+
+        matches = fnmatch.filter(available, pattern)
+        if not matches:
+            raise FileNotFoundError(f"没有匹配 '{pattern}' 的入口文件, 源码文件夹: {read_path}")
+        entries.update(matches)
+
+    return sorted(entries)
+
+
+def group_entries(c_conf: CompileConfiguration, entries: Iterable[str]) -> list[list[str]]:
+    """
+    将共享源码模块的入口文件分到同一组
+
+    同一个模块使用不同的编码表编译会得到不同的计分目标编码, 所以共享模块的入口文件必须使用同一个编码表依次编译
+
+    :param c_conf: 编译配置
+    :type c_conf: CompileConfiguration
+    :param entries: 入口文件名
+    :type entries: Iterable[str]
+    :return: 分组后的入口文件名
+    :rtype: list[list[str]]
+    """
+    groups: list[tuple[list[str], set[str]]] = []
+    for entry in entries:
+        dependencies = scan_dependencies(c_conf, entry)
+        group_entries_ls = [entry]
+
+        remaining = []
+        for other_entries, other_dependencies in groups:
+            if other_dependencies & dependencies:
+                group_entries_ls = other_entries + group_entries_ls
+                dependencies |= other_dependencies
+            else:
+                remaining.append((other_entries, other_dependencies))
+
+        remaining.append((group_entries_ls, dependencies))
+        groups = remaining
+
+    return sorted((sorted(group) for group, _ in groups), key=lambda g: g[0])
+
+
+def _compile_group(
+        c_conf: CompileConfiguration,
+        entries: list[str],
+        sb_id_offset: int
+) -> tuple[list[tuple[str, bool]], dict[str, set[str]]]:
+    """
+    在当前进程中依次编译一组入口文件
+
+    :param c_conf: 编译配置
+    :type c_conf: CompileConfiguration
+    :param entries: 入口文件名
+    :type entries: list[str]
+    :param sb_id_offset: 计分目标编码起始值
+    :type sb_id_offset: int
+    :return: ((入口文件名, 是否编译成功) 列表, 编译时记录的导入关系)
+    :rtype: tuple[list[tuple[str, bool]], dict[str, set[str]]]
+    """
+    # 编码超出范围时在分配编码时就会失败, 不会写入与其他编译组冲突的编码
+    symbols = SymbolTable(sb_id_offset, sb_id_offset + SB_ID_BLOCK)
+
+    results = []
+    import_graph: dict[str, set[str]] = {}
+    for entry in entries:
+        environment = Environment(c_conf, symbols=symbols)
+        results.append((entry, Compiler(environment).compile(entry)))
+        for importer, imported in environment.import_graph.items():
+            import_graph.setdefault(importer, set()).update(imported)
+
+    return results, import_graph
+
+
+class BatchCompiler:
+    def __init__(self, c_conf: CompileConfiguration, jobs: int | None = None, *, isolate: bool = False) -> None:
+        """
+        初始化批量编译器
+
+        :param c_conf: 编译配置
+        :type c_conf: CompileConfiguration
+        :param jobs: 最大进程数, 为None时使用CPU核心数, 为1时在当前进程中编译
+        :type jobs: int | None
+        :param isolate: 为True时总是在新的进程中编译, 会重新导入模板文件 (用于模板文件可能被修改的持续编译)
+        :type isolate: bool
+        :return: None
+        :rtype: None
+        """
+        self.c_conf = c_conf
+        self.jobs = jobs if jobs is not None else (os.cpu_count() or 1)
+        self.isolate = isolate
+
+        self.groups: list[list[str]] = []
+        """上一次编译时的入口文件分组"""
+        self.import_graph: dict[str, set[str]] = {}
+        """上一次编译的入口文件在编译时记录的导入关系 {导入方: 被导入方}"""
+
+    def compile(self, entries: Iterable[str], only: Iterable[str] | None = None) -> dict[str, bool]:
+        """
+        编译多个入口文件, 所有输出合并到同一个 SAVE_PATH
+
+        :param entries: 入口文件名或通配符
+        :type entries: Iterable[str]
+        :param only: 仅编译包含这些入口文件的编译组, 为None时编译全部 (每个编译组的计分目标编码范围保持不变)
+        :type only: Iterable[str] | None
+        :return: {入口文件名: 是否编译成功}
+        :rtype: dict[str, bool]
+        """
+        groups = group_entries(self.c_conf, expand_entries(self.c_conf.READ_PATH, entries))
+        tasks = [(group, i * SB_ID_BLOCK) for i, group in enumerate(groups)]
+        if only is not None:
+            only = set(only)
+            tasks = [(group, offset) for group, offset in tasks if only & set(group)]
+        self.groups = groups
+
+        results: dict[str, bool] = {}
+        graphs: list[dict[str, set[str]]] = []
+
+        def _collect(group: list[str], get_result: Callable[[], tuple]) -> None:
+            # 一个编译组出错时只把该组的入口文件记为编译失败, 不影响其他编译组
+            try:
+                group_results, graph = get_result()
+            except Exception:
+                traceback.print_exc()
+                results.update(dict.fromkeys(group, False))
+                return
+            results.update(group_results)
+            graphs.append(graph)
+
+        if (not self.isolate) and (self.jobs == 1 or len(tasks) == 1):
+            for group, offset in tasks:
+                _collect(group, functools.partial(_compile_group, self.c_conf, group, offset))
+        elif tasks:
+            # 每次编译使用新的进程池, 修改过的模板文件会被重新导入
+            with ProcessPoolExecutor(max_workers=min(self.jobs, len(tasks))) as executor:
+                futures = [executor.submit(_compile_group, self.c_conf, group, offset) for group, offset in tasks]
+                for (group, _), future in zip(tasks, futures):
+                    _collect(group, future.result)
+
+        for graph in graphs:
+            self.import_graph.update(graph)
+
+        return results
+
+
+def print_results(results: dict[str, bool]) -> None:
+    """
+    打印批量编译结果
+
+    :param results: {入口文件名: 是否编译成功}
+    :type results: dict[str, bool]
+    :return: None
+    :rtype: None
+    """
+    failed = [entry for entry, success in results.items() if not success]
+    print(f"编译完成: {len(results) - len(failed)}/{len(results)} 个入口文件编译成功")
+    for entry in failed:
+        print(f"  编译失败: {entry}", file=sys.stderr)
+
+
+__all__ = (
+    "SB_ID_BLOCK",
+    "BatchCompiler",
+
+    "expand_entries",
+    "group_entries",
+    "print_results",
+)
@@ -4,23 +4,26 @@
 抛出, 更新, 处理断点
 """
 
-import inspect
-import json
 import os
-import re
 import warnings
-from io import TextIOWrapper
 from typing import Callable
 from typing import Self
 from typing import TypeVar
 
 from ABCTypes import ABCEnvironment
 from Configuration import CompileConfiguration
+from CacheTools import write_if_changed
+from CommandTypes import BreakPointMarker
+from CommandTypes import Command
+from CommandTypes import Commands
 from Configuration import GlobalConfiguration
+from DispatchTools import AdapterTable
+from OptimizeTools import peephole
 
-Processor = Callable[[str | None, str | None, ...], str | None | tuple[str, bool]]
+Processor = Callable[[str | None, str | None, ...], Commands | str | None | tuple[Commands | str, bool]]
 
-BreakPointProcessor: dict[str | None, Processor] = {}
+BreakPointProcessor: AdapterTable = AdapterTable(("func_path", "level", "env", "c_conf", "g_conf"), passthrough=True)
+"""{注册名: 断点处理函数}, 每个编译环境在初始化时复制一份 (导入模板文件时会补充模板中注册的处理函数)"""
 
 BreakPointLevels: set[str] = {"module", "function", "if"}
 
@@ -37,12 +40,11 @@ def BreakPointFlag(func: str | None, *args, **kwargs) -> str:
     :type kwargs: Any
     :return: 生成的断点标记
     :rtype: str
+
+    .. seealso::
+        生成代码时可以直接使用 :class:`CommandTypes.BreakPointMarker`
     """
-    flag_str = "&Flag: BreakPoint"
-    flag_str += f"&func={func}" if func else ""
-    flag_str += f"&args={json.dumps(args)}" if args else ""
-    flag_str += f"&kwargs={json.dumps(kwargs)}" if kwargs else ""
-    return flag_str
+    return BreakPointMarker(func, *args, **kwargs).flag_text()
 
 
 Processor_T = TypeVar("Processor_T", bound=Processor)
@@ -79,9 +81,6 @@ def register_processor(name: str | None) -> Callable[[Processor_T], Processor_T]
     return decorator
 
 
-_BP_ID: int = 0
-
-
 def raiseBreakPoint(
         env: ABCEnvironment,
         file_namespace: str,
@@ -105,21 +104,20 @@ def raiseBreakPoint(
     :return: None
     :rtype: None
     """
-    global _BP_ID
     f_ns, f_name = file_namespace.rsplit('\\', maxsplit=1)
     target_f_ns: dict = env.file_ns_getter(f_name, f_ns, ret_raw=True)[0]
 
     if ":breakpoints" not in target_f_ns:
         target_f_ns[":breakpoints"] = {}
 
+    bp_id = env.newID("BreakPoint")
     data = {
-        "id": _BP_ID,
+        "id": bp_id,
         "func": func,
         "args": func_args,
         "kwargs": func_kwargs,
     }
-    target_f_ns[":breakpoints"][_BP_ID] = data
-    _BP_ID += 1
+    target_f_ns[":breakpoints"][bp_id] = data
 
 
 def updateBreakPoint(
@@ -127,7 +125,7 @@ def updateBreakPoint(
         c_conf: CompileConfiguration,
         g_conf: GlobalConfiguration,
         file_namespace: str
-) -> str:
+) -> Commands:
     """
     更新断点
 
@@ -140,7 +138,7 @@ def updateBreakPoint(
     :param file_namespace: 需要更新的文件命名空间
     :type file_namespace: str
     :return: 断点处理函数生成的命令
-    :rtype: str
+    :rtype: Commands
     """
     f_ns, f_name = file_namespace.rsplit('\\', maxsplit=1)
     target_f_ns: dict[str, dict[str, ...] | str] = env.file_ns_getter(f_name, f_ns, ret_raw=True)[0]
@@ -153,7 +151,7 @@ def updateBreakPoint(
     if ":breakpoints" not in target_f_ns:
         target_f_ns[":breakpoints"] = {}
 
-    command = ''
+    command = Commands()
 
     for file_name in target_f_ns:
         if not file_name.endswith("$link"):
@@ -166,18 +164,9 @@ def updateBreakPoint(
         if ":breakpoints" not in raw_f_ns:
             continue
 
-        params_data = {
-            "func_path": None,
-            "level": level,
-            "env": env,
-            "c_conf": c_conf,
-            "g_conf": g_conf,
-        }
-        data_keys = set(params_data.keys())
-
         for bp_id, bp_data in raw_f_ns[":breakpoints"].items():
             try:
-                processor = BreakPointProcessor[bp_data["func"]]
+                processor = env.breakpoint_processors.adapters[bp_data["func"]]
             except KeyError:
                 warnings.warn(
                     f"SBP: Unknown function: \'{bp_data['func']}\', please check if it is registered in the code.",
@@ -186,14 +175,11 @@ def updateBreakPoint(
                 )
                 continue
 
-            parameters = set(inspect.signature(processor).parameters.keys())
-            required_params = parameters & data_keys
-            required_data = {k: params_data[k] for k in required_params}
-            cmd, keep_raise = processor(*bp_data["args"], **required_data, **bp_data["kwargs"])
+            cmd, keep_raise = processor(bp_data["args"], bp_data["kwargs"], None, level, env, c_conf, g_conf)
             command += cmd
 
             if keep_raise:
-                raiseBreakPoint(f_name, f_ns, bp_data["func"], *bp_data["args"], **bp_data["kwargs"])
+                raiseBreakPoint(env, file_namespace, bp_data["func"], *bp_data["args"], **bp_data["kwargs"])
 
     return command
 
@@ -201,6 +187,9 @@ def updateBreakPoint(
 class SplitBreakPoint:
     """
     用于分割断点的类
+
+    写入的命令先保存在内存中, 遇到断点标记时调用断点处理函数并分割MCF
+    关闭文件时才序列化为MCF文本写入磁盘
     """
 
     def __init__(
@@ -233,165 +222,109 @@ class SplitBreakPoint:
         self._namespace = file_namespace
         self._encoding = encoding
 
-        self._is_comment = False
-        self._last_char = '\n'
-        self._comment_line_cache: str = ''
-
         self._file_path = file_path
         self._writing_dir = os.path.dirname(file_path)
         self._writing_name = os.path.basename(file_path)
         self._pb_id: int = 1
-        self._open_file: TextIOWrapper | None = None
+        self._open_file: Commands | None = None
+        self._open_file_path: str | None = None
         self.closed: bool = False
 
-        self._flag_pattern = re.compile(r"#\s*&+Flag:\s*([^&\s]+).*")
-
-        self._func_pattern = re.compile(r".*&func=([^&]+).*")
-        self._args_pattern = re.compile(r".*&args=(\[[^&]*]).*")
-        self._kwargs_pattern = re.compile(r".*&kwargs=({[^&]*}).*")
-
-    def _parse_comment(self, text: str) -> bool:
+    def _split(self, marker: BreakPointMarker) -> None:
         """
-        解析注释 在断点标记处分割MCF
+        在断点标记处分割MCF
 
-        :param text: 需要解析的注释文本
-        :type text: str
-        :return: 是否分割了MCF
-        :rtype: bool
+        :param marker: 断点标记
+        :type marker: BreakPointMarker
+        :return: None
+        :rtype: None
         """
-        matches = self._flag_pattern.findall(text)
-        if not matches or matches[0] != "BreakPoint":
-            self._write2file(text)
-            return False
-
         name, ext = os.path.splitext(self._writing_name)
         id_name = f"{name}-{hex(self._pb_id)[2:]}"
         writing_name = f"{id_name}{ext}"
 
-        match_func = self._func_pattern.findall(text)
-        match_args = self._args_pattern.findall(text)
-        match_kwargs = self._kwargs_pattern.findall(text)
-
-        func_key = match_func[0] if match_func else None
-        match_args = match_args[0] if match_args else "[]"
-        match_kwargs = match_kwargs[0] if match_kwargs else "{}"
-
         try:
-            processor = BreakPointProcessor[func_key]
+            processor = self._env.breakpoint_processors.adapters[marker.func]
         except KeyError:
-            raise Exception(f"SBP: Unknown function: \'{func_key}\', please check if it is registered in the code.")
-
-        try:
-            args = json.loads(match_args)
-            kwargs = json.loads(match_kwargs)
-        except json.JSONDecodeError:
-            raise Exception("SBP: Arguments are not valid json format.")
+            raise Exception(f"SBP: Unknown function: \'{marker.func}\', please check if it is registered in the code.")
 
         ns_path = f"{self._namespace}\\{id_name}".replace('\\', '/')
 
-        params_data = {
-            "func_path": ns_path,
-            "level": None,
-            "env": self._env,
-            "c_conf": self._c_conf,
-            "g_conf": self._g_conf,
-        }
-        data_keys = set(params_data.keys())
-
-        required_params = set(inspect.signature(processor).parameters.keys()) & data_keys
-        required_data = {k: params_data[k] for k in required_params}
-
-        result = processor(*args, **required_data, **kwargs)
-
-        result = '' if result is None else result
+        result = processor(
+            list(marker.args), dict(marker.kwargs), ns_path, None, self._env, self._c_conf, self._g_conf
+        )
 
         self._write2file(result)
 
         self._pb_id += 1
-        self._open_file.close()
-        self._open_file = open(os.path.join(self._writing_dir, writing_name), mode='w', encoding='utf-8')
-
-        return True
+        self._close_file()
+        self._open_path(os.path.join(self._writing_dir, writing_name))
 
-    def write(self, text: str) -> None:
+    def write(self, commands: Commands | Command | str | None) -> None:
         """
-        写入文本
+        写入命令
 
-        :param text: 文本
-        :type text: str
+        :param commands: 命令列表, 命令对象 或 MCF文本 (按行解析)
+        :type commands: Commands | Command | str | None
         :return: None
         :rtype: None
         """
         if self.closed:
             raise Exception("File is closed")
 
-        if not text:
-            self._write2file(text)
-            return
-
-        for line in text.splitlines(keepends=True):
-            if self._process_comment(line):
+        for command in Commands.coerce(commands):
+            if isinstance(command, BreakPointMarker):
+                self._split(command)
                 continue
+            self._open_file.append(command)
 
-            if not self._is_comment_line(line):
-                self._last_char = line[-1]
-                self._write2file(line)
-                continue
-            self._is_comment = True
-
-            if self._process_comment(line):
-                continue
-
-            raise Exception("Unknown error")
-
-    def _write2file(self, text: str) -> None:
+    def _open_path(self, path: str) -> None:
         """
-        写入文本到当前打开的文件
+        打开文件作为当前写入的文件 (命令先保存在内存中, 关闭时才写入磁盘)
 
-        :param text: 文本
-        :type text: str
+        :param path: 文件路径
+        :type path: str
         :return: None
         :rtype: None
         """
-        self._open_file.write(text)
+        self._open_file = Commands()
+        self._open_file_path = path
 
-    def _is_comment_line(self, txt: str) -> bool:
+    def _serialize(self, commands: Commands) -> str:
         """
-        判断是否是注释行
+        将当前文件的命令序列化为MCF文本
 
-        :param txt: 文本
-        :type txt: str
-        :return: 是否是注释行
-        :rtype: bool
+        :param commands: 当前文件的命令
+        :type commands: Commands
+        :return: MCF文本
+        :rtype: str
         """
-        if '#' not in txt:
-            return False
-        last_char = self._last_char
-        if txt.index('#') != 0:
-            last_char = txt[txt.index('#') - 1]
+        if self._c_conf.OPTIMIZE:
+            commands = peephole(commands)
+        return commands.to_text()
 
-        if last_char != '\n':
-            return False
-        return True
+    def _close_file(self) -> None:
+        """
+        关闭当前写入的文件, 内容与磁盘上的文件相同时不会重写
+
+        :return: None
+        :rtype: None
+        """
+        if self._open_file is None:
+            return
+        write_if_changed(self._open_file_path, self._serialize(self._open_file), self._encoding)
+        self._open_file = None
 
-    def _process_comment(self, txt: str) -> bool:
+    def _write2file(self, commands: Commands | Command | str | None) -> None:
         """
-        处理注释行
+        写入命令到当前打开的文件 (不处理断点标记)
 
-        :param txt: 待处理文本
-        :type txt: str
-        :return: 是否处理了注释
-        :rtype: bool
+        :param commands: 命令列表, 命令对象 或 MCF文本
+        :type commands: Commands | Command | str | None
+        :return: None
+        :rtype: None
         """
-        if self._is_comment:
-            self._comment_line_cache += txt
-            self._last_char = txt[-1]
-            if '\n' in txt:
-                self._parse_comment(self._comment_line_cache)
-                self._comment_line_cache = ''
-                self._is_comment = False
-            return True
-        return False
+        self._open_file += commands
 
     def close(self) -> None:
         # noinspection GrazieInspection
@@ -402,7 +335,7 @@ class SplitBreakPoint:
         :rtype: None
         """
         if not self.closed:
-            self._open_file.close()
+            self._close_file()
             self.closed = True
 
     def open(self) -> None:
@@ -415,18 +348,21 @@ class SplitBreakPoint:
         """
         if self.closed:
             raise Exception("File is closed")
-        self._open_file = open(self._file_path, mode='w', encoding=self._encoding)
+        self._open_path(self._file_path)
 
     def __enter__(self) -> Self:
         self.open()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is not None:
+            # 生成命令时出错, 不写入只生成了一部分的文件
+            self._open_file = None
         self.close()
-        self._open_file.__exit__(exc_type, exc_val, exc_tb)
 
 
 __all__ = (
+    "BreakPointProcessor",
     "BreakPointFlag",
 
     "raiseBreakPoint",
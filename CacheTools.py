@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+# cython: language_level = 3
+"""
+模块编译缓存
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import warnings
+from contextlib import contextmanager
+from functools import cache
+from typing import Any
+from typing import Iterator
+
+from ABCTypes import ABCEnvironment
+from Configuration import CompileConfiguration
+from Configuration import GlobalConfiguration
+from DependencyTools import direct_dependencies
+
+CACHE_VERSION: int = 4
+"""缓存格式版本, 修改缓存内容结构时需要增加"""
+
+_UNKEYED_CONFIG: set[str] = {"SAVE_PATH", "CACHE_PATH", "DEBUG_MODE"}
+"""不影响生成内容的编译配置项, 不计入缓存键"""
+
+
+def _hash_files(paths: list[str]) -> str:
+    """
+    计算多个文件内容的哈希值
+
+    :param paths: 文件路径
+    :type paths: list[str]
+    :return: 十六进制哈希值
+    :rtype: str
+    """
+    sha = hashlib.sha256()
+    for path in sorted(paths):
+        sha.update(os.path.basename(path).encode("utf-8"))
+        with open(path, mode="rb") as f:
+            sha.update(hashlib.sha256(f.read()).digest())
+    return sha.hexdigest()
+
+
+@cache
+def _compiler_fingerprint() -> str:
+    """
+    计算编译器源码的哈希值, 编译器本身改变时缓存失效
+
+    :return: 十六进制哈希值
+    :rtype: str
+    """
+    compiler_dir = os.path.dirname(os.path.abspath(__file__))
+    return _hash_files([
+        os.path.join(compiler_dir, file) for file in os.listdir(compiler_dir) if file.endswith(".py")
+    ])
+
+
+def _template_fingerprint(template_path: str) -> str:
+    """
+    计算模板文件夹下所有模板的哈希值
+
+    :param template_path: 模板文件夹
+    :type template_path: str
+    :return: 十六进制哈希值
+    :rtype: str
+    """
+    paths = []
+    for root, _, files in os.walk(template_path):
+        paths.extend(os.path.join(root, file) for file in files if file.endswith(".py"))
+    return _hash_files(paths)
+
+
+def _config_state(obj: Any) -> dict[str, Any]:
+    """
+    提取配置对象中影响编译结果的属性 (用于 json.dumps 的 default 参数)
+
+    :param obj: 配置对象或配置类
+    :type obj: Any
+    :return: 属性字典
+    :rtype: dict[str, Any]
+    """
+    is_class = isinstance(obj, type)
+    items: dict[str, Any] = {}
+    for cls in reversed((obj if is_class else type(obj)).__mro__):
+        if cls is not object:
+            items.update(vars(cls))
+    if not is_class:
+        items.update(vars(obj))
+
+    return {
+        k: v for k, v in items.items()
+        if (not k.startswith("__")) and (k not in _UNKEYED_CONFIG) and (isinstance(v, type) or not callable(v))
+        and not isinstance(v, (staticmethod, classmethod, property))
+    }
+
+
+def write_if_changed(path: str, text: str, encoding: str = "utf-8") -> bool:
+    """
+    仅在文件内容发生变化时写入文件, 未变化的文件保留原修改时间
+
+    :param path: 文件路径
+    :type path: str
+    :param text: 文件内容
+    :type text: str
+    :param encoding: 文件编码
+    :type encoding: str
+    :return: 是否写入了文件
+    :rtype: bool
+    """
+    try:
+        with open(path, mode='r', encoding=encoding) as f:
+            if f.read() == text:
+                return False
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+
+    with open(path, mode='w', encoding=encoding) as f:
+        f.write(text)
+    return True
+
+
+class ModuleCapture:
+    """
+    记录一个模块编译期间创建的文件夹, 写入的文件和导入的模块
+    """
+
+    def __init__(self) -> None:
+        self.dirs: list[str] = []
+        self.files: list[str] = []
+        self.imports: list[str] = []
+
+
+class ModuleCache:
+    """
+    基于源码和依赖哈希的模块编译缓存
+
+    缓存保存模块生成的所有文件以及编译时环境中属于该模块的部分 (命名空间, 文件命名空间, 函数参数, 计分目标编码)
+    恢复时如果缓存的计分目标编码与当前环境冲突则视为未命中, 重新编译该模块
+    """
+
+    def __init__(self, c_conf: CompileConfiguration, g_conf: GlobalConfiguration) -> None:
+        """
+        初始化
+
+        :param c_conf: 编译配置
+        :type c_conf: CompileConfiguration
+        :param g_conf: 全局配置
+        :type g_conf: GlobalConfiguration
+        :return: None
+        :rtype: None
+        """
+        self.c_conf = c_conf
+        self.g_conf = g_conf
+        self.cache_dir = os.path.join(c_conf.CACHE_PATH, "modules")
+
+        self.captures: list[ModuleCapture] = []
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._base_key: str | None = None
+        self._keys: dict[str, str] = {}
+
+    def base_key(self) -> str:
+        """
+        所有模块共用的哈希部分 (缓存版本, 编译器源码, 模板, 配置)
+
+        :return: 十六进制哈希值
+        :rtype: str
+        """
+        if self._base_key is None:
+            sha = hashlib.sha256()
+            sha.update(str(CACHE_VERSION).encode("utf-8"))
+            sha.update(_compiler_fingerprint().encode("utf-8"))
+            sha.update(_template_fingerprint(self.c_conf.TEMPLATE_PATH).encode("utf-8"))
+            sha.update(json.dumps(
+                [_config_state(self.c_conf), _config_state(self.g_conf)], default=_config_state, sort_keys=True
+            ).encode("utf-8"))
+            self._base_key = sha.hexdigest()
+        return self._base_key
+
+    def module_key(self, sourcefile_path: str, _visiting: set[str] | None = None) -> str:
+        """
+        计算模块的缓存键 (包含源码及其递归依赖的哈希)
+
+        :param sourcefile_path: 源码文件路径
+        :type sourcefile_path: str
+        :param _visiting: 正在计算的模块 (用于处理循环导入)
+        :type _visiting: set[str] | None
+        :return: 十六进制哈希值
+        :rtype: str
+        """
+        sourcefile_path = os.path.abspath(sourcefile_path)
+        if sourcefile_path in self._keys:
+            return self._keys[sourcefile_path]
+
+        if _visiting is None:
+            _visiting = set()
+        _visiting.add(sourcefile_path)
+
+        sha = hashlib.sha256()
+        sha.update(self.base_key().encode("utf-8"))
+        sha.update(os.path.relpath(sourcefile_path, self.c_conf.READ_PATH).encode("utf-8"))
+        sha.update(_hash_files([sourcefile_path]).encode("utf-8"))
+
+        for dependency in sorted(direct_dependencies(self.c_conf, sourcefile_path)):
+            if dependency in _visiting:
+                sha.update(os.path.relpath(dependency, self.c_conf.READ_PATH).encode("utf-8"))
+                continue
+            sha.update(self.module_key(dependency, _visiting).encode("utf-8"))
+
+        _visiting.discard(sourcefile_path)
+        key = sha.hexdigest()
+        self._keys[sourcefile_path] = key
+        return key
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pickle")
+
+    def _load_entry(self, key: str) -> dict[str, Any] | None:
+        """
+        读取缓存条目
+
+        :param key: 缓存键
+        :type key: str
+        :return: 缓存条目, 不存在或无法读取时返回None
+        :rtype: dict[str, Any] | None
+        """
+        try:
+            with open(self._entry_path(key), mode="rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            warnings.warn(f"无法读取模块缓存 {self._entry_path(key)}: {err!r}", UserWarning)
+            return None
+
+    def _save_entry(self, key: str, entry: dict[str, Any]) -> None:
+        """
+        写入缓存条目 (先写入临时文件再替换, 多个进程同时写入时不会损坏缓存)
+
+        :param key: 缓存键
+        :type key: str
+        :param entry: 缓存条目
+        :type entry: dict[str, Any]
+        :return: None
+        :rtype: None
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, mode="wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def note_dir(self, path: str) -> None:
+        """
+        记录正在编译的模块创建了文件夹
+
+        :param path: 文件夹路径
+        :type path: str
+        :return: None
+        :rtype: None
+        """
+        if self.captures:
+            self.captures[-1].dirs.append(os.path.abspath(path))
+
+    def note_file(self, path: str) -> None:
+        """
+        记录正在编译的模块写入了文件
+
+        :param path: 文件路径
+        :type path: str
+        :return: None
+        :rtype: None
+        """
+        if self.captures:
+            self.captures[-1].files.append(os.path.abspath(path))
+
+    def note_import(self, name: str) -> None:
+        """
+        记录正在编译的模块导入了模块
+
+        :param name: 导入名称
+        :type name: str
+        :return: None
+        :rtype: None
+        """
+        if self.captures:
+            self.captures[-1].imports.append(name)
+
+    @contextmanager
+    def record(self, env: ABCEnvironment, sourcefile_path: str, name: str, namespace: str) -> Iterator[None]:
+        """
+        记录模块编译结果并写入缓存, 编译失败时不写入
+
+        :param env: 编译环境
+        :type env: ABCEnvironment
+        :param sourcefile_path: 源码文件路径
+        :type sourcefile_path: str
+        :param name: 模块导入名称 (根文件命名空间)
+        :type name: str
+        :param namespace: 模块命名空间
+        :type namespace: str
+        :return: 上下文管理器
+        :rtype: Iterator[None]
+        """
+        capture = ModuleCapture()
+
+        # 记录模块中编码或引用的计分目标, 恢复时需要保持相同的编码
+        with env.symbols.recording() as used_scores:
+            self.captures.append(capture)
+            try:
+                yield
+            finally:
+                self.captures.pop()
+
+        files: dict[str, str] = {}
+        for path in capture.files:
+            with open(path, mode='r', encoding=self.c_conf.Encoding) as f:
+                files[os.path.relpath(path, self.c_conf.SAVE_PATH)] = f.read()
+
+        sub_ns = f"{namespace}\\"
+        entry = {
+            "dirs": [os.path.relpath(path, self.c_conf.SAVE_PATH) for path in capture.dirs],
+            "files": files,
+            "imports": capture.imports,
+            "namespace_tree": env.namespace.namespace_tree[namespace],
+            "temp_ns": {
+                k: v for k, v in env.namespace.temp_ns.items() if k == namespace or k.startswith(sub_ns)
+            },
+            "file_namespace_tree": env.file_namespace.namespace_tree[name],
+            "func_args": {k: v for k, v in env.func_args.items() if k.startswith(sub_ns)},
+            "func_calls": {k: v for k, v in env.func_calls.items() if k.startswith(sub_ns)},
+            "scoreboard": env.symbols.export(used_scores),
+            "global_ids": env.global_ids,
+            "constants": sorted(env.module_constants.get(namespace, ())),
+        }
+        self._save_entry(self.module_key(sourcefile_path), entry)
+
+    def restore(self, env: ABCEnvironment, sourcefile_path: str, name: str, namespace: str) -> bool:
+        """
+        尝试从缓存恢复模块
+
+        :param env: 编译环境
+        :type env: ABCEnvironment
+        :param sourcefile_path: 源码文件路径
+        :type sourcefile_path: str
+        :param name: 模块导入名称 (根文件命名空间)
+        :type name: str
+        :param namespace: 模块命名空间
+        :type namespace: str
+        :return: 是否命中缓存
+        :rtype: bool
+        """
+        from DefaultCodeGenerators import import_as
+
+        entry = self._load_entry(self.module_key(sourcefile_path))
+        if (entry is None) or env.symbols.conflicts(entry["scoreboard"]):
+            self.misses += 1
+            return False
+
+        for import_name in entry["imports"]:
+            import_as(env, self.c_conf, self.g_conf, import_name, None, namespace, register_ns=False)
+
+        # 依赖模块可能被重新编译, 需要再次检查
+        if env.symbols.conflicts(entry["scoreboard"]):
+            self.misses += 1
+            return False
+
+        for objective, names in entry["scoreboard"].items():
+            for n, code in names.items():
+                env.symbols.register(n, objective, code)
+
+        env.namespace.namespace_tree[namespace] = entry["namespace_tree"]
+        env.namespace.temp_ns.update(entry["temp_ns"])
+        env.file_namespace.namespace_tree[name] = entry["file_namespace_tree"]
+        env.func_args.update(entry["func_args"])
+        env.func_calls.update(entry["func_calls"])
+        env.reserve_ids(entry["global_ids"])
+        if entry["constants"]:
+            env.module_constants[namespace] = set(entry["constants"])
+
+        for rel_path in entry["dirs"]:
+            os.makedirs(os.path.join(self.c_conf.SAVE_PATH, rel_path), exist_ok=True)
+
+        for rel_path, text in entry["files"].items():
+            path = os.path.join(self.c_conf.SAVE_PATH, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_if_changed(path, text, self.c_conf.Encoding)
+
+        self.hits += 1
+        return True
+
+
+__all__ = (
+    "CACHE_VERSION",
+
+    "write_if_changed",
+    "ModuleCapture",
+    "ModuleCache",
+)
@@ -0,0 +1,747 @@
+# -*- coding: utf-8 -*-
+# cython: language_level = 3
+"""
+MCF命令的中间表示
+
+代码生成器和模板函数生成命令对象, 写入文件时才统一序列化为MCF文本
+"""
+
+import json
+import re
+from typing import Any
+from typing import Iterable
+
+
+class ScoreRef:
+    """
+    计分板上的一个分数 (计分目标 + 计分项)
+    """
+
+    __slots__ = ("holder", "objective")
+
+    def __init__(self, holder: str, objective: str) -> None:
+        """
+        初始化
+
+        :param holder: 计分目标 (已编码)
+        :type holder: str
+        :param objective: 计分项
+        :type objective: str
+        :return: None
+        :rtype: None
+        """
+        self.holder = holder
+        self.objective = objective
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, ScoreRef):
+            return NotImplemented
+        return (self.holder, self.objective) == (other.holder, other.objective)
+
+    def __hash__(self) -> int:
+        return hash((self.holder, self.objective))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.holder!r}, {self.objective!r})"
+
+    def __str__(self) -> str:
+        return f"{self.holder} {self.objective}"
+
+
+class Command:
+    """
+    命令基类
+
+    命令对象创建后不应再被修改, 子类通过 __slots__ 声明字段, 字段相同的命令相等
+    与字符串或其他命令相加时得到 Commands
+    """
+
+    __slots__ = ()
+
+    def to_text(self) -> str:
+        """
+        序列化为一行MCF文本
+
+        :return: MCF文本 (不含换行符)
+        :rtype: str
+        """
+        raise NotImplementedError
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other: Any) -> bool:
+        if type(self) is not type(other):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self) -> int:
+        return hash((type(self), self._values()))
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __str__(self) -> str:
+        return f"{self.to_text()}\n"
+
+    def __add__(self, other: Any) -> "Commands":
+        result = Commands((self,))
+        result += other
+        return result
+
+    def __radd__(self, other: Any) -> "Commands":
+        result = Commands()
+        result += other
+        result.append(self)
+        return result
+
+
+class ScoreSet(Command):
+    """
+    scoreboard players set
+    """
+
+    __slots__ = ("target", "value")
+
+    def __init__(self, target: ScoreRef, value: int) -> None:
+        self.target = target
+        self.value = value
+
+    def to_text(self) -> str:
+        return f"scoreboard players set {self.target} {self.value}"
+
+
+class ScoreAdd(Command):
+    """
+    scoreboard players add (值为负数时生成 remove)
+    """
+
+    __slots__ = ("target", "value")
+
+    def __init__(self, target: ScoreRef, value: int) -> None:
+        self.target = target
+        self.value = value
+
+    def to_text(self) -> str:
+        if self.value < 0:
+            return f"scoreboard players remove {self.target} {-self.value}"
+        return f"scoreboard players add {self.target} {self.value}"
+
+
+class ScoreOperation(Command):
+    """
+    scoreboard players operation
+    """
+
+    __slots__ = ("target", "operation", "source")
+
+    def __init__(self, target: ScoreRef, operation: str, source: ScoreRef) -> None:
+        """
+        初始化
+
+        :param target: 目标分数
+        :type target: ScoreRef
+        :param operation: 操作类型 (SBOperationType)
+        :type operation: str
+        :param source: 源分数
+        :type source: ScoreRef
+        :return: None
+        :rtype: None
+        """
+        self.target = target
+        self.operation = operation
+        self.source = source
+
+    def to_text(self) -> str:
+        return f"scoreboard players operation {self.target} {self.operation} {self.source}"
+
+
+class ScoreReset(Command):
+    """
+    scoreboard players reset
+    """
+
+    __slots__ = ("target",)
+
+    def __init__(self, target: ScoreRef) -> None:
+        self.target = target
+
+    def to_text(self) -> str:
+        return f"scoreboard players reset {self.target}"
+
+
+class ScoreGet(Command):
+    """
+    scoreboard players get
+    """
+
+    __slots__ = ("target",)
+
+    def __init__(self, target: ScoreRef) -> None:
+        self.target = target
+
+    def to_text(self) -> str:
+        return f"scoreboard players get {self.target}"
+
+
+class ExecuteIfScore(Command):
+    """
+    execute if|unless score ... run ...
+    """
+
+    __slots__ = ("check_type", "left", "compare_op", "right", "run")
+
+    def __init__(self, check_type: str, left: ScoreRef, compare_op: str, right: ScoreRef, run: Command) -> None:
+        """
+        初始化
+
+        :param check_type: 检查类型 (SBCheckType)
+        :type check_type: str
+        :param left: 左侧分数
+        :type left: ScoreRef
+        :param compare_op: 比较类型 (SBCompareType)
+        :type compare_op: str
+        :param right: 右侧分数
+        :type right: ScoreRef
+        :param run: 条件成立时执行的命令
+        :type run: Command
+        :return: None
+        :rtype: None
+        """
+        self.check_type = check_type
+        self.left = left
+        self.compare_op = compare_op
+        self.right = right
+        self.run = run
+
+    def to_text(self) -> str:
+        return (
+            f"execute {self.check_type} score {self.left} {self.compare_op} {self.right} "
+            f"run {self.run.to_text()}"
+        )
+
+
+class ExecuteIfScoreMatches(Command):
+    """
+    execute if|unless score ... matches ... run ...
+    """
+
+    __slots__ = ("check_type", "target", "low", "high", "run")
+
+    def __init__(self, check_type: str, target: ScoreRef, low: int | None, high: int | None, run: Command) -> None:
+        """
+        初始化
+
+        :param check_type: 检查类型 (SBCheckType)
+        :type check_type: str
+        :param target: 被检查的分数
+        :type target: ScoreRef
+        :param low: 范围下界 (包含), 为None时没有下界
+        :type low: int | None
+        :param high: 范围上界 (包含), 为None时没有上界
+        :type high: int | None
+        :param run: 条件成立时执行的命令
+        :type run: Command
+        :return: None
+        :rtype: None
+        """
+        if low is None and high is None:
+            raise ValueError("score range must have at least one bound")
+        self.check_type = check_type
+        self.target = target
+        self.low = low
+        self.high = high
+        self.run = run
+
+    def contains(self, value: int) -> bool:
+        """
+        检查分数是否在范围内
+
+        :param value: 分数
+        :type value: int
+        :return: 是否在范围内
+        :rtype: bool
+        """
+        return (self.low is None or self.low <= value) and (self.high is None or value <= self.high)
+
+    def to_text(self) -> str:
+        if self.low == self.high:
+            score_range = f"{self.low}"
+        else:
+            score_range = f"{'' if self.low is None else self.low}..{'' if self.high is None else self.high}"
+        return f"execute {self.check_type} score {self.target} matches {score_range} run {self.run.to_text()}"
+
+
+class ExecuteStoreScore(Command):
+    """
+    execute store result|success score ... run ...
+    """
+
+    __slots__ = ("target", "run", "kind")
+
+    def __init__(self, target: ScoreRef, run: Command, *, kind: str = "result") -> None:
+        self.target = target
+        self.run = run
+        self.kind = kind
+
+    def to_text(self) -> str:
+        return f"execute store {self.kind} score {self.target} run {self.run.to_text()}"
+
+
+class ExecuteStoreStorage(Command):
+    """
+    execute store result|success storage ... run ...
+    """
+
+    __slots__ = ("storage", "path", "run", "kind", "data_type", "scale")
+
+    def __init__(
+            self,
+            storage: str,
+            path: str,
+            run: Command,
+            *,
+            kind: str = "result",
+            data_type: str = "int",
+            scale: int | float = 1
+    ) -> None:
+        self.storage = storage
+        self.path = path
+        self.run = run
+        self.kind = kind
+        self.data_type = data_type
+        self.scale = scale
+
+    def to_text(self) -> str:
+        return (
+            f"execute store {self.kind} storage {self.storage} {self.path} {self.data_type} {self.scale} "
+            f"run {self.run.to_text()}"
+        )
+
+
+class FunctionCall(Command):
+    """
+    function (可以通过 with storage 传入函数宏的参数)
+    """
+
+    __slots__ = ("path", "arguments")
+
+    def __init__(self, path: str, arguments: tuple[str, str] | None = None) -> None:
+        """
+        初始化
+
+        :param path: 函数路径
+        :type path: str
+        :param arguments: 函数宏参数所在的 (storage, 路径), 为None时不传入参数
+        :type arguments: tuple[str, str] | None
+        :return: None
+        :rtype: None
+        """
+        self.path = path
+        self.arguments = arguments
+
+    def to_text(self) -> str:
+        if self.arguments is None:
+            return f"function {self.path}"
+        storage, path = self.arguments
+        return f"function {self.path} with storage {storage} {path}"
+
+
+class ReturnValue(Command):
+    """
+    return (以常量结束当前函数)
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+    def to_text(self) -> str:
+        return f"return {self.value}"
+
+
+class ReturnRun(Command):
+    """
+    return run (以命令的结果结束当前函数)
+    """
+
+    __slots__ = ("run",)
+
+    def __init__(self, run: Command) -> None:
+        self.run = run
+
+    def to_text(self) -> str:
+        return f"return run {self.run.to_text()}"
+
+
+class DataGetStorage(Command):
+    """
+    data get storage
+    """
+
+    __slots__ = ("storage", "path", "scale")
+
+    def __init__(self, storage: str, path: str, scale: int | float | None = None) -> None:
+        self.storage = storage
+        self.path = path
+        self.scale = scale
+
+    def to_text(self) -> str:
+        if self.scale is None:
+            return f"data get storage {self.storage} {self.path}"
+        return f"data get storage {self.storage} {self.path} {self.scale}"
+
+
+class DataModifyStorage(Command):
+    """
+    data modify storage ... from storage ...
+    """
+
+    __slots__ = ("storage", "path", "mode", "source_storage", "source_path")
+
+    def __init__(self, storage: str, path: str, mode: str, source_storage: str, source_path: str) -> None:
+        """
+        初始化
+
+        :param storage: 目标storage
+        :type storage: str
+        :param path: 目标路径
+        :type path: str
+        :param mode: 修改方式 (append, set, ...)
+        :type mode: str
+        :param source_storage: 源storage
+        :type source_storage: str
+        :param source_path: 源路径
+        :type source_path: str
+        :return: None
+        :rtype: None
+        """
+        self.storage = storage
+        self.path = path
+        self.mode = mode
+        self.source_storage = source_storage
+        self.source_path = source_path
+
+    def to_text(self) -> str:
+        return (
+            f"data modify storage {self.storage} {self.path} {self.mode} "
+            f"from storage {self.source_storage} {self.source_path}"
+        )
+
+
+class DataModifyStorageValue(Command):
+    """
+    data modify storage ... value ...
+    """
+
+    __slots__ = ("storage", "path", "mode", "value")
+
+    def __init__(self, storage: str, path: str, mode: str, value: str) -> None:
+        """
+        初始化
+
+        :param storage: 目标storage
+        :type storage: str
+        :param path: 目标路径
+        :type path: str
+        :param mode: 修改方式 (append, set, ...)
+        :type mode: str
+        :param value: SNBT值
+        :type value: str
+        :return: None
+        :rtype: None
+        """
+        self.storage = storage
+        self.path = path
+        self.mode = mode
+        self.value = value
+
+    def to_text(self) -> str:
+        return f"data modify storage {self.storage} {self.path} {self.mode} value {self.value}"
+
+
+class DataRemoveStorage(Command):
+    """
+    data remove storage
+    """
+
+    __slots__ = ("storage", "path")
+
+    def __init__(self, storage: str, path: str) -> None:
+        self.storage = storage
+        self.path = path
+
+    def to_text(self) -> str:
+        return f"data remove storage {self.storage} {self.path}"
+
+
+class MacroCommand(Command):
+    """
+    函数宏命令 ($开头, 执行前将 $(参数名) 替换为传入的参数值)
+    """
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        if '\n' in text:
+            raise ValueError("macro command can't have more than one line")
+        self.text = text
+
+    def to_text(self) -> str:
+        return f"${self.text}"
+
+
+class Comment(Command):
+    """
+    单行注释
+    """
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        if '\n' in text:
+            raise ValueError("comment can't have more than one line")
+        self.text = text
+
+    def to_text(self) -> str:
+        return f"# {self.text}"
+
+
+_FLAG_PATTERN = re.compile(r"#\s*&+Flag:\s*([^&\s]+).*")
+_FUNC_PATTERN = re.compile(r".*&func=([^&]+).*")
+_ARGS_PATTERN = re.compile(r".*&args=(\[[^&]*]).*")
+_KWARGS_PATTERN = re.compile(r".*&kwargs=({[^&]*}).*")
+
+
+class BreakPointMarker(Command):
+    """
+    断点标记, 写入文件时会在此处分割MCF并调用断点处理函数
+
+    .. seealso::
+        :class:`BreakPointTools.SplitBreakPoint`
+    """
+
+    __slots__ = ("func", "args", "kwargs")
+
+    def __init__(self, func: str | None, *args, **kwargs) -> None:
+        """
+        初始化
+
+        :param func: 断点处理函数注册名
+        :type func: str | None
+        :param args: 断点处理函数参数 (需要可以被json序列化)
+        :type args: Any
+        :param kwargs: 断点处理函数关键字参数 (需要可以被json序列化)
+        :type kwargs: Any
+        :return: None
+        :rtype: None
+        """
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def _values(self) -> tuple:
+        return self.func, json.dumps(self.args), json.dumps(self.kwargs, sort_keys=True)
+
+    def flag_text(self) -> str:
+        """
+        生成断点标记文本
+
+        :return: 断点标记文本
+        :rtype: str
+        """
+        flag_str = "&Flag: BreakPoint"
+        flag_str += f"&func={self.func}" if self.func else ""
+        flag_str += f"&args={json.dumps(self.args)}" if self.args else ""
+        flag_str += f"&kwargs={json.dumps(self.kwargs)}" if self.kwargs else ""
+        return flag_str
+
+    def to_text(self) -> str:
+        return f"# {self.flag_text()}"
+
+    @classmethod
+    def parse(cls, text: str) -> "BreakPointMarker | None":
+        """
+        解析断点标记注释
+
+        :param text: 注释文本 (以#开头)
+        :type text: str
+        :return: 断点标记, 不是断点标记时返回None
+        :rtype: BreakPointMarker | None
+        """
+        matches = _FLAG_PATTERN.findall(text)
+        if not matches or matches[0] != "BreakPoint":
+            return None
+
+        match_func = _FUNC_PATTERN.findall(text)
+        match_args = _ARGS_PATTERN.findall(text)
+        match_kwargs = _KWARGS_PATTERN.findall(text)
+
+        try:
+            args = json.loads(match_args[0] if match_args else "[]")
+            kwargs = json.loads(match_kwargs[0] if match_kwargs else "{}")
+        except json.JSONDecodeError:
+            raise Exception("SBP: Arguments are not valid json format.")
+
+        return cls(match_func[0] if match_func else None, *args, **kwargs)
+
+
+class RawCommand(Command):
+    """
+    未解析的单行MCF文本 (空文本表示空行)
+    """
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        if '\n' in text:
+            raise ValueError("raw command can't have more than one line")
+        self.text = text
+
+    def to_text(self) -> str:
+        return self.text
+
+
+_FUNCTION_PATTERN = re.compile(r"function (\S+)(?: with storage (\S+) (\S+))?")
+
+
+def parse_command(line: str) -> Command:
+    """
+    将一行MCF文本解析为命令对象
+
+    只识别注释, 断点标记, 函数宏命令和函数调用, 其他命令解析为 RawCommand
+
+    :param line: MCF文本 (不含换行符)
+    :type line: str
+    :return: 命令对象
+    :rtype: Command
+    """
+    if line.startswith('#'):
+        marker = BreakPointMarker.parse(line)
+        if marker is not None:
+            return marker
+        if line.startswith("# "):
+            return Comment(line[2:])
+        return RawCommand(line)
+
+    if line.startswith('$'):
+        return MacroCommand(line[1:])
+
+    match = _FUNCTION_PATTERN.fullmatch(line)
+    if match:
+        if match.group(2) is None:
+            return FunctionCall(match.group(1))
+        return FunctionCall(match.group(1), (match.group(2), match.group(3)))
+    return RawCommand(line)
+
+
+def parse_commands(text: str) -> "Commands":
+    """
+    将MCF文本解析为命令列表
+
+    :param text: MCF文本
+    :type text: str
+    :return: 命令列表
+    :rtype: Commands
+    """
+    return Commands(parse_command(line) for line in text.splitlines())
+
+
+class Commands(list):
+    """
+    命令列表
+
+    兼容原先基于字符串的写法: 可以与字符串, 命令对象或其他命令列表相加
+    字符串会按行解析为命令对象, str() 得到序列化后的MCF文本
+    """
+
+    def __iadd__(self, other: Any) -> "Commands":
+        if isinstance(other, Command):
+            self.append(other)
+        elif isinstance(other, str):
+            self.extend(parse_commands(other))
+        elif isinstance(other, Commands):
+            self.extend(other)
+        elif other is None:
+            pass
+        elif isinstance(other, Iterable):
+            for command in other:
+                self += command
+        else:
+            raise TypeError(f"can't add {type(other).__name__} to Commands")
+        return self
+
+    def __add__(self, other: Any) -> "Commands":
+        result = Commands(self)
+        result += other
+        return result
+
+    def __radd__(self, other: Any) -> "Commands":
+        result = Commands()
+        result += other
+        result.extend(self)
+        return result
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({list.__repr__(self)})"
+
+    def __str__(self) -> str:
+        return self.to_text()
+
+    def to_text(self) -> str:
+        """
+        序列化为MCF文本
+
+        :return: MCF文本 (每条命令一行, 末尾带换行符)
+        :rtype: str
+        """
+        return ''.join(f"{command.to_text()}\n" for command in self)
+
+    @classmethod
+    def coerce(cls, value: "Commands | Command | str | None") -> "Commands":
+        """
+        将字符串或命令对象转换为命令列表
+
+        :param value: 命令列表, 命令对象, MCF文本 或 None
+        :type value: Commands | Command | str | None
+        :return: 命令列表 (传入命令列表时原样返回)
+        :rtype: Commands
+        """
+        if isinstance(value, Commands):
+            return value
+        result = cls()
+        result += value
+        return result
+
+
+__all__ = (
+    "ScoreRef",
+
+    "Command",
+    "ScoreSet",
+    "ScoreAdd",
+    "ScoreOperation",
+    "ScoreReset",
+    "ScoreGet",
+    "ExecuteIfScore",
+    "ExecuteIfScoreMatches",
+    "ExecuteStoreScore",
+    "ExecuteStoreStorage",
+    "FunctionCall",
+    "ReturnValue",
+    "ReturnRun",
+    "DataGetStorage",
+    "DataModifyStorage",
+    "DataModifyStorageValue",
+    "DataRemoveStorage",
+    "MacroCommand",
+    "Comment",
+    "BreakPointMarker",
+    "RawCommand",
+
+    "parse_command",
+    "parse_commands",
+    "Commands",
+)
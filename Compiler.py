@@ -15,8 +15,8 @@ from typing import Any
 
 from Environment import CompileFailedException
 from Environment import Environment
-from ScoreboardTools import SB_Name2Code
-from Template import template_funcs
+from ParseTools import get_parse_cache
+from ScoreboardTools import use_symbols
 
 
 class Compiler:
@@ -37,19 +37,20 @@ class Compiler:
         self._last_start_time: float | None = None
         self._last_end_time: float | None = None
 
-    def compile(self, source_file: str):
+    def compile(self, source_file: str) -> bool:
         """
         编译源码文件
 
         :param source_file: 源码文件名
         :type source_file: str
-        :return: None
-        :rtype: None
+        :return: 是否编译成功
+        :rtype: bool
         """
         self._last_start_time = time.time()
 
-        with open(os.path.join(self.c_conf.READ_PATH, f"{source_file}.py"), mode='r', encoding=self._encoding) as _:
-            tree = ast.parse(_.read())
+        tree = get_parse_cache(self.c_conf).parse(
+            os.path.join(self.c_conf.READ_PATH, f"{source_file}.py"), self._encoding
+        )
 
         if self.c_conf.DEBUG_MODE:
             print(ast.dump(tree, indent=4))
@@ -57,7 +58,8 @@ class Compiler:
 
         compile_success: bool = False
         try:
-            self.env.generate_code(tree, self.env.ns_join_base(source_file), source_file)
+            with use_symbols(self.env.symbols):
+                self.env.generate_code(tree, self.env.ns_join_base(source_file), source_file)
             compile_success = True
         except CompileFailedException as err:
             traceback.print_exception(err.raw_exc)
@@ -76,9 +78,35 @@ class Compiler:
                 )
                 for line in tb.code_lines:
                     print(f"    {line}", file=sys.stderr)
+        finally:
+            if self.env.profiler is not None:
+                self.env.profiler.stop()
         self._last_end_time = time.time()
         if self.c_conf.DEBUG_MODE and compile_success:
             self.print_environment()
+        if self.env.profiler is not None:
+            self.dump_profile(source_file)
+
+        return compile_success
+
+    def dump_profile(self, source_file: str) -> None:
+        """
+        保存性能分析结果到 PROFILE_PATH (JSON统计 和 Chrome Trace)
+
+        :param source_file: 源码文件名
+        :type source_file: str
+        :return: None
+        :rtype: None
+        """
+        json_path = os.path.join(self.c_conf.PROFILE_PATH, f"{source_file}.profile.json")
+        trace_path = os.path.join(self.c_conf.PROFILE_PATH, f"{source_file}.trace.json")
+        # 入口文件可以在子文件夹中 (如 import_add/caller)
+        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+        self.env.profiler.dump_json(json_path)
+        self.env.profiler.dump_chrome_trace(trace_path)
+
+        self.env.profiler.print_summary()
+        print(f"[PROFILE] 性能分析结果已保存到 {json_path} 和 {trace_path}")
 
     def print_environment(self) -> None:
         # noinspection GrazieInspection
@@ -105,13 +133,13 @@ class Compiler:
         print(f"[DEBUG] FunctionArguments={_dumped_func_args}")
         print()
         _template_func = OrderedDict()
-        for name, func in template_funcs.items():
+        for name, func in self.env.template_funcs.items():
             _template_func[name] = repr(func)
         _dumped_template_func = _debug_dump(_template_func)
         print(f"[DEBUG] TemplateFunctions={_dumped_template_func}")
         print()
-        _dumped_sb_name2code = _debug_dump(SB_Name2Code)
-        print(f"[DEBUG] SB_Name2Code={_dumped_sb_name2code}")
+        _dumped_symbols = _debug_dump(self.env.symbols.name2code)
+        print(f"[DEBUG] SymbolTable={_dumped_symbols}")
         print()
         _dumped_ns_map = _debug_dump(self.env.namespace.namespace_tree)
         print(f"[DEBUG] NamespaceMap={_dumped_ns_map}")
@@ -122,6 +150,15 @@ class Compiler:
         _dumped_file_map = _debug_dump(self.env.file_namespace.namespace_tree)
         print(f"[DEBUG] FileMap={_dumped_file_map}")
         print()
+        _dumped_parse_cache = _debug_dump(get_parse_cache(self.c_conf).stats())
+        print(f"[DEBUG] ParseCache={_dumped_parse_cache}")
+        print()
+        if self.env.module_cache is not None:
+            _dumped_module_cache = _debug_dump(
+                {"hits": self.env.module_cache.hits, "misses": self.env.module_cache.misses}
+            )
+            print(f"[DEBUG] ModuleCache={_dumped_module_cache}")
+            print()
 
 
 def _deep_sorted(value: Any) -> Any:
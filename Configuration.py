@@ -8,6 +8,7 @@
 class GlobalConfiguration:
     DECIMAL_PRECISION: int = 3
     ResultExt: str = ".?Result"
+    ReturnExt: str = ".?Return"
 
     class _ScoreBoards:
         """
@@ -19,6 +20,7 @@ class GlobalConfiguration:
         Input = "Py.Input"
         Vars = "Py.Vars"
         FuncResult = "Py.FuncResult"
+        Consts = "Py.Consts"
 
     class _Flags:
         """
@@ -39,6 +41,8 @@ class GlobalConfiguration:
         Temp = "temporary"
         LocalVars = "LocalVars"
         LocalTemp = "LocalTemp"
+        LocalFrames = "LocalFrames"
+        MacroArgs = "MacroArgs"
 
     class _RawJsons:
         """
@@ -83,12 +87,15 @@ class GlobalConfiguration:
         self.SB_INPUT = self.ScoreBoards.Input
         self.SB_VARS = self.ScoreBoards.Vars
         self.SB_FUNC_RESULT = self.ScoreBoards.FuncResult
+        self.SB_CONSTS = self.ScoreBoards.Consts
 
         self.DataStorages = self._DataStorages()
         self.DS_ROOT = self.DataStorages.Root
         self.DS_TEMP = self.DataStorages.Temp
         self.DS_LOCAL_VARS = self.DataStorages.LocalVars
         self.DS_LOCAL_TEMP = self.DataStorages.LocalTemp
+        self.DS_LOCAL_FRAMES = self.DataStorages.LocalFrames
+        self.DS_MACRO_ARGS = self.DataStorages.MacroArgs
 
         self.RawJsons = self._RawJsons()
 
@@ -105,12 +112,56 @@ class CompileConfiguration:
             *,
             debug_mode: bool = False,
             generate_comments: bool = True,
+            cache_path: str | None = None,
+            profile_path: str | None = None,
+            optimize: bool = True,
+            inline_max_nodes: int = 40,
+            inline_max_statements: int = 4,
+            local_frame: bool = False,
+            target_version: tuple[int, int, int] = (1, 16, 5),
     ) -> None:
         self.base_namespace = base_namespace
         self.READ_PATH = read_path
         self.SAVE_PATH: str = save_path
         self.DEBUG_MODE = debug_mode
         self.GENERATE_COMMENTS = generate_comments
+        self.CACHE_PATH: str | None = cache_path
+        """模块编译缓存文件夹, 为None时不使用缓存"""
+        self.PROFILE_PATH: str | None = profile_path
+        """编译性能分析结果保存文件夹, 为None时不进行性能分析"""
+        self.OPTIMIZE: bool = optimize
+        """是否进行编译优化 (代码生成前内联函数并折叠常量表达式, 写入文件前进行窥孔优化)"""
+        self.INLINE_MAX_NODES: int = inline_max_nodes
+        """被内联的函数体的最大语法树节点数, 为0时不进行函数内联"""
+        self.INLINE_MAX_STATEMENTS: int = inline_max_statements
+        """被内联的函数体的最大语句数"""
+        self.LOCAL_FRAME: bool = local_frame
+        """
+        调用函数时将需要保存的变量和临时变量打包为一个复合标签压入 LocalFrames 栈并按字段恢复,
+        为False时每个值分别压入 LocalVars 和 LocalTemp 列表
+        """
+        self.TARGET_VERSION: tuple[int, int, int] = tuple(target_version)
+        """目标Minecraft版本, 决定生成的命令可以使用哪些特性"""
+
+    @property
+    def MACRO_SUPPORTED(self) -> bool:
+        """
+        目标版本是否支持函数宏 (1.20.2+), 支持时通过 function ... with storage 和 $ 命令传递函数参数
+
+        :return: 是否支持函数宏
+        :rtype: bool
+        """
+        return self.TARGET_VERSION >= (1, 20, 2)
+
+    @property
+    def NATIVE_RETURN_SUPPORTED(self) -> bool:
+        """
+        目标版本是否支持 return run (1.20.2+), 支持时使用原生return结束函数并通过 execute store 传递返回值
+
+        :return: 是否支持原生return
+        :rtype: bool
+        """
+        return self.TARGET_VERSION >= (1, 20, 2)
 
 
 __all__ = (
@@ -20,6 +20,7 @@ class ScoreBoards:
     Input = "Py.Input"
     Vars = "Py.Vars"
     FuncResult = "Py.FuncResult"
+    Consts = "Py.Consts"
 
 
 DataStorageRoot = "python"
@@ -86,6 +87,7 @@ SCOREBOARDS_PLACEHOLDER_MAP = {
     "SB:Input": ScoreBoards.Input,
     "SB:Vars": ScoreBoards.Vars,
     "SB:FuncResult": ScoreBoards.FuncResult,
+    "SB:Consts": ScoreBoards.Consts,
 }
 
 DATA_STORAGES_PLACEHOLDER_MAP = {
@@ -4,6 +4,8 @@
 一些调试用MCF命令生成器
 """
 
+from CommandTypes import Commands
+from CommandTypes import parse_command
 
 # import json
 #
@@ -138,7 +140,7 @@
 #     CallTemplate = {"text": "调用模板: ", "color": "gold", "bold": True}
 
 
-def FORCE_COMMENT(*texts: str, **kv_texts: str) -> str:
+def FORCE_COMMENT(*texts: str, **kv_texts: str) -> Commands:
     """
     强制生成注释文本 (可以安全的包含换行符)
 
@@ -146,8 +148,8 @@ def FORCE_COMMENT(*texts: str, **kv_texts: str) -> str:
     :type texts: str
     :param kv_texts: 调试键值对
     :type kv_texts: str
-    :return: 生成的注释
-    :rtype: str
+    :return: 生成的注释 (断点标记会被解析为 BreakPointMarker)
+    :rtype: Commands
     """
     nor_text = ' '.join(texts)
     kv_text = '\n'.join(f"{k} = {v}" for k, v in kv_texts.items())
@@ -158,12 +160,7 @@ def FORCE_COMMENT(*texts: str, **kv_texts: str) -> str:
     if kv_text:
         txt_ls.extend(kv_text.split('\n'))
 
-    ret = '\n# '.join(txt_ls)
-
-    if ret:
-        ret = f"# {ret}\n"
-
-    return ret
+    return Commands(parse_command(f"# {txt}") for txt in txt_ls)
 
 
 __all__ = (
@@ -11,59 +11,69 @@ import time
 import warnings
 from collections import OrderedDict
 from itertools import zip_longest
+from typing import Callable
 
 from ABCTypes import ABCEnvironment
-from BreakPointTools import BreakPointFlag
 from BreakPointTools import raiseBreakPoint
 from BreakPointTools import register_processor
 from BreakPointTools import updateBreakPoint
+from CommandTypes import BreakPointMarker
+from CommandTypes import Command
+from CommandTypes import Commands
+from CommandTypes import Comment
+from CommandTypes import DataModifyStorageValue
+from CommandTypes import ExecuteStoreScore
+from CommandTypes import ExecuteStoreStorage
+from CommandTypes import FunctionCall
+from CommandTypes import MacroCommand
+from CommandTypes import RawCommand
+from CommandTypes import ReturnRun
+from CommandTypes import ReturnValue
+from CommandTypes import ScoreGet
+from CommandTypes import ScoreRef
 from Configuration import CompileConfiguration
 from Configuration import GlobalConfiguration
-from DebuggingTools import FORCE_COMMENT
+from DependencyTools import is_import_alive
+from DependencyTools import is_parent_path
+from DispatchTools import GeneratorTable
 from NamespaceTools import join_file_ns
+from OptimizeTools import CallLiveness
+from OptimizeTools import INT_MAX
+from OptimizeTools import INT_MIN
+from OptimizeTools import ReturnFlow
+from OptimizeTools import SelfTailCall
+from OptimizeTools import TailReturn
+from OptimizeTools import annotate_call_liveness
+from OptimizeTools import annotate_return_flow
+from OptimizeTools import command_effects
+from OptimizeTools import constant_value
+from OptimizeTools import optimize_tree
+from OptimizeTools import terminates
 from ParameterTypes import ABCDefaultParameter
 from ParameterTypes import ABCKeyword
 from ParameterTypes import ABCVariableLengthParameter
 from ParameterTypes import parse_arguments
+from ParseTools import get_parse_cache
 from ScoreboardTools import CHECK_SB
+from ScoreboardTools import CHECK_SB_RANGE
 from ScoreboardTools import SBCheckType
 from ScoreboardTools import SBCompareType
 from ScoreboardTools import SBOperationType
+from ScoreboardTools import SB_ADD
 from ScoreboardTools import SB_ASSIGN
 from ScoreboardTools import SB_CONSTANT
 from ScoreboardTools import SB_OP
 from ScoreboardTools import SB_RESET
 from ScoreboardTools import gen_code
 from Template import call_template
-from Template import check_template
 from Template import init_template
-from Template import template_funcs
-
-loaded_modules: dict[str, bool] = {}
-
-
-def is_parent_path(path1, path2):
-    path1 = os.path.abspath(path1)
-    path2 = os.path.abspath(path2)
-    return os.path.commonpath([path1, path2]) == path1
-
-
-def is_import_alive(import_path: str, base: str = '') -> tuple[str | None, bool | None]:
-    package_local_path = import_path.replace(".", "\\")
-
-    full_path = os.path.normpath(os.path.join(base, package_local_path))
-    if os.path.isfile(f"{full_path}.py"):
-        return f"{full_path}.py", True
-    if os.path.isdir(full_path):
-        return full_path, False
-    return None, None
 
 
 def import_as(
         env: ABCEnvironment,
         c_conf: CompileConfiguration,
         g_conf: GlobalConfiguration,
-        name: str, as_name: str | None, namespace: str, *, register_ns: bool = True) -> tuple[str, bool]:
+        name: str, as_name: str | None, namespace: str, *, register_ns: bool = True) -> tuple[Commands, bool]:
     package_local_path = name.replace(".", "\\")
 
     safe_as_name = as_name or name
@@ -81,10 +91,19 @@ def import_as(
             raise Exception(f"无法导入 '{name}', {package_local_path}")
         is_template = True
 
-    if (not is_template) and check_template(sourcefile_path):
+    if (not is_template) and get_parse_cache(c_conf).is_template(sourcefile_path):
         is_template = True
 
-    command = ''
+    command = Commands()
+
+    if env.module_cache is not None:
+        env.module_cache.note_import(name)
+
+    if is_file:
+        importer = env.ns_split_base(namespace)[1].split('\\', 1)[0]
+        importer_path = is_import_alive(importer, c_conf.READ_PATH)[0]
+        if importer_path is not None:
+            env.import_graph.setdefault(os.path.abspath(importer_path), set()).add(os.path.abspath(sourcefile_path))
 
     if is_file and not is_template:
         new_namespace = env.ns_join_base(name)
@@ -94,8 +113,15 @@ def import_as(
         def _load():
             nonlocal command
             start_t = time.time()
-            with open(sourcefile_path, mode='r', encoding="utf-8") as f:
-                tree = ast.parse(f.read())
+            command += FunctionCall(f"{new_namespace}/.__module")
+
+            cache = env.module_cache
+            if (cache is not None) and cache.restore(env, sourcefile_path, name, new_namespace):
+                if c_conf.DEBUG_MODE:
+                    print(f"从缓存恢复模块 {sourcefile_path}, 耗时{time.time() - start_t}秒")
+                return
+
+            tree = get_parse_cache(c_conf).parse(sourcefile_path, c_conf.Encoding)
 
             if c_conf.DEBUG_MODE:
                 print("------------导入文件-----------")
@@ -103,20 +129,26 @@ def import_as(
                 print(ast.dump(tree, indent=4))
                 print("------------------------------")
 
-            env.generate_code(tree, new_namespace, name)
+            if cache is None:
+                env.generate_code(tree, new_namespace, name)
+            else:
+                with cache.record(env, sourcefile_path, name, new_namespace):
+                    env.generate_code(tree, new_namespace, name)
             end_t = time.time()
 
             if c_conf.DEBUG_MODE:
                 print(f"编译导入模块 {sourcefile_path}, 耗时{end_t - start_t}秒")
 
-            command += f"function {new_namespace}/.__module\n"
-
-        if sourcefile_path not in loaded_modules:
+        if sourcefile_path not in env.loaded_modules:
             _load()
-            loaded_modules[sourcefile_path] = True
+            env.loaded_modules.add(sourcefile_path)
         else:
             print(f"重复导入模块 {sourcefile_path}")
 
+        # 被导入的模块本身不会被执行, 它的常量加入导入方的常量池, 由入口模块的常量初始化函数统一赋值
+        if env.constant_pools and (new_namespace in env.module_constants):
+            env.constant_pools[-1].update(env.module_constants[new_namespace])
+
     if is_file and is_template:
         init_template(name, env, c_conf, g_conf)
         env.ns_init(env.ns_join_base(name), "module")
@@ -131,7 +163,7 @@ def import_as(
 def sbp_return(
         env: ABCEnvironment,
         g_conf: GlobalConfiguration,
-        func_path: str, level: str, name: str, objective: str) -> tuple[str, bool] | str:
+        func_path: str, level: str, name: str, objective: str) -> tuple[Commands, bool] | Commands:
     """
     处理return语句的断点
 
@@ -147,34 +179,34 @@ def sbp_return(
     :type name: str
     :param objective: 标记位计分项
     :type objective: str
-    :returns: 生成的命令字符串, 是否继续抛出断点
-    :rtype: tuple[str, bool] | str
+    :returns: 生成的命令, 是否继续抛出断点
+    :rtype: tuple[Commands, bool] | Commands
     """
 
-    def _process_raise() -> tuple[str, bool]:
-        command = ''
+    def _process_raise() -> tuple[Commands, bool]:
+        command = Commands()
         keep_raise: bool = True
         if level in ["module", "function"]:
             command += env.COMMENT("BP:Return.Reset")
             command += SB_RESET(name, objective)
             keep_raise = False
         else:
-            command += FORCE_COMMENT(BreakPointFlag(
+            command += BreakPointMarker(
                 "return",
                 name=name,
                 objective=objective
-            ))
+            )
         return command, keep_raise
 
-    def _process_split() -> str:
-        command = ''
+    def _process_split() -> Commands:
+        command = Commands()
         command += env.COMMENT("BP:Return.Split")
         command += CHECK_SB(
             SBCheckType.UNLESS,
             name, objective,
             SBCompareType.EQUAL,
             g_conf.Flags.TRUE, g_conf.SB_FLAGS,
-            f"function {func_path}"
+            FunctionCall(func_path)
         )
 
         return command
@@ -186,7 +218,7 @@ def sbp_return(
         return _process_split()
 
 
-DefaultCodeGenerators: dict = {}
+DefaultCodeGenerators: GeneratorTable = GeneratorTable()
 
 
 def register_default_gen(node_type):
@@ -198,10 +230,66 @@ def register_default_gen(node_type):
     return decorator
 
 
+def _result_of(g_conf: GlobalConfiguration, namespace: str, destination: tuple[str, str] | None) -> tuple[str, str]:
+    """
+    获取表达式结果的保存位置
+
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param namespace: 命名空间
+    :type namespace: str
+    :param destination: 调用者要求的保存位置
+    :type destination: tuple[str, str] | None
+    :return: (计分目标, 计分项)
+    :rtype: tuple[str, str]
+    """
+    if destination is None:
+        return f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
+    return destination
+
+
+def _may_touch(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        node: ast.AST, namespace: str, destination: tuple[str, str]) -> bool:
+    """
+    检查计算表达式时是否可能读取或修改保存位置 (此时不能先把其他值写入保存位置)
+
+    :param env: 运行环境
+    :type env: ABCEnvironment
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param node: 表达式节点
+    :type node: ast.AST
+    :param namespace: 命名空间
+    :type namespace: str
+    :param destination: 保存位置
+    :type destination: tuple[str, str]
+    :return: 是否可能读取或修改
+    :rtype: bool
+    """
+    name, objective = destination
+    for child in ast.walk(node):
+        # 函数调用可能读写任意变量和参数
+        if isinstance(child, ast.Call):
+            return True
+        if objective != g_conf.SB_VARS:
+            continue
+        if isinstance(child, ast.Attribute):
+            return True
+        if isinstance(child, ast.Name):
+            try:
+                if env.ns_getter(child.id, namespace)[0] == name:
+                    return True
+            except KeyError:
+                return True
+    return False
+
+
 @register_default_gen(type(None))
-def gen_none(g_conf: GlobalConfiguration, namespace: str) -> str:
+def gen_none(g_conf: GlobalConfiguration, namespace: str, destination: tuple[str, str] | None) -> Commands:
     return SB_ASSIGN(
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
+        *_result_of(g_conf, namespace, destination),
         g_conf.Flags.FALSE, g_conf.SB_FLAGS,
     )
 
@@ -211,7 +299,10 @@ def gen_module(
         env: ABCEnvironment,
         c_conf: CompileConfiguration,
         g_conf: GlobalConfiguration,
-        node: ast.Module, namespace: str, file_namespace: str) -> str:
+        node: ast.Module, namespace: str, file_namespace: str) -> Commands:
+    if c_conf.OPTIMIZE:
+        node = optimize_tree(node, c_conf.INLINE_MAX_NODES, c_conf.INLINE_MAX_STATEMENTS)
+
     env.ns_init(f"{namespace}", "file")
     env.temp_ns_init(f"{namespace}\\module")
 
@@ -237,54 +328,123 @@ def gen_module(
         namespace
     )
 
-    # 生成并写入
-    with env.writeable_file_namespace(join_file_ns(file_namespace, "module.mcfunction"), namespace) as f:
+    # 生成模块代码, 同时收集模块及其导入的模块中使用的常量
+    body = Commands()
+    env.constant_pools.append(set())
+    try:
         for statement in node.body:
-            c = env.generate_code(statement, f"{namespace}\\module", join_file_ns(file_namespace, "module"))
-            f.write(c)
+            body += env.generate_code(statement, f"{namespace}\\module", join_file_ns(file_namespace, "module"))
+    finally:
+        constants = env.constant_pools.pop()
+
+    # 常量池写入单独的初始化函数, 在模块开头调用 (包含导入的模块中使用的常量)
+    if constants:
+        env.module_constants[namespace] = constants
+        env.file_ns_setter(
+            ".consts.mcfunction",
+            join_file_ns(file_namespace, ".consts.mcfunction"),
+            file_namespace,
+            "module",
+            "mcfunction",
+            namespace
+        )
+        with env.writeable_file_namespace(join_file_ns(file_namespace, ".consts.mcfunction"), namespace) as f:
+            f.write(env.COMMENT(f"Module:初始化常量池", count=len(constants)))
+            for value in sorted(constants):
+                f.write(SB_CONSTANT(*_constant_holder(g_conf, value), value))
+
+    # 写入
+    with env.writeable_file_namespace(join_file_ns(file_namespace, "module.mcfunction"), namespace) as f:
+        if constants:
+            f.write(FunctionCall(env.ns_join_base(join_file_ns(file_namespace, ".consts")).replace('\\', '/')))
+        f.write(body)
         f.write(updateBreakPoint(env, c_conf, g_conf, f"{file_namespace}\\module"))
 
-    return ''
+    return Commands()
 
 
 @register_default_gen(ast.Name)
-def gen_name(env: ABCEnvironment, g_conf: GlobalConfiguration, node: ast.Name, namespace: str) -> str:
+def gen_name(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        node: ast.Name, namespace: str, destination: tuple[str, str] | None) -> Commands:
     assert isinstance(node.ctx, ast.Load)
-    command = ''
+    command = Commands()
     command += env.COMMENT(f"Name:读取变量", name=node.id)
     target_ns = env.ns_getter(node.id, namespace)[0]
     command += SB_ASSIGN(
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
+        *_result_of(g_conf, namespace, destination),
         f"{target_ns}", g_conf.SB_VARS
     )
     return command
 
 
-@register_default_gen(ast.Call)
-def gen_call(
+def _macro_key(name: str) -> str:
+    """
+    获取参数在函数宏中使用的键 (函数宏的键只能包含字母, 数字和下划线)
+
+    :param name: 参数名
+    :type name: str
+    :return: 函数宏的键
+    :rtype: str
+    """
+    if name.isascii():
+        return name
+    return f"_x{name.encode('utf-8').hex()}"
+
+
+def _gen_call_arguments(
         env: ABCEnvironment,
         c_conf: CompileConfiguration,
-        g_conf: GlobalConfiguration, node, namespace: str, file_namespace: str) -> str:
-    if isinstance(node.func, ast.Name) and node.func.id in dir(__builtins__):
-        raise Exception("暂不支持python内置函数")
-    else:
-        func_name, func_ns, ns = env.ns_from_node(node.func, namespace, not_exists_ok=True, ns_type="function")
+        g_conf: GlobalConfiguration,
+        node: ast.Call, func_ns: str, namespace: str, file_namespace: str) -> tuple[Commands, FunctionCall]:
+    """
+    计算调用函数时传入的参数值并写入被调用函数的参数
 
-    commands: str = ''
-    commands += env.COMMENT(f"Call:调用函数")
+    目标版本支持函数宏时, 参数值写入 MacroArgs 中属于这个调用位置的复合标签, 通过 function ... with storage 传入
 
-    # 如果是模版函数，则调用模版函数
-    template_func_name = f"{ns.split(':', maxsplit=1)[1]}.{func_name}"
-    if template_func_name in template_funcs:
-        commands += call_template(env, c_conf, g_conf, template_func_name, node, namespace, file_namespace)
-        return commands
+    参数中调用的函数可能再次执行到这个调用位置并覆盖已经写入的参数,
+    所以在最后一个包含函数调用的参数及之前的参数先计算到寄存器中, 所有参数计算完成后再统一写入
 
+    :param env: 运行环境
+    :type env: ABCEnvironment
+    :param c_conf: 编译配置
+    :type c_conf: CompileConfiguration
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param node: 调用节点
+    :type node: ast.Call
+    :param func_ns: 被调用函数的命名空间
+    :type func_ns: str
+    :param namespace: 命名空间
+    :type namespace: str
+    :param file_namespace: 文件命名空间
+    :type file_namespace: str
+    :return: 传递参数的命令, 调用函数的命令
+    :rtype: tuple[Commands, FunctionCall]
+    """
     try:
         this_func_args = env.func_args[func_ns]
     except KeyError:
         raise Exception(f"未注册过的函数: {func_ns}")
 
-    for name, value in zip_longest(this_func_args, node.args, fillvalue=None):
+    func_path = func_ns.replace('\\', '/')
+    macro_path = None
+    # 没有参数的函数不包含函数宏命令, 不需要传入复合标签
+    if c_conf.MACRO_SUPPORTED and this_func_args:
+        macro_path = f"{g_conf.DS_MACRO_ARGS}.call{env.newID('Call.MacroArgs')}"
+
+    last_call = max(
+        (i for i, value in enumerate(node.args) if any(isinstance(n, ast.Call) for n in ast.walk(value))),
+        default=-1
+    )
+
+    commands = Commands()
+    writes = Commands()
+    cleanup = Commands()
+    registers: list[str] = []
+    constants: dict[str, int] = {}
+    for i, (name, value) in enumerate(zip_longest(this_func_args, node.args, fillvalue=None)):
         if name is None:
             json_value = ast.dump(value)
             raise SyntaxError(f"函数 {func_ns} 在调用时传入了额外的值 {json_value}")
@@ -301,36 +461,121 @@ def gen_call(
             commands += env.COMMENT(f"Call:使用默认值", name=name, value=default_value)
             value = ast.Constant(value=argument.default)
 
-        commands += env.COMMENT("Call:计算参数值")
-        commands += env.generate_code(value, namespace, file_namespace)
+        source = None
+        if i <= last_call and not isinstance(value, ast.Constant):
+            commands += env.COMMENT("Call:计算参数值", name=name)
+            register = env.temp_ns_alloc(namespace)
+            commands += env.generate_code(value, namespace, file_namespace, (register, g_conf.SB_TEMP))
+            env.temp_ns_append(namespace, register)
+            registers.append(register)
+            cleanup += SB_RESET(register, g_conf.SB_TEMP)
+            source = ScoreRef(gen_code(register, g_conf.SB_TEMP), g_conf.SB_TEMP)
+
+        if macro_path is None:
+            if source is not None:
+                writes += SB_ASSIGN(f"{func_ns}.{name}", g_conf.SB_ARGS, register, g_conf.SB_TEMP)
+                continue
+            writes += env.COMMENT("Call:计算参数值", name=name)
+            writes += env.generate_code(value, namespace, file_namespace, (f"{func_ns}.{name}", g_conf.SB_ARGS))
+            continue
 
-        commands += env.COMMENT("Call:传递参数", name=name)
-        commands += SB_ASSIGN(
-            f"{func_ns}.{name}", g_conf.SB_ARGS,
-            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
+        arg_path = f"{macro_path}.{_macro_key(name)}"
+        # 常量参数合并为一条命令写入, 变量直接从计分板写入, 其他参数计算后经过 Args 计分项写入
+        if isinstance(value, ast.Constant) and isinstance(value.value, int):
+            constants[_macro_key(name)] = int(value.value)
+            continue
+
+        if source is not None:
+            writes += ExecuteStoreStorage(g_conf.DS_ROOT, arg_path, ScoreGet(source))
+            continue
+
+        writes += env.COMMENT("Call:计算参数值", name=name)
+        if isinstance(value, ast.Name):
+            source = ScoreRef(gen_code(env.ns_getter(value.id, namespace)[0], g_conf.SB_VARS), g_conf.SB_VARS)
+            writes += ExecuteStoreStorage(g_conf.DS_ROOT, arg_path, ScoreGet(source))
+            continue
+
+        writes += env.generate_code(value, namespace, file_namespace, (f"{func_ns}.{name}", g_conf.SB_ARGS))
+        writes += ExecuteStoreStorage(
+            g_conf.DS_ROOT, arg_path, ScoreGet(ScoreRef(gen_code(f"{func_ns}.{name}", g_conf.SB_ARGS), g_conf.SB_ARGS))
         )
+        writes += SB_RESET(f"{func_ns}.{name}", g_conf.SB_ARGS)
 
-        commands += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+    for register in registers:
+        env.temp_ns_remove(namespace, register)
 
-    func_path = func_ns.replace('\\', '/')
+    if constants:
+        # set value 会覆盖整个复合标签, 必须在写入其他参数之前执行
+        compound = ','.join(f"{key}:{value}" for key, value in constants.items())
+        commands += DataModifyStorageValue(g_conf.DS_ROOT, macro_path, "set", f"{{{compound}}}")
+    commands += writes
+    commands += cleanup
+
+    if macro_path is None:
+        return commands, FunctionCall(func_path)
+    return commands, FunctionCall(func_path, (g_conf.DS_ROOT, macro_path))
+
+
+@register_default_gen(ast.Call)
+def gen_call(
+        env: ABCEnvironment,
+        c_conf: CompileConfiguration,
+        g_conf: GlobalConfiguration,
+        node, namespace: str, file_namespace: str, destination: tuple[str, str] | None) -> Commands:
+    if isinstance(node.func, ast.Name) and node.func.id in dir(__builtins__):
+        raise Exception("暂不支持python内置函数")
+    else:
+        func_name, func_ns, ns = env.ns_from_node(node.func, namespace, not_exists_ok=True, ns_type="function")
+
+    commands = Commands()
+    commands += env.COMMENT(f"Call:调用函数")
+
+    # 如果是模版函数，则调用模版函数
+    template_func_name = f"{ns.split(':', maxsplit=1)[1]}.{func_name}"
+    if template_func_name in env.template_funcs:
+        commands += call_template(env, c_conf, g_conf, template_func_name, node, namespace, file_namespace)
+        if destination is not None:
+            commands += SB_ASSIGN(*destination, f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+            commands += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+        return commands
+
+    arguments, call = _gen_call_arguments(env, c_conf, g_conf, node, func_ns, namespace, file_namespace)
+    commands += arguments
 
     env.file_ns_setter(
         f"{func_name}.mcfunction$link", func_ns.split(':', maxsplit=1)[1], file_namespace,
         "function", "$link", namespace
     )
 
-    # 当在函数中调用函数时
-    if namespace != env.ns_join_base(env.ns_split_base(namespace)[1]) + "\\module":
-        store, load = env.ns_store_local(namespace)
+    env.func_calls.setdefault(namespace, set()).add(func_ns)
+
+    # 当在函数中调用可能再次执行到当前函数的函数时, 保存调用之后仍会被读取的局部变量
+    in_function = namespace != env.ns_join_base(env.ns_split_base(namespace)[1]) + "\\module"
+    save_locals = in_function and env.func_may_reach(func_ns, namespace)
+
+    if c_conf.NATIVE_RETURN_SUPPORTED:
+        if not save_locals:
+            # 被调用的函数通过原生return返回结果, 直接写入保存位置
+            result_name, result_objective = _result_of(g_conf, namespace, destination)
+            commands += ExecuteStoreScore(ScoreRef(gen_code(result_name, result_objective), result_objective), call)
+            return commands
+        # 恢复局部变量可能覆盖保存位置, 先写入被调用函数的返回值计分项
+        call = ExecuteStoreScore(ScoreRef(gen_code(f"{func_ns}", g_conf.SB_FUNC_RESULT), g_conf.SB_FUNC_RESULT), call)
+
+    if save_locals:
+        store, load = env.ns_store_local(namespace, getattr(node, CallLiveness.ATTRIBUTE, None))
         commands += store
-        commands += f"function {func_path}\n"
+        commands += call
         commands += load
     else:
-        commands += f"function {func_path}\n"
+        commands += call
 
     gen_code(f"{func_ns}", g_conf.SB_FUNC_RESULT)
+    # 递归调用的返回值可以直接作为当前函数的返回值
+    if destination == (f"{func_ns}", g_conf.SB_FUNC_RESULT):
+        return commands
     commands += SB_ASSIGN(
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
+        *_result_of(g_conf, namespace, destination),
         f"{func_ns}", g_conf.SB_FUNC_RESULT
     )
     commands += SB_RESET(f"{func_ns}", g_conf.SB_FUNC_RESULT)
@@ -341,7 +586,8 @@ def gen_call(
 @register_default_gen(ast.Constant)
 def gen_constant(
         env: ABCEnvironment,
-        g_conf: GlobalConfiguration, node: ast.Constant, namespace: str) -> str:
+        g_conf: GlobalConfiguration,
+        node: ast.Constant, namespace: str, destination: tuple[str, str] | None) -> Commands:
     value = node.value
 
     if type(value) is bool:
@@ -350,15 +596,18 @@ def gen_constant(
     if not isinstance(node.value, int):
         raise Exception(f"无法解析的常量 {node.value}")
 
-    command = ''
+    command = Commands()
     command += env.COMMENT(f"Constant:读取常量", value=value)
-    command += SB_CONSTANT(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP, value)
+    command += SB_CONSTANT(*_result_of(g_conf, namespace, destination), value)
 
     return command
 
 
 @register_default_gen(ast.Attribute)
-def gen_attribute(env: ABCEnvironment, g_conf: GlobalConfiguration, node: ast.Attribute, namespace: str) -> str:
+def gen_attribute(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        node: ast.Attribute, namespace: str, destination: tuple[str, str] | None) -> Commands:
     assert isinstance(node.ctx, ast.Load)
     if not isinstance(node.value, ast.Name):
         raise Exception("暂时无法解析的值")
@@ -366,11 +615,11 @@ def gen_attribute(env: ABCEnvironment, g_conf: GlobalConfiguration, node: ast.At
     base_namespace = env.ns_getter(node.value.id, namespace)[0]
     attr_namespace = env.ns_getter(node.attr, base_namespace)[0]
 
-    command = ''
+    command = Commands()
     command += env.COMMENT(f"Attribute:读取属性", base_ns=base_namespace, attr=node.attr)
 
     command += SB_ASSIGN(
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
+        *_result_of(g_conf, namespace, destination),
         f"{attr_namespace}", g_conf.SB_VARS
     )
 
@@ -380,7 +629,7 @@ def gen_attribute(env: ABCEnvironment, g_conf: GlobalConfiguration, node: ast.At
 @register_default_gen(ast.Expr)
 def gen_expr(
         env: ABCEnvironment,
-        g_conf: GlobalConfiguration, node: ast.Expr, namespace: str, file_namespace: str) -> str:
+        g_conf: GlobalConfiguration, node: ast.Expr, namespace: str, file_namespace: str) -> Commands:
     command = env.generate_code(node.value, namespace, file_namespace)
     try:
         cmd = SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
@@ -398,76 +647,175 @@ def gen_expr(
     return command
 
 
+def _constant_holder(g_conf: GlobalConfiguration, value: int) -> tuple[str, str]:
+    """
+    获取常量池中保存常量的计分目标
+
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param value: 常量值
+    :type value: int
+    :return: (计分目标, 计分项)
+    :rtype: tuple[str, str]
+    """
+    return str(value), g_conf.SB_CONSTS
+
+
+def _pool_constant(env: ABCEnvironment, g_conf: GlobalConfiguration, value: int) -> tuple[str, str] | None:
+    """
+    将常量加入正在编译的模块的常量池
+
+    :param env: 运行环境
+    :type env: ABCEnvironment
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param value: 常量值
+    :type value: int
+    :return: 常量的(计分目标, 计分项), 不在模块中编译时返回None
+    :rtype: tuple[str, str] | None
+    """
+    if not env.constant_pools:
+        return None
+    env.constant_pools[-1].add(value)
+    return _constant_holder(g_conf, value)
+
+
+# 二元运算符对应的计分操作类型
+_BIN_OPERATIONS: dict[type[ast.operator], str] = {
+    ast.Add: SBOperationType.ADD,
+    ast.Sub: SBOperationType.SUBTRACT,
+    ast.Mult: SBOperationType.MULTIPLY,
+    ast.Div: SBOperationType.DIVIDE,
+}
+
+
+def _gen_operate(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        operation: str, target: tuple[str, str], node: ast.AST, namespace: str, file_namespace: str) -> Commands:
+    """
+    生成 target operation= node 的命令, 常量直接加减或使用常量池中的计分目标
+
+    :param env: 运行环境
+    :type env: ABCEnvironment
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param operation: 计分操作类型
+    :type operation: str
+    :param target: 被操作的(计分目标, 计分项)
+    :type target: tuple[str, str]
+    :param node: 操作数节点 (计算时不应读写被操作的计分目标)
+    :type node: ast.AST
+    :param namespace: 命名空间
+    :type namespace: str
+    :param file_namespace: 文件命名空间
+    :type file_namespace: str
+    :return: 生成的命令
+    :rtype: Commands
+    """
+    command = Commands()
+
+    value = constant_value(node)
+    if value is not None:
+        if operation in (SBOperationType.ADD, SBOperationType.SUBTRACT):
+            delta = value if operation == SBOperationType.ADD else -value
+            if -INT_MAX <= delta <= INT_MAX:
+                command += SB_ADD(*target, delta)
+                return command
+
+        holder = _pool_constant(env, g_conf, value)
+        if holder is not None:
+            command += SB_OP(operation, *target, *holder)
+            return command
+
+    result = f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
+    command += env.generate_code(node, namespace, file_namespace)
+    command += SB_OP(operation, *target, *result)
+    command += SB_RESET(*result)
+
+    return command
+
+
 @register_default_gen(ast.BinOp)
 def gen_bin_op(
         env: ABCEnvironment,
-        g_conf: GlobalConfiguration, node: ast.BinOp, namespace: str, file_namespace: str) -> str:
-    command = ''
+        g_conf: GlobalConfiguration,
+        node: ast.BinOp, namespace: str, file_namespace: str, destination: tuple[str, str] | None) -> Commands:
+    command = Commands()
     command += env.COMMENT(f"BinOp:二进制运算", op=type(node.op).__name__)
 
-    command += env.COMMENT(f"BinOp:处理左值")
-    command += env.generate_code(node.left, namespace, file_namespace)
-
-    process_uid = env.newID("process")
-
-    process_ext = f".*BinOp{process_uid}"
+    if type(node.op) not in _BIN_OPERATIONS:
+        raise Exception(f"无法解析的运算符 {node.op}")
+    operation = _BIN_OPERATIONS[type(node.op)]
+
+    left, right = node.left, node.right
+    # 加法和乘法满足交换律, 常量放在右侧
+    if isinstance(node.op, (ast.Add, ast.Mult)) and constant_value(left) is not None \
+            and constant_value(right) is None:
+        left, right = right, left
+
+    # 计算右值时不会读写保存位置, 则直接在保存位置上计算, 否则使用寄存器
+    process_ns = None
+    if (destination is not None) and not _may_touch(env, g_conf, right, namespace, destination):
+        target = destination
+    else:
+        process_ns = env.temp_ns_alloc(namespace)
+        target = process_ns, g_conf.SB_TEMP
 
-    command += SB_ASSIGN(
-        f"{namespace}{process_ext}", g_conf.SB_TEMP,
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
-    )
-    env.temp_ns_append(namespace, f"{namespace}{process_ext}")
-    command += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+    command += env.COMMENT(f"BinOp:处理左值")
+    command += env.generate_code(left, namespace, file_namespace, target)
+    if process_ns is not None:
+        env.temp_ns_append(namespace, process_ns)
 
     command += env.COMMENT(f"BinOp:处理右值")
-    command += env.generate_code(node.right, namespace, file_namespace)
+    command += _gen_operate(env, g_conf, operation, target, right, namespace, file_namespace)
 
-    if isinstance(node.op, ast.Add):
-        command += SB_OP(
-            SBOperationType.ADD,
-            f"{namespace}{process_ext}", g_conf.SB_TEMP,
-            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
-        )
-    elif isinstance(node.op, ast.Sub):
-        command += SB_OP(
-            SBOperationType.SUBTRACT,
-            f"{namespace}{process_ext}", g_conf.SB_TEMP,
-            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
-        )
-    elif isinstance(node.op, ast.Mult):
-        command += SB_OP(
-            SBOperationType.MULTIPLY,
-            f"{namespace}{process_ext}", g_conf.SB_TEMP,
-            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
-        )
-    elif isinstance(node.op, ast.Div):
-        command += SB_OP(
-            SBOperationType.DIVIDE,
-            f"{namespace}{process_ext}", g_conf.SB_TEMP,
-            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
-        )
-    else:
-        raise Exception(f"无法解析的运算符 {node.op}")
+    if process_ns is not None:
+        command += env.COMMENT(f"BinOp:传递结果")
+        command += SB_ASSIGN(*_result_of(g_conf, namespace, destination), *target)
+        command += SB_RESET(*target)
+        env.temp_ns_remove(namespace, process_ns)
 
-    command += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+    return command
 
-    command += env.COMMENT(f"BinOp:传递结果")
-    command += SB_ASSIGN(
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
-        f"{namespace}{process_ext}", g_conf.SB_TEMP
-    )
 
-    command += SB_RESET(f"{namespace}{process_ext}", g_conf.SB_TEMP)
-    env.temp_ns_remove(namespace, f"{namespace}{process_ext}")
+def _assign_destination(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        node: ast.AST, namespace: str) -> tuple[str, str] | None:
+    """
+    在计算值之前获取赋值目标变量的计分目标 (不会注册新的变量)
 
-    return command
+    :param env: 运行环境
+    :type env: ABCEnvironment
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param node: 赋值目标节点
+    :type node: ast.AST
+    :param namespace: 命名空间
+    :type namespace: str
+    :return: (计分目标, 计分项), 无法提前确定时返回None
+    :rtype: tuple[str, str] | None
+    """
+    try:
+        name, _, root_ns = env.ns_from_node(node, namespace)
+    except KeyError:
+        if not isinstance(node, ast.Name):
+            return None
+        # 新变量会注册在当前命名空间下
+        name, root_ns = node.id, namespace
+    return f"{root_ns}.{name}", g_conf.SB_VARS
 
 
 @register_default_gen(ast.Assign)
 def gen_assign(
-        env: ABCEnvironment, g_conf: GlobalConfiguration, node: ast.Assign, namespace: str, file_namespace: str) -> str:
-    command = env.generate_code(node.value, namespace, file_namespace)
-    from_namespace = f"{namespace}{g_conf.ResultExt}"
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        node: ast.Assign, namespace: str, file_namespace: str) -> Commands:
+    # 直接计算到第一个变量中, 其余变量从第一个变量复制
+    destination = _assign_destination(env, g_conf, node.targets[0], namespace)
+    command = env.generate_code(node.value, namespace, file_namespace, destination)
+    source = _result_of(g_conf, namespace, destination)
 
     for t in node.targets:
         name, _, root_ns = env.ns_from_node(t, namespace, not_exists_ok=True, ns_type="variable")
@@ -476,12 +824,54 @@ def gen_assign(
 
         command += env.COMMENT(f"Assign:将结果赋值给变量", name=name)
         env.ns_setter(name, target_namespace, namespace, "variable")
-        command += SB_ASSIGN(
-            target_namespace, g_conf.SB_VARS,
-            from_namespace, g_conf.SB_TEMP
-        )
+        if (target_namespace, g_conf.SB_VARS) != source:
+            command += SB_ASSIGN(
+                target_namespace, g_conf.SB_VARS,
+                *source
+            )
+
+    if destination is None:
+        command += SB_RESET(*source)
+
+    return command
+
+
+@register_default_gen(ast.AugAssign)
+def gen_aug_assign(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        node: ast.AugAssign, namespace: str, file_namespace: str) -> Commands:
+    if type(node.op) not in _BIN_OPERATIONS:
+        raise Exception(f"无法解析的运算符 {node.op}")
+    operation = _BIN_OPERATIONS[type(node.op)]
+
+    name, target_namespace, _ = env.ns_from_node(node.target, namespace)
+    target = target_namespace, g_conf.SB_VARS
+
+    command = Commands()
+    command += env.COMMENT(f"AugAssign:增量赋值", name=name, op=type(node.op).__name__)
 
-        command += SB_RESET(f"{from_namespace}", g_conf.SB_TEMP)
+    # 常量直接加减或使用常量池
+    if constant_value(node.value) is not None:
+        command += _gen_operate(env, g_conf, operation, target, node.value, namespace, file_namespace)
+        return command
+
+    # 读取变量时只需要一条计分操作
+    if isinstance(node.value, ast.Name):
+        command += SB_OP(operation, *target, env.ns_getter(node.value.id, namespace)[0], g_conf.SB_VARS)
+        return command
+
+    if _may_touch(env, g_conf, node.value, namespace, target):
+        # 计算右值时可能读写目标变量, 需要先读取目标变量, 按 target = target op value 计算
+        if isinstance(node.target, ast.Name):
+            left = ast.Name(id=node.target.id, ctx=ast.Load())
+        else:
+            left = ast.Attribute(value=node.target.value, attr=node.target.attr, ctx=ast.Load())
+        value_node = ast.copy_location(ast.BinOp(left=left, op=node.op, right=node.value), node)
+        command += env.generate_code(value_node, namespace, file_namespace, target)
+        return command
+
+    command += _gen_operate(env, g_conf, operation, target, node.value, namespace, file_namespace)
 
     return command
 
@@ -491,8 +881,8 @@ def gen_import(
         env: ABCEnvironment,
         c_conf: CompileConfiguration,
         g_conf: GlobalConfiguration,
-        node: ast.Import, namespace: str) -> str:
-    command = ''
+        node: ast.Import, namespace: str) -> Commands:
+    command = Commands()
     for n in node.names:
         if not isinstance(n, ast.alias):
             raise Exception("Import 暂时只支持 alias")
@@ -510,7 +900,7 @@ def gen_import_from(
         env: ABCEnvironment,
         c_conf: CompileConfiguration,
         g_conf: GlobalConfiguration,
-        node: ast.ImportFrom, namespace: str) -> str:
+        node: ast.ImportFrom, namespace: str) -> Commands:
     command, is_file = import_as(env, c_conf, g_conf, node.module, None, namespace, register_ns=False)
     for n in node.names:
         if not isinstance(n, ast.alias):
@@ -533,7 +923,8 @@ def gen_import_from(
 @register_default_gen(ast.FunctionDef)
 def gne_func_def(
         env: ABCEnvironment,
-        node: ast.FunctionDef, namespace: str, file_namespace: str) -> str:
+        c_conf: CompileConfiguration,
+        node: ast.FunctionDef, namespace: str, file_namespace: str) -> Commands:
     # 注册路径
     new_file_ns = join_file_ns(file_namespace, f"{node.name}")
     env.mkdirs_file_ns(new_file_ns)
@@ -551,6 +942,9 @@ def gne_func_def(
     with env.writeable_file_namespace(func_file_ns, namespace) as f:
         env.ns_setter(node.name, f"{namespace}\\{node.name}", namespace, "function")
         env.temp_ns_init(f"{namespace}\\{node.name}")
+        env.func_calls[f"{namespace}\\{node.name}"] = set()
+        annotate_call_liveness(node)
+        annotate_return_flow(node)
 
         f.write(env.COMMENT(f"FunctionDef:函数头"))
         args = env.generate_code(node.args, f"{namespace}\\{node.name}", new_file_ns)
@@ -559,16 +953,19 @@ def gne_func_def(
         for statement in node.body:
             body = env.generate_code(statement, f"{namespace}\\{node.name}", new_file_ns)
             f.write(body)
-    return ''
+        if c_conf.NATIVE_RETURN_SUPPORTED and not any(terminates(statement) for statement in node.body):
+            # 调用者总是通过 execute store 读取返回值, 没有执行return时返回0
+            f.write(ReturnValue(0))
+    return Commands()
 
 
 @register_default_gen(ast.Global)
 def gen_global(
-        env: ABCEnvironment, node: ast.Global, namespace: str) -> str:
+        env: ABCEnvironment, node: ast.Global, namespace: str) -> Commands:
     for n in node.names:
         target_ns = env.ns_getter(n, namespace)[0]
         env.ns_setter(n, target_ns, namespace, "variable")
-    return ''
+    return Commands()
 
 
 @register_default_gen(ast.If)
@@ -576,12 +973,12 @@ def gen_if(
         env: ABCEnvironment,
         c_conf: CompileConfiguration,
         g_conf: GlobalConfiguration,
-        node: ast.If, namespace: str, file_namespace: str) -> str:
+        node: ast.If, namespace: str, file_namespace: str) -> Commands:
     block_uid = env.newID("if-block")
 
     base_namespace = f"{namespace}\\.if"
 
-    # 如果父级不是if块，则创建一个if块
+    # 如果父级不是if块，则注册一个if块 (写入块函数时才创建文件夹)
     f_ns, f_name = file_namespace.rsplit('\\', maxsplit=1)
     f_father_ns = env.file_ns_getter(f_name, f_ns, ret_raw=True)[0]
     if f_father_ns[".__level__"] != "if":
@@ -591,73 +988,191 @@ def gen_if(
             "if", "folder", namespace
         )
         new_file_ns = join_file_ns(file_namespace, ".if")
-        env.mkdirs_file_ns(new_file_ns)
     else:
         new_file_ns = file_namespace
-    # 注册路径
-    if_block_ns = join_file_ns(new_file_ns, f"{block_uid}.mcfunction")
-    env.file_ns_setter(
-        f"{block_uid}.mcfunction", if_block_ns,
-        new_file_ns,
-        "if", "mcfunction", namespace
+    # 使用原生return时, 一定会return的分支直接返回块函数的结果, 可能return的分支通过标记位通知调用处
+    kinds = (ReturnFlow.NONE, ReturnFlow.NONE)
+    if c_conf.NATIVE_RETURN_SUPPORTED:
+        kinds = getattr(node, ReturnFlow.BRANCHES, kinds)
+    return_flag = (f"{namespace}{g_conf.ReturnExt}", g_conf.SB_TEMP)
+
+    func_path = f"{base_namespace}\\{block_uid}".replace('\\', '/')
+    # 生成if块和else块
+    body_comments, body = _gen_if_branch(
+        env, c_conf, g_conf,
+        node.body, kinds[0], f"{block_uid}", func_path,
+        namespace, file_namespace, new_file_ns
     )
-    else_block_ns = join_file_ns(new_file_ns, f"{block_uid}-else.mcfunction")
-    env.file_ns_setter(
-        f"{block_uid}-else.mcfunction", else_block_ns,
-        new_file_ns,
-        "if", "mcfunction", namespace
+    else_comments, orelse = _gen_if_branch(
+        env, c_conf, g_conf,
+        node.orelse, kinds[1], f"{block_uid}-else", f"{func_path}-else",
+        namespace, file_namespace, new_file_ns
     )
-    # 生成并写入if块
-    with env.writeable_file_namespace(if_block_ns, namespace) as f:
-        for statement in node.body:
-            body = env.generate_code(statement, namespace, new_file_ns)
-            f.write(body)
-        f.write(updateBreakPoint(env, c_conf, g_conf, file_namespace))
-    # 生成并写入else块
-    with env.writeable_file_namespace(else_block_ns, namespace) as f:
-        for statement in node.orelse:
-            body = env.generate_code(statement, namespace, new_file_ns)
-            f.write(body)
-        f.write(updateBreakPoint(env, c_conf, g_conf, file_namespace))
 
-    command = ''
-    func_path = f"{base_namespace}\\{block_uid}".replace('\\', '/')
+    command = Commands()
 
-    command += env.generate_code(node.test, namespace, file_namespace)
+    condition, check_type, guard, cleanup = _gen_condition(env, g_conf, node.test, namespace, file_namespace)
+    command += condition
 
-    command += env.COMMENT(f"IF:检查条件")
-    command += CHECK_SB(
-        SBCheckType.UNLESS,
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
-        SBCompareType.EQUAL,
-        g_conf.Flags.FALSE, g_conf.SB_FLAGS,
-        f"function {func_path}"
-    )
-    command += CHECK_SB(
-        SBCheckType.IF,
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
-        SBCompareType.EQUAL,
-        g_conf.Flags.FALSE, g_conf.SB_FLAGS,
-        f"function {func_path}-else"
-    )
+    if ReturnFlow.MIXED in kinds:
+        command += SB_RESET(*return_flag)
 
-    command += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+    command += body_comments
+    command += else_comments
+    command += env.COMMENT(f"IF:检查条件")
+    negated_type = SBCheckType.IF if check_type == SBCheckType.UNLESS else SBCheckType.UNLESS
+    guards = [
+        Commands(guard(check_type, cmd) for cmd in body),
+        Commands(guard(negated_type, cmd) for cmd in orelse),
+    ]
+    # 分支执行后条件中的分数可能已被重置, 分数不存在时只有 if 检查一定不通过, 所以 unless 检查需要先执行
+    if check_type == SBCheckType.IF:
+        guards.reverse()
+    command += guards
+
+    command += cleanup
+
+    if ReturnFlow.MIXED in kinds:
+        command += env.COMMENT("IF:分支中执行了return时继续返回")
+        flagged = getattr(node, ReturnFlow.FLAGGED, False)
+        result = _native_return_result(g_conf, namespace, flagged)
+        if not flagged:
+            # 标记位属于函数而不是某次调用, 返回前必须重置, 否则递归调用的调用者会误认为自己的分支执行了return
+            block_name = f"{block_uid}-return"
+            block_ns = join_file_ns(new_file_ns, f"{block_name}.mcfunction")
+            env.mkdirs_file_ns(new_file_ns)
+            env.file_ns_setter(
+                f"{block_name}.mcfunction", block_ns,
+                new_file_ns,
+                "if", "mcfunction", namespace
+            )
+            with env.writeable_file_namespace(block_ns, namespace) as f:
+                f.write(SB_RESET(*return_flag))
+                f.write(result)
+            result = ReturnRun(FunctionCall(f"{func_path}-return"))
+        command += CHECK_SB_RANGE(SBCheckType.IF, *return_flag, 1, 1, result)
 
     return command
 
 
-@register_default_gen(ast.Return)
-def gen_return(
+# 不超过这个数量的分支命令直接内联到条件检查中, 不生成块函数
+INLINE_BRANCH_COMMANDS: int = 2
+
+
+def _inline_commands(commands: Commands) -> tuple[Commands, Commands] | None:
+    """
+    将分支的命令分为注释和需要条件执行的命令
+
+    :param commands: 分支的命令
+    :type commands: Commands
+    :return: (注释, 需要条件执行的命令), 命令过多或包含不能放在 execute run 之后的命令时返回None
+    :rtype: tuple[Commands, Commands] | None
+    """
+    comments = Commands()
+    inlined = Commands()
+    for command in commands:
+        if isinstance(command, Comment) or (isinstance(command, RawCommand) and not command.text):
+            comments.append(command)
+        elif isinstance(command, (BreakPointMarker, MacroCommand)):
+            return None
+        else:
+            inlined.append(command)
+    if len(inlined) > INLINE_BRANCH_COMMANDS:
+        return None
+    return comments, inlined
+
+
+def _gen_if_branch(
         env: ABCEnvironment,
+        c_conf: CompileConfiguration,
         g_conf: GlobalConfiguration,
-        node: ast.Return, namespace: str, file_namespace: str) -> str:
-    command = ''
-    command += env.COMMENT("Return:计算返回值")
+        statements: list[ast.stmt], kind: int, block_name: str, block_path: str,
+        namespace: str, file_namespace: str, block_file_ns: str) -> tuple[Commands, Commands]:
+    """
+    生成if的一个分支
 
-    command += env.generate_code(node.value, namespace, file_namespace)
+    分支的命令足够少时直接内联到条件检查中, 没有命令时不生成任何内容, 否则写入块函数
 
-    command += env.COMMENT("Return:保存返回值")
+    :param env: 运行环境
+    :type env: ABCEnvironment
+    :param c_conf: 编译配置
+    :type c_conf: CompileConfiguration
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param statements: 分支中的语句
+    :type statements: list[ast.stmt]
+    :param kind: 分支的return类型 (ReturnFlow)
+    :type kind: int
+    :param block_name: 块函数文件名 (不含扩展名)
+    :type block_name: str
+    :param block_path: 块函数路径
+    :type block_path: str
+    :param namespace: 命名空间
+    :type namespace: str
+    :param file_namespace: if语句所在的文件命名空间
+    :type file_namespace: str
+    :param block_file_ns: 块函数所在的文件命名空间
+    :type block_file_ns: str
+    :return: (写在条件检查前的注释, 需要条件执行的命令)
+    :rtype: tuple[Commands, Commands]
+    """
+    return_flag = (f"{namespace}{g_conf.ReturnExt}", g_conf.SB_TEMP)
+    block_ns = join_file_ns(block_file_ns, f"{block_name}.mcfunction")
+
+    def _open_block():
+        env.mkdirs_file_ns(block_file_ns)
+        env.file_ns_setter(
+            f"{block_name}.mcfunction", block_ns,
+            block_file_ns,
+            "if", "mcfunction", namespace
+        )
+        block = env.writeable_file_namespace(block_ns, namespace)
+        block.open()
+        return block
 
+    # 可能return的分支结束时需要重置标记位, 总是写入块函数
+    f = _open_block() if kind == ReturnFlow.MIXED else None
+    pending = Commands()
+    try:
+        for statement in statements:
+            body = env.generate_code(statement, namespace, block_file_ns)
+            if f is None:
+                pending += body
+                if _inline_commands(pending) is not None:
+                    continue
+                f = _open_block()
+                body, pending = pending, Commands()
+            f.write(body)
+        if kind == ReturnFlow.MIXED:
+            f.write(SB_RESET(*return_flag))
+
+        tail = updateBreakPoint(env, c_conf, g_conf, file_namespace)
+        if f is None:
+            pending += tail
+            split = _inline_commands(pending)
+            # 条件检查在每条内联的命令前都会重新执行, 除最后一条外的命令都不能影响检查的临时分数
+            if split is not None and all(
+                    not effects.barrier and all(ref.objective != g_conf.SB_TEMP for ref in effects.refs())
+                    for effects in map(command_effects, split[1][:-1])
+            ):
+                return split
+            f = _open_block()
+            tail = pending
+        f.write(tail)
+    finally:
+        if f is not None:
+            f.close()
+
+    call = FunctionCall(block_path)
+    if kind == ReturnFlow.ALWAYS:
+        return Commands(), Commands((ReturnRun(call),))
+    return Commands(), Commands((call,))
+
+
+def _gen_return_value(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        node: ast.Return, namespace: str, file_namespace: str) -> Commands:
     ns, name = namespace.rsplit('\\', 1)
     func_map: dict = env.ns_getter(name, ns, ret_raw=True)[0]
     if func_map[".__type__"] != "function":
@@ -665,12 +1180,80 @@ def gen_return(
 
     func_name = func_map[".__namespace__"]
 
-    command += SB_ASSIGN(
-        f"{func_name}", g_conf.SB_FUNC_RESULT,
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
-    )
+    command = Commands()
+    command += env.COMMENT("Return:计算返回值")
+    command += env.generate_code(node.value, namespace, file_namespace, (f"{func_name}", g_conf.SB_FUNC_RESULT))
 
-    command += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+    return command
+
+
+def _native_return_result(g_conf: GlobalConfiguration, func_name: str, flagged: bool) -> Command:
+    """
+    生成以已经写入的返回值结束当前函数的原生return命令
+
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param func_name: 函数命名空间
+    :type func_name: str
+    :param flagged: 是否位于可能return的分支中 (返回值和标记位由分支的调用处读取)
+    :type flagged: bool
+    :return: 生成的命令
+    :rtype: Command
+    """
+    if flagged:
+        return ReturnValue(0)
+    return ReturnRun(ScoreGet(ScoreRef(gen_code(func_name, g_conf.SB_FUNC_RESULT), g_conf.SB_FUNC_RESULT)))
+
+
+def _gen_native_return(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        node: ast.Return, namespace: str, file_namespace: str) -> Commands:
+    """
+    生成原生return命令, 不再通过断点分割后续代码
+
+    :param env: 运行环境
+    :type env: ABCEnvironment
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param node: return节点
+    :type node: ast.Return
+    :param namespace: 命名空间
+    :type namespace: str
+    :param file_namespace: 文件命名空间
+    :type file_namespace: str
+    :return: 生成的命令
+    :rtype: Commands
+    """
+    value = node.value
+    flagged = getattr(node, ReturnFlow.FLAGGED, False)
+    if not flagged and (value is None or (isinstance(value, ast.Constant) and isinstance(value.value, int))):
+        command = Commands()
+        command += env.COMMENT("Return:返回常量")
+        command += ReturnValue(0 if value is None else int(value.value))
+        return command
+
+    command = _gen_return_value(env, g_conf, node, namespace, file_namespace)
+    if flagged:
+        command += env.COMMENT("Return:设置标记位")
+        command += SB_ASSIGN(
+            f"{namespace}{g_conf.ReturnExt}", g_conf.SB_TEMP,
+            g_conf.Flags.TRUE, g_conf.SB_FLAGS
+        )
+    command += _native_return_result(g_conf, namespace, flagged)
+    return command
+
+
+@register_default_gen(ast.Return)
+def gen_return(
+        env: ABCEnvironment,
+        c_conf: CompileConfiguration,
+        g_conf: GlobalConfiguration,
+        node: ast.Return, namespace: str, file_namespace: str) -> Commands:
+    if c_conf.NATIVE_RETURN_SUPPORTED:
+        return _gen_native_return(env, g_conf, node, namespace, file_namespace)
+
+    command = _gen_return_value(env, g_conf, node, namespace, file_namespace)
 
     command += env.COMMENT("BP:Return.Enable")
     breakpoint_id = f"breakpoint_return_{env.newID("return.breakpoint")}"
@@ -679,106 +1262,300 @@ def gen_return(
         g_conf.Flags.TRUE, g_conf.SB_FLAGS
     )
 
-    command += FORCE_COMMENT(BreakPointFlag(
+    command += BreakPointMarker(
         "return",
         name=breakpoint_id,
         objective=g_conf.SB_TEMP
-    ))
+    )
     raiseBreakPoint(env, file_namespace, "return", name=breakpoint_id, objective=g_conf.SB_TEMP)
 
     return command
 
 
-@register_default_gen(ast.Compare)
-def gen_compare(
+@register_default_gen(TailReturn)
+def gen_tail_return(
         env: ABCEnvironment,
+        c_conf: CompileConfiguration,
         g_conf: GlobalConfiguration,
-        node: ast.Compare, namespace: str, file_namespace: str) -> str:
-    command = ''
-    command += env.COMMENT(f"Compare:比较操作", **{
-        f"op{i}": type(cmp).__name__ for i, cmp in enumerate(node.comparators)
-    })
+        node: TailReturn, namespace: str, file_namespace: str) -> Commands:
+    if c_conf.NATIVE_RETURN_SUPPORTED:
+        return _gen_native_return(env, g_conf, node, namespace, file_namespace)
+    # 函数末尾的return之后没有需要跳过的代码, 不需要抛出断点
+    return _gen_return_value(env, g_conf, node, namespace, file_namespace)
 
-    command += env.COMMENT(f"Compare:处理左值")
-    command += env.generate_code(node.left, namespace, file_namespace)
 
-    command += SB_ASSIGN(
-        f"{namespace}.*CompareLeft", g_conf.SB_TEMP,
-        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
+@register_default_gen(SelfTailCall)
+def gen_self_tail_call(
+        env: ABCEnvironment,
+        c_conf: CompileConfiguration,
+        g_conf: GlobalConfiguration,
+        node: SelfTailCall, namespace: str, file_namespace: str) -> Commands:
+    # 调用后当前函数不会再执行其他命令, 局部变量不需要保存, 被调用的函数直接写入当前函数的返回值
+    func_name, func_ns, _ = env.ns_from_node(node.value.func, namespace)
+
+    commands = Commands()
+    commands += env.COMMENT("SelfTailCall:重新执行函数", name=func_name)
+    arguments, call = _gen_call_arguments(env, c_conf, g_conf, node.value, func_ns, namespace, file_namespace)
+    commands += arguments
+    env.func_calls.setdefault(namespace, set()).add(func_ns)
+
+    env.file_ns_setter(
+        f"{func_name}.mcfunction$link", func_ns.split(':', maxsplit=1)[1], file_namespace,
+        "function", "$link", namespace
     )
+    if not c_conf.NATIVE_RETURN_SUPPORTED:
+        commands += call
+    elif getattr(node, ReturnFlow.FLAGGED, False):
+        commands += ExecuteStoreScore(ScoreRef(gen_code(func_ns, g_conf.SB_FUNC_RESULT), g_conf.SB_FUNC_RESULT), call)
+        commands += SB_ASSIGN(
+            f"{namespace}{g_conf.ReturnExt}", g_conf.SB_TEMP,
+            g_conf.Flags.TRUE, g_conf.SB_FLAGS
+        )
+        commands += ReturnValue(0)
+    else:
+        commands += ReturnRun(call)
 
-    command += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+    return commands
 
-    if len(node.ops) > 1:
-        raise Exception("暂时无法解析多个比较符")
 
+# 比较符对应的 (检查类型, 比较类型, 注释中的名称)
+_COMPARE_CHECKS: dict[type[ast.cmpop], tuple[str, str, str]] = {
+    ast.Eq: (SBCheckType.IF, SBCompareType.EQUAL, "Eq(==)"),
+    ast.NotEq: (SBCheckType.UNLESS, SBCompareType.EQUAL, "NotEq(!=)"),
+    ast.Gt: (SBCheckType.IF, SBCompareType.MORE, "Gt(>)"),
+    ast.Lt: (SBCheckType.IF, SBCompareType.LESS, "Lt(<)"),
+    ast.GtE: (SBCheckType.IF, SBCompareType.MORE_EQUAL, "GtE(>=)"),
+    ast.LtE: (SBCheckType.IF, SBCompareType.LESS_EQUAL, "LtE(<=)"),
+}
+
+_MIRRORED_COMPARE: dict[type[ast.cmpop], type[ast.cmpop]] = {
+    ast.Gt: ast.Lt,
+    ast.Lt: ast.Gt,
+    ast.GtE: ast.LtE,
+    ast.LtE: ast.GtE,
+}
+
+
+def _compare_range(node: ast.Compare) -> tuple[ast.expr, str, int | None, int | None] | None:
+    """
+    将与常量的比较转换为对另一侧分数范围的检查
+
+    :param node: 比较节点 (只有一个比较符)
+    :type node: ast.Compare
+    :return: (被检查的表达式, 检查类型, 范围下界, 范围上界), 没有常量或无法表示为范围时返回None
+    :rtype: tuple[ast.expr, str, int | None, int | None] | None
+    """
+    op = type(node.ops[0])
+    operand, value = node.left, constant_value(node.comparators[0])
+    if value is None:
+        # 常量在左侧时交换两侧
+        operand, value = node.comparators[0], constant_value(node.left)
+        op = _MIRRORED_COMPARE.get(op, op)
+    if value is None:
+        return None
+
+    if op is ast.Eq:
+        return operand, SBCheckType.IF, value, value
+    if op is ast.NotEq:
+        return operand, SBCheckType.UNLESS, value, value
+    if op is ast.Gt and value < INT_MAX:
+        return operand, SBCheckType.IF, value + 1, None
+    if op is ast.Lt and value > INT_MIN:
+        return operand, SBCheckType.IF, None, value - 1
+    if op is ast.GtE:
+        return operand, SBCheckType.IF, value, None
+    if op is ast.LtE:
+        return operand, SBCheckType.IF, None, value
+    return None
+
+
+def _gen_compare_range(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        range_check: tuple[ast.expr, str, int | None, int | None],
+        namespace: str, file_namespace: str, destination: tuple[str, str] | None) -> Commands:
+    """
+    生成与常量比较的命令, 使用 matches 检查分数范围, 不需要计算常量
+
+    :param env: 运行环境
+    :type env: ABCEnvironment
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param range_check: _compare_range 的结果
+    :type range_check: tuple[ast.expr, str, int | None, int | None]
+    :param namespace: 命名空间
+    :type namespace: str
+    :param file_namespace: 文件命名空间
+    :type file_namespace: str
+    :param destination: 保存位置
+    :type destination: tuple[str, str] | None
+    :return: 生成的命令
+    :rtype: Commands
+    """
+    operand, check_type, low, high = range_check
+
+    command = Commands()
+    command += env.COMMENT(f"Compare:处理比较值")
+    command += env.generate_code(operand, namespace, file_namespace)
+
+    # 比较值保存在 {namespace}{ResultExt} 中, 没有指定保存位置时需要先把结果写入寄存器
+    result_ns = None
+    if destination is None:
+        result_ns = env.temp_ns_alloc(namespace)
+        flag = result_ns, g_conf.SB_TEMP
+    else:
+        flag = destination
+
+    command += env.COMMENT(f"Compare:检查范围", check=check_type, low=low, high=high)
+    command += SB_ASSIGN(*flag, g_conf.Flags.FALSE, g_conf.SB_FLAGS)
+    if result_ns is not None:
+        env.temp_ns_append(namespace, result_ns)
+    command += CHECK_SB_RANGE(
+        check_type,
+        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
+        low, high,
+        SB_ASSIGN(*flag, g_conf.Flags.TRUE, g_conf.SB_FLAGS)
+    )
+
+    if result_ns is None:
+        command += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+        return command
+
+    command += env.COMMENT(f"Compare:传递结果")
     command += SB_ASSIGN(
-        f"{namespace}.*CompareResult", g_conf.SB_TEMP,
-        g_conf.Flags.FALSE, g_conf.SB_FLAGS
+        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
+        result_ns, g_conf.SB_TEMP
     )
 
-    for i, op in enumerate(node.ops):
-        command += env.COMMENT(f"Compare:提取左值")
-        command += SB_ASSIGN(
-            f"{namespace}.*CompareCalculate", g_conf.SB_TEMP,
-            f"{namespace}.*CompareLeft", g_conf.SB_TEMP
-        )
+    command += SB_RESET(result_ns, g_conf.SB_TEMP)
+    env.temp_ns_remove(namespace, result_ns)
 
-        command += env.COMMENT(f"Compare:处理右值")
-        command += env.generate_code(node.comparators[i], namespace, file_namespace)
-
-        if isinstance(op, ast.Eq):
-            command += env.COMMENT(f"Compare:比较", op="Eq(==)")
-            check_type = SBCheckType.IF
-            check_op = SBCompareType.EQUAL
-        elif isinstance(op, ast.NotEq):
-            command += env.COMMENT(f"Compare:比较", op="NotEq(!=)")
-            check_type = SBCheckType.UNLESS
-            check_op = SBCompareType.EQUAL
-        elif isinstance(op, ast.Gt):
-            command += env.COMMENT(f"Compare:比较", op="Gt(>)")
-            check_type = SBCheckType.IF
-            check_op = SBCompareType.MORE
-        elif isinstance(op, ast.Lt):
-            command += env.COMMENT(f"Compare:比较", op="Lt(<)")
-            check_type = SBCheckType.IF
-            check_op = SBCompareType.LESS
-        elif isinstance(op, ast.GtE):
-            command += env.COMMENT(f"Compare:比较", op="GtE(>=)")
-            check_type = SBCheckType.IF
-            check_op = SBCompareType.MORE_EQUAL
-        elif isinstance(op, ast.LtE):
-            command += env.COMMENT(f"Compare:比较", op="LtE(<=)")
-            check_type = SBCheckType.IF
-            check_op = SBCompareType.LESS_EQUAL
-        else:
-            raise Exception(f"无法解析的比较符 {op}")
+    return command
 
-        command += CHECK_SB(
-            check_type,
-            f"{namespace}.*CompareCalculate", g_conf.SB_TEMP,
-            check_op,
-            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
-            SB_ASSIGN(
-                f"{namespace}.*CompareResult", g_conf.SB_TEMP,
-                g_conf.Flags.TRUE, g_conf.SB_FLAGS,
-                line_break=False
-            )
+
+def _gen_condition(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        test: ast.expr, namespace: str, file_namespace: str
+) -> tuple[Commands, str, Callable[[str, Command], Command], Commands]:
+    """
+    生成条件检查, 比较直接作为 execute if|unless score 的条件, 不再计算比较结果的布尔值
+
+    :param env: 运行环境
+    :type env: ABCEnvironment
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param test: 条件表达式
+    :type test: ast.expr
+    :param namespace: 命名空间
+    :type namespace: str
+    :param file_namespace: 文件命名空间
+    :type file_namespace: str
+    :return: (计算条件所需的命令, 条件成立时的检查类型, 根据检查类型生成条件执行命令的函数, 重置分数的命令)
+    :rtype: tuple[Commands, str, Callable[[str, Command], Command], Commands]
+    """
+    result = f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
+
+    command = Commands()
+    cleanup = Commands()
+    if isinstance(test, ast.Compare) and len(test.ops) == 1 and type(test.ops[0]) in _COMPARE_CHECKS:
+        range_check = _compare_range(test)
+        if range_check is not None:
+            operand, check_type, low, high = range_check
+            command += env.COMMENT(f"IF:计算比较值")
+            command += env.generate_code(operand, namespace, file_namespace)
+            cleanup += SB_RESET(*result)
+            return command, check_type, lambda t, cmd: CHECK_SB_RANGE(t, *result, low, high, cmd), cleanup
+
+        check_type, check_op, _ = _COMPARE_CHECKS[type(test.ops[0])]
+        command += env.COMMENT(f"IF:计算左值")
+        left_ns = env.temp_ns_alloc(namespace)
+        command += env.generate_code(test.left, namespace, file_namespace, (left_ns, g_conf.SB_TEMP))
+        env.temp_ns_append(namespace, left_ns)
+        command += env.COMMENT(f"IF:计算右值")
+        command += env.generate_code(test.comparators[0], namespace, file_namespace)
+        env.temp_ns_remove(namespace, left_ns)
+        cleanup += SB_RESET(left_ns, g_conf.SB_TEMP)
+        cleanup += SB_RESET(*result)
+        return (
+            command, check_type,
+            lambda t, cmd: CHECK_SB(t, left_ns, g_conf.SB_TEMP, check_op, *result, cmd),
+            cleanup
         )
 
-        command += env.COMMENT(f"Compare:重置计算临时变量")
-        command += SB_RESET(f"{namespace}.*CompareCalculate", g_conf.SB_TEMP)
+    command += env.generate_code(test, namespace, file_namespace)
+    cleanup += SB_RESET(*result)
+    return command, SBCheckType.UNLESS, lambda t, cmd: CHECK_SB_RANGE(t, *result, 0, 0, cmd), cleanup
+
+
+@register_default_gen(ast.Compare)
+def gen_compare(
+        env: ABCEnvironment,
+        g_conf: GlobalConfiguration,
+        node: ast.Compare, namespace: str, file_namespace: str, destination: tuple[str, str] | None) -> Commands:
+    command = Commands()
+    command += env.COMMENT(f"Compare:比较操作", **{
+        f"op{i}": type(cmp).__name__ for i, cmp in enumerate(node.comparators)
+    })
+
+    if len(node.ops) > 1:
+        raise Exception("暂时无法解析多个比较符")
+    op = node.ops[0]
+
+    range_check = _compare_range(node)
+    if range_check is not None:
+        command += _gen_compare_range(env, g_conf, range_check, namespace, file_namespace, destination)
+        return command
+
+    command += env.COMMENT(f"Compare:处理左值")
+    # 只有左值需要在计算右值 (可能调用函数) 时保持存活
+    left_ns = env.temp_ns_alloc(namespace)
+    command += env.generate_code(node.left, namespace, file_namespace, (left_ns, g_conf.SB_TEMP))
+    env.temp_ns_append(namespace, left_ns)
+
+    command += env.COMMENT(f"Compare:处理右值")
+    command += env.generate_code(node.comparators[0], namespace, file_namespace)
+
+    if type(op) not in _COMPARE_CHECKS:
+        raise Exception(f"无法解析的比较符 {op}")
+    check_type, check_op, op_name = _COMPARE_CHECKS[type(op)]
+    command += env.COMMENT(f"Compare:比较", op=op_name)
+
+    # 右值保存在 {namespace}{ResultExt} 中, 没有指定保存位置时需要先把结果写入寄存器
+    result_ns = None
+    if destination is None:
+        result_ns = env.temp_ns_alloc(namespace)
+        flag = result_ns, g_conf.SB_TEMP
+    else:
+        flag = destination
+
+    command += SB_ASSIGN(*flag, g_conf.Flags.FALSE, g_conf.SB_FLAGS)
+    if result_ns is not None:
+        env.temp_ns_append(namespace, result_ns)
+    command += CHECK_SB(
+        check_type,
+        left_ns, g_conf.SB_TEMP,
+        check_op,
+        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
+        SB_ASSIGN(*flag, g_conf.Flags.TRUE, g_conf.SB_FLAGS)
+    )
 
     command += env.COMMENT(f"Compare:重置左值")
-    command += SB_RESET(f"{namespace}.*CompareLeft", g_conf.SB_TEMP)
+    command += SB_RESET(left_ns, g_conf.SB_TEMP)
+    env.temp_ns_remove(namespace, left_ns)
+
+    if result_ns is None:
+        command += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+        return command
 
     command += env.COMMENT(f"Compare:传递结果")
     command += SB_ASSIGN(
         f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
-        f"{namespace}.*CompareResult", g_conf.SB_TEMP
+        result_ns, g_conf.SB_TEMP
     )
 
-    command += SB_RESET(f"{namespace}.*CompareResult", g_conf.SB_TEMP)
+    command += SB_RESET(result_ns, g_conf.SB_TEMP)
+    env.temp_ns_remove(namespace, result_ns)
 
     return command
 
@@ -786,8 +1563,9 @@ def gen_compare(
 @register_default_gen(ast.arguments)
 def gen_arguments(
         env: ABCEnvironment,
+        c_conf: CompileConfiguration,
         g_conf: GlobalConfiguration,
-        node: ast.arguments, namespace: str) -> str:
+        node: ast.arguments, namespace: str) -> Commands:
     if namespace in env.func_args:
         warnings.warn(
             f"函数命名空间 {namespace} 已经存在, 可能覆盖之前的定义",
@@ -795,7 +1573,7 @@ def gen_arguments(
             stacklevel=0
         )
 
-    command = ''
+    command = Commands()
 
     command += env.COMMENT(f"arguments:处理参数")
 
@@ -809,8 +1587,14 @@ def gen_arguments(
         if isinstance(argument, ABCVariableLengthParameter):
             raise Exception(f"函数参数 {name} 包含*参数, 暂时无法处理")
 
-        gen_code(f"{namespace}.{name}", g_conf.SB_ARGS)
         env.ns_setter(name, f"{namespace}.{name}", namespace, "variable")
+        if c_conf.MACRO_SUPPORTED:
+            # 参数通过函数宏传入, 直接写入变量
+            target = ScoreRef(gen_code(f"{namespace}.{name}", g_conf.SB_VARS), g_conf.SB_VARS)
+            command += MacroCommand(f"scoreboard players set {target} $({_macro_key(name)})")
+            continue
+
+        gen_code(f"{namespace}.{name}", g_conf.SB_ARGS)
         command += SB_ASSIGN(
             f"{namespace}.{name}", g_conf.SB_VARS,
             f"{namespace}.{name}", g_conf.SB_ARGS
@@ -827,60 +1611,61 @@ def gen_arguments(
 def gen_unary_op(
         env: ABCEnvironment,
         g_conf: GlobalConfiguration,
-        node: ast.UnaryOp, namespace: str, file_namespace: str) -> str:
-    command = ''
+        node: ast.UnaryOp, namespace: str, file_namespace: str, destination: tuple[str, str] | None) -> Commands:
+    command = Commands()
 
     command += env.COMMENT(f"UnaryOp:一元操作", op=type(node.op).__name__)
-    command += env.generate_code(node.operand, namespace, file_namespace)
-
-    if isinstance(node.op, ast.Not):
-        command += env.COMMENT(f"UnaryOp:运算", op="Not(not)")
-        command += CHECK_SB(
-            SBCheckType.UNLESS,
-            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
-            SBCompareType.EQUAL,
-            g_conf.Flags.FALSE, g_conf.SB_FLAGS,
-            SB_ASSIGN(
-                f"{namespace}.*UnaryOp", g_conf.SB_TEMP,
-                g_conf.Flags.FALSE, g_conf.SB_FLAGS,
-                line_break=False
-            )
-        )
 
-        command += CHECK_SB(
-            SBCheckType.IF,
-            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
-            SBCompareType.EQUAL,
-            g_conf.Flags.FALSE, g_conf.SB_FLAGS,
-            SB_ASSIGN(
-                f"{namespace}.*UnaryOp", g_conf.SB_TEMP,
-                g_conf.Flags.TRUE, g_conf.SB_FLAGS,
-                line_break=False
-            )
-        )
-
-    elif isinstance(node.op, ast.USub):
+    if isinstance(node.op, ast.USub):
+        # 直接在保存位置上取反
+        target = _result_of(g_conf, namespace, destination)
+        command += env.generate_code(node.operand, namespace, file_namespace, destination)
         command += env.COMMENT(f"UnaryOp:运算", op="USub(-)")
-        command += SB_ASSIGN(
-            f"{namespace}.*UnaryOp", g_conf.SB_TEMP,
-            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP
-        )
         command += SB_OP(
             SBOperationType.MULTIPLY,
-            f"{namespace}.*UnaryOp", g_conf.SB_TEMP,
-            g_conf.Flags.NEG, g_conf.SB_FLAGS
+            *target,
+            *(_pool_constant(env, g_conf, -1) or (g_conf.Flags.NEG, g_conf.SB_FLAGS))
         )
-    else:
+        return command
+
+    if not isinstance(node.op, ast.Not):
         raise Exception(f"暂时无法解析的UnaryOp运算 {node.op}")
 
-    command += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+    command += env.generate_code(node.operand, namespace, file_namespace)
 
-    command += env.COMMENT(f"UnaryOp:传递结果")
-    command += SB_ASSIGN(
+    # 操作数保存在 {namespace}{ResultExt} 中, 没有指定保存位置时需要先把结果写入寄存器
+    unary_ns = None
+    if destination is None:
+        unary_ns = env.temp_ns_alloc(namespace)
+        target = unary_ns, g_conf.SB_TEMP
+    else:
+        target = destination
+
+    command += env.COMMENT(f"UnaryOp:运算", op="Not(not)")
+    command += CHECK_SB_RANGE(
+        SBCheckType.UNLESS,
+        f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
+        0, 0,
+        SB_ASSIGN(*target, g_conf.Flags.FALSE, g_conf.SB_FLAGS)
+    )
+    if unary_ns is not None:
+        env.temp_ns_append(namespace, unary_ns)
+    command += CHECK_SB_RANGE(
+        SBCheckType.IF,
         f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
-        f"{namespace}.*UnaryOp", g_conf.SB_TEMP
+        0, 0,
+        SB_ASSIGN(*target, g_conf.Flags.TRUE, g_conf.SB_FLAGS)
     )
 
-    command += SB_RESET(f"{namespace}.*UnaryOp", g_conf.SB_TEMP)
+    command += SB_RESET(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
+
+    if unary_ns is not None:
+        command += env.COMMENT(f"UnaryOp:传递结果")
+        command += SB_ASSIGN(
+            f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP,
+            unary_ns, g_conf.SB_TEMP
+        )
+        command += SB_RESET(unary_ns, g_conf.SB_TEMP)
+        env.temp_ns_remove(namespace, unary_ns)
 
     return command
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# cython: language_level = 3
+"""
+解析源码文件之间的导入依赖
+"""
+
+import os
+
+from Configuration import CompileConfiguration
+from ParseTools import get_parse_cache
+
+
+def is_parent_path(path1, path2):
+    path1 = os.path.abspath(path1)
+    path2 = os.path.abspath(path2)
+    return os.path.commonpath([path1, path2]) == path1
+
+
+def is_import_alive(import_path: str, base: str = '') -> tuple[str | None, bool | None]:
+    package_local_path = import_path.replace(".", "\\")
+
+    full_path = os.path.normpath(os.path.join(base, package_local_path))
+    if os.path.isfile(f"{full_path}.py"):
+        return f"{full_path}.py", True
+    if os.path.isdir(full_path):
+        return full_path, False
+    return None, None
+
+
+def resolve_source_module(c_conf: CompileConfiguration, name: str) -> str | None:
+    """
+    将导入名称解析为会生成输出的源码文件 (模板文件和包不会生成输出)
+
+    :param c_conf: 编译配置
+    :type c_conf: CompileConfiguration
+    :param name: 导入名称
+    :type name: str
+    :return: 源码文件绝对路径, 不是源码文件时返回None
+    :rtype: str | None
+    """
+    sourcefile_path, is_file = is_import_alive(name, c_conf.READ_PATH)
+    if (sourcefile_path is None) or (not is_file):
+        return None
+    if get_parse_cache(c_conf).is_template(sourcefile_path):
+        return None
+    return os.path.abspath(sourcefile_path)
+
+
+def direct_dependencies(c_conf: CompileConfiguration, source_file_path: str) -> set[str]:
+    """
+    获取源码文件直接导入的源码文件
+
+    :param c_conf: 编译配置
+    :type c_conf: CompileConfiguration
+    :param source_file_path: 源码文件路径
+    :type source_file_path: str
+    :return: 源码文件绝对路径集合
+    :rtype: set[str]
+    """
+    dependencies = set()
+    for name in get_parse_cache(c_conf).import_names(source_file_path, c_conf.Encoding):
+        dependency = resolve_source_module(c_conf, name)
+        if dependency is not None:
+            dependencies.add(dependency)
+
+    return dependencies
+
+
+def scan_dependencies(c_conf: CompileConfiguration, entry: str) -> set[str]:
+    """
+    扫描入口文件及其递归导入的所有源码文件
+
+    :param c_conf: 编译配置
+    :type c_conf: CompileConfiguration
+    :param entry: 入口文件名
+    :type entry: str
+    :return: 源码文件绝对路径集合 (包含入口文件本身)
+    :rtype: set[str]
+    """
+    entry_path = os.path.abspath(os.path.join(c_conf.READ_PATH, f"{entry}.py"))
+
+    found: set[str] = set()
+    waiting: list[str] = [entry_path]
+    while waiting:
+        path = waiting.pop()
+        if path in found:
+            continue
+        found.add(path)
+        waiting.extend(direct_dependencies(c_conf, path))
+
+    return found
+
+
+__all__ = (
+    "is_parent_path",
+    "is_import_alive",
+
+    "resolve_source_module",
+    "direct_dependencies",
+    "scan_dependencies",
+)
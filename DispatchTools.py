@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# cython: language_level = 3
+"""
+预编译代码生成器, 模板函数, 断点处理函数的调用适配器
+"""
+
+import inspect
+from typing import Any
+from typing import Callable
+from typing import Iterable
+
+GeneratorParams: tuple[str, ...] = ("namespace", "file_namespace", "node", "env", "c_conf", "g_conf", "destination")
+"""代码生成器可以接收的参数, 也是代码生成器调用适配器的参数顺序"""
+
+
+def build_adapter(
+        func: Callable,
+        provided: tuple[str, ...],
+        *,
+        passthrough: bool = False,
+        parameters: Iterable[str] | None = None
+) -> Callable:
+    """
+    生成调用适配器, 适配器按 provided 的顺序接收位置参数, 只把 func 需要的参数以关键字形式传给 func
+
+    例: provided=("env", "node"), func只需要node时生成::
+
+        def adapter(env, node):
+            return func(node=node)
+
+    :param func: 被调用的函数
+    :type func: Callable
+    :param provided: 调用方能提供的参数名
+    :type provided: tuple[str, ...]
+    :param passthrough: 为True时适配器额外接收两个前置参数 (args, kwargs) 并原样展开传给 func
+    :type passthrough: bool
+    :param parameters: func的参数名, 为None时从函数签名获取
+    :type parameters: Iterable[str] | None
+    :return: 调用适配器
+    :rtype: Callable
+    """
+    if parameters is None:
+        parameters = inspect.signature(func).parameters.keys()
+    parameters = set(parameters)
+
+    call_args = [f"{name}={name}" for name in provided if name in parameters]
+    head = list(provided)
+    if passthrough:
+        head = ["__args", "__kwargs", *head]
+        call_args = ["*__args", "**__kwargs", *call_args]
+
+    source = f"def adapter({', '.join(head)}):\n    return __func({', '.join(call_args)})\n"
+    namespace: dict[str, Any] = {"__func": func}
+    name = getattr(func, "__qualname__", "func")
+    exec(compile(source, f"<adapter of {name}>", "exec"), namespace)
+
+    adapter = namespace["adapter"]
+    adapter.__name__ = adapter.__qualname__ = f"{name}_adapter"
+    adapter.__wrapped__ = func
+    return adapter
+
+
+class GeneratorTable(dict):
+    """
+    代码生成器表 {节点类型: {"func": 生成器, "params": 参数名集合, "call": 调用适配器}}
+
+    写入时自动补全 "params" 和 "call", 调用适配器的参数顺序见 GeneratorParams
+
+    .. warning::
+       直接修改已写入的字典中的 "func" 不会更新调用适配器, 请重新写入整个字典
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__()
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key: Any, info: dict[str, Any]) -> None:
+        func = info["func"]
+        params = info.get("params")
+        if params is None:
+            params = set(inspect.signature(func).parameters.keys())
+
+        call = info.get("call")
+        if (call is None) or (getattr(call, "__wrapped__", None) is not func):
+            call = build_adapter(func, GeneratorParams, parameters=params)
+
+        super().__setitem__(key, {**info, "params": params, "call": call})
+
+    def update(self, *args, **kwargs) -> None:
+        for key, info in dict(*args, **kwargs).items():
+            self[key] = info
+
+    def setdefault(self, key: Any, default: dict[str, Any] = None) -> dict[str, Any]:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self) -> "GeneratorTable":
+        return type(self)(self)
+
+
+class AdapterTable(dict):
+    """
+    {注册名: 函数} 表, 写入时同时生成调用适配器, 通过 adapters 属性访问
+
+    .. seealso::
+        :func:`build_adapter`
+    """
+
+    def __init__(self, provided: tuple[str, ...], *, passthrough: bool = False) -> None:
+        """
+        初始化
+
+        :param provided: 调用方能提供的参数名
+        :type provided: tuple[str, ...]
+        :param passthrough: 适配器是否额外接收 (args, kwargs) 两个前置参数
+        :type passthrough: bool
+        :return: None
+        :rtype: None
+        """
+        super().__init__()
+        self.provided = provided
+        self.passthrough = passthrough
+        self.adapters: dict[Any, Callable] = {}
+
+    def __setitem__(self, key: Any, func: Callable) -> None:
+        super().__setitem__(key, func)
+        self.adapters[key] = build_adapter(func, self.provided, passthrough=self.passthrough)
+
+    def __delitem__(self, key: Any) -> None:
+        super().__delitem__(key)
+        del self.adapters[key]
+
+    def update(self, *args, **kwargs) -> None:
+        for key, func in dict(*args, **kwargs).items():
+            self[key] = func
+
+    def pop(self, key: Any, *default) -> Any:
+        self.adapters.pop(key, None)
+        return super().pop(key, *default)
+
+    def clear(self) -> None:
+        super().clear()
+        self.adapters.clear()
+
+    def copy(self) -> "AdapterTable":
+        table = type(self)(self.provided, passthrough=self.passthrough)
+        dict.update(table, self)
+        table.adapters.update(self.adapters)
+        return table
+
+
+__all__ = (
+    "GeneratorParams",
+    "build_adapter",
+
+    "GeneratorTable",
+    "AdapterTable",
+)
@@ -12,7 +12,12 @@ from typing import Any
 from typing import override
 
 from ABCTypes import ABCEnvironment
+from BreakPointTools import BreakPointProcessor
 from BreakPointTools import SplitBreakPoint
+from CacheTools import ModuleCache
+from CommandTypes import BreakPointMarker
+from CommandTypes import Commands
+from CommandTypes import RawCommand
 from Configuration import CompileConfiguration
 from Configuration import GlobalConfiguration
 from DebuggingTools import FORCE_COMMENT
@@ -20,6 +25,10 @@ from DefaultCodeGenerators import DefaultCodeGenerators
 from NamespaceTools import FileNamespace
 from NamespaceTools import Namespace
 from NamespaceTools import join_file_ns
+from ProfilerTools import CompileProfiler
+from ScoreboardTools import SB_ASSIGN
+from ScoreboardTools import SB_RESET
+from ScoreboardTools import SymbolTable
 
 
 class SBPWrapper(SplitBreakPoint):
@@ -34,17 +43,21 @@ class SBPWrapper(SplitBreakPoint):
         self._write2file('\n')
 
     @override
-    def _parse_comment(self, text: str) -> bool:
-        result = super()._parse_comment(text)
-        if result:
-            self._copyright()
-        return result
+    def _split(self, marker: BreakPointMarker) -> None:
+        super()._split(marker)
+        self._copyright()
 
     @override
     def open(self) -> None:
         super().open()
         self._copyright()
 
+    @override
+    def _open_path(self, path: str) -> None:
+        super()._open_path(path)
+        if self._env.module_cache is not None:
+            self._env.module_cache.note_file(path)
+
 
 class Environment(ABCEnvironment):
     """
@@ -56,37 +69,70 @@ class Environment(ABCEnvironment):
         :class:`ABC.ABCEnvironment`
     """
 
-    def __init__(self, c_conf: CompileConfiguration, g_conf: GlobalConfiguration = None):
-        super().__init__(c_conf, g_conf)
+    def __init__(
+            self,
+            c_conf: CompileConfiguration,
+            g_conf: GlobalConfiguration = None,
+            symbols: SymbolTable | None = None
+    ):
+        super().__init__(c_conf, g_conf, symbols)
         self.namespace = Namespace(self.c_conf.base_namespace)
         self.file_namespace = FileNamespace()
         self.code_generators = DefaultCodeGenerators.copy()
+        self.breakpoint_processors = BreakPointProcessor.copy()
+        if self.c_conf.CACHE_PATH is not None:
+            self.module_cache = ModuleCache(self.c_conf, self.g_conf)
+        if self.c_conf.PROFILE_PATH is not None:
+            self.profiler = CompileProfiler()
+            self.profiler.instrument(
+                self.namespace, ("getter", "setter", "init_root", "node_to_namespace", "store_local"), "namespace"
+            )
+            self.profiler.instrument(self.file_namespace, ("getter", "setter", "init_root"), "file_namespace")
 
     @override
-    def generate_code(self, node: Any, namespace: str, file_namespace: str) -> str:
+    def generate_code(
+            self,
+            node: Any,
+            namespace: str,
+            file_namespace: str,
+            destination: tuple[str, str] | None = None
+    ) -> Commands:
+        if self.profiler is None:
+            return self._generate_code(node, namespace, file_namespace, destination)
+
+        frame = self.profiler.enter("node", type(node).__name__, file_namespace.split('\\', 1)[0])
+        result = None
+        try:
+            result = self._generate_code(node, namespace, file_namespace, destination)
+            return result
+        finally:
+            self.profiler.exit(frame, result)
+
+    def _generate_code(
+            self,
+            node: Any,
+            namespace: str,
+            file_namespace: str,
+            destination: tuple[str, str] | None
+    ) -> Commands:
 
         try:
             generator_info = self.code_generators[type(node)]
         except KeyError:
             warnings.warn(f"无法解析的节点: {namespace}.{type(node).__name__}", UserWarning)
             err_msg = json.dumps({"text": f"无法解析的节点: {namespace}.{type(node).__name__}", "color": "red"})
-            return f"tellraw @a {err_msg}\n" + self.COMMENT("无法解析的节点:") + self.COMMENT(ast.dump(node, indent=4))
-
-        code_generator = generator_info["func"]
-        params_data = {
-            "namespace": namespace,
-            "file_namespace": file_namespace,
-            "node": node,
-            "env": self,
-            "c_conf": self.c_conf,
-            "g_conf": self.g_conf
-        }
-
-        required_params = generator_info["params"] & set(params_data.keys())
-        required_data = {k: params_data[k] for k in required_params}
-
+            return (
+                RawCommand(f"tellraw @a {err_msg}")
+                + self.COMMENT("无法解析的节点:")
+                + self.COMMENT(ast.dump(node, indent=4))
+            )
+
+        # 不支持指定结果保存位置的代码生成器, 结果先保存到 {namespace}{ResultExt} 再复制
+        copy_result = (destination is not None) and ("destination" not in generator_info["params"])
         try:
-            result = code_generator(**required_data)
+            result = generator_info["call"](
+                namespace, file_namespace, node, self, self.c_conf, self.g_conf, None if copy_result else destination
+            )
         except CompileFailedException as err:
             if not hasattr(node, "lineno"):
                 raise
@@ -100,9 +146,10 @@ class Environment(ABCEnvironment):
                 new_exception.add_traceback(c_traceback)
             raise new_exception
 
-        if result is None:
-            result = ''
-
+        result = Commands.coerce(result)
+        if copy_result:
+            result += SB_ASSIGN(*destination, f"{namespace}{self.g_conf.ResultExt}", self.g_conf.SB_TEMP)
+            result += SB_RESET(f"{namespace}{self.g_conf.ResultExt}", self.g_conf.SB_TEMP)
         return result
 
     @override
@@ -137,8 +184,8 @@ class Environment(ABCEnvironment):
         return self.namespace.getter(name, namespace, ret_raw)
 
     @override
-    def ns_store_local(self, namespace: str) -> tuple[str, str]:
-        return self.namespace.store_local(self.g_conf, self.COMMENT, namespace)
+    def ns_store_local(self, namespace: str, live_names: set[str] | None = None) -> tuple[Commands, Commands]:
+        return self.namespace.store_local(self.g_conf, self.COMMENT, namespace, live_names, self.c_conf.LOCAL_FRAME)
 
     @override
     def temp_ns_init(self, namespace: str) -> None:
@@ -152,6 +199,10 @@ class Environment(ABCEnvironment):
     def temp_ns_remove(self, namespace: str, name: str) -> None:
         self.namespace.remove_temp(namespace, name)
 
+    @override
+    def temp_ns_alloc(self, namespace: str) -> str:
+        return self.namespace.alloc_temp(namespace)
+
     @override
     def file_ns_init(self, file_namespace: str, level: str | None, file_ns_type: str, ns: str) -> None:
         self.file_namespace.init_root(file_namespace, level, file_ns_type, ns)
@@ -179,10 +230,12 @@ class Environment(ABCEnvironment):
     def mkdirs_file_ns(self, file_namespace: str, *args: str) -> None:
         f_ns = join_file_ns(file_namespace, *args)
         os.makedirs(self.file_ns2path(f_ns), exist_ok=True)
+        if self.module_cache is not None:
+            self.module_cache.note_dir(self.file_ns2path(f_ns))
 
     @override
     def writeable_file_namespace(self, file_namespace: str, namespace: str) -> SBPWrapper:
-        return SBPWrapper(
+        wrapper = SBPWrapper(
             self,
             self.c_conf,
             self.g_conf,
@@ -190,11 +243,15 @@ class Environment(ABCEnvironment):
             namespace,
             encoding=self.c_conf.Encoding
         )
+        if self.profiler is not None:
+            self.profiler.instrument(wrapper, ("_open_path", "close"), "io")
+            self.profiler.instrument(wrapper, ("write",), "io", measure_text=True)
+        return wrapper
 
     @override
-    def COMMENT(self, *texts: str, **kv_texts: str) -> str:
+    def COMMENT(self, *texts: str, **kv_texts: str) -> Commands:
         if not self.c_conf.GENERATE_COMMENTS:
-            return ''
+            return Commands()
 
         return FORCE_COMMENT(*texts, **kv_texts)
 
@@ -216,7 +273,7 @@ class CompileTraceback:
     ) -> None:
         """
         初始化
-        
+
         :param source_file_path: 正在编译的源码文件绝对路径
         :type source_file_path: str
         :param lineno: 正在编译的源码起始行号
@@ -12,8 +12,17 @@ from typing import override
 
 from ABCTypes import ABCFileNamespace
 from ABCTypes import ABCNamespace
+from CommandTypes import Commands
+from CommandTypes import DataGetStorage
+from CommandTypes import DataModifyStorage
+from CommandTypes import DataModifyStorageValue
+from CommandTypes import DataRemoveStorage
+from CommandTypes import ExecuteStoreScore
+from CommandTypes import ExecuteStoreStorage
+from CommandTypes import ScoreGet
+from CommandTypes import ScoreRef
 from Configuration import GlobalConfiguration
-from ScoreboardTools import SB_Name2Code
+from ScoreboardTools import current_symbols
 
 
 class Namespace(ABCNamespace):
@@ -42,6 +51,7 @@ class Namespace(ABCNamespace):
     @override
     def init_temp(self, namespace: str) -> None:
         self.temp_ns[namespace] = []
+        self.temp_reserved[namespace] = set()
 
     @override
     def append_temp(self, namespace: str, name: str) -> None:
@@ -49,8 +59,23 @@ class Namespace(ABCNamespace):
 
     @override
     def remove_temp(self, namespace: str, name: str) -> None:
+        reserved = self.temp_reserved.get(namespace, set())
+        if name in reserved:
+            reserved.discard(name)
+            if name not in self.temp_ns[namespace]:
+                return
         self.temp_ns[namespace].remove(name)
 
+    @override
+    def alloc_temp(self, namespace: str) -> str:
+        reserved = self.temp_reserved.setdefault(namespace, set())
+        index = 0
+        while f"{namespace}.*Reg{index}" in reserved:
+            index += 1
+        name = f"{namespace}.*Reg{index}"
+        reserved.add(name)
+        return name
+
     @override
     def init_root(self, namespace: str, ns_type: str) -> None:
         self.namespace_tree[namespace] = OrderedDict({
@@ -157,9 +182,11 @@ class Namespace(ABCNamespace):
     def store_local(
             self,
             g_conf: GlobalConfiguration,
-            comment_gen: Callable[[str], str],
-            namespace: str
-    ) -> tuple[str, str]:
+            comment_gen: Callable[[str], Commands],
+            namespace: str,
+            live_names: set[str] | None = None,
+            frame: bool = False
+    ) -> tuple[Commands, Commands]:
         _ns, _name = namespace.rsplit('\\', 1)
         local_ns: dict[str, dict[str, ...]] = self.getter(_name, _ns, ret_raw=True)[0]
 
@@ -171,74 +198,82 @@ class Namespace(ABCNamespace):
             data = local_ns[name]
             if data[".__type__"] != "variable":
                 continue
+            # global声明的变量不属于当前函数, 恢复会覆盖被调用函数对其的修改
+            if not data[".__namespace__"].startswith(f"{namespace}."):
+                continue
+            if live_names is not None and name not in live_names:
+                continue
             ns_ls.append(data[".__namespace__"])
 
-        def store() -> str:
+        symbols = current_symbols()
+        if frame:
+            scores = [ScoreRef(symbols.lookup(ns, g_conf.SB_VARS), g_conf.SB_VARS) for ns in ns_ls]
+            scores += [ScoreRef(symbols.lookup(ns, g_conf.SB_TEMP), g_conf.SB_TEMP) for ns in self.temp_ns[namespace]]
+            return self._store_frame(g_conf, comment_gen, scores)
+
+        def _store(score: ScoreRef, local_path: str) -> Commands:
+            return Commands((
+                ExecuteStoreStorage(g_conf.DS_ROOT, g_conf.DS_TEMP, ScoreGet(score)),
+                DataModifyStorage(g_conf.DS_ROOT, local_path, "append", g_conf.DS_ROOT, g_conf.DS_TEMP),
+            ))
+
+        def _load(score: ScoreRef, local_path: str) -> Commands:
+            return Commands((
+                ExecuteStoreScore(score, DataGetStorage(g_conf.DS_ROOT, f"{local_path}[-1]", 1)),
+                DataRemoveStorage(g_conf.DS_ROOT, f"{local_path}[-1]"),
+            ))
+
+        def store() -> Commands:
             nonlocal ns_ls
-            command = ''
+            command = Commands()
             command += comment_gen("LocalVars.Store")
             for ns in ns_ls:
-                command += (
-                    f"execute store result storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_TEMP} "
-                    f"int 1 "
-                    f"run scoreboard players get {SB_Name2Code[g_conf.SB_VARS][ns]} {g_conf.SB_VARS}\n"
-                )
-                command += (
-                    f"data modify storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_LOCAL_VARS} "
-                    f"append from storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_TEMP}\n"
-                )
+                command += _store(ScoreRef(symbols.lookup(ns, g_conf.SB_VARS), g_conf.SB_VARS), g_conf.DS_LOCAL_VARS)
             command += comment_gen("LocalTemp.Store")
             for ns in self.temp_ns[namespace]:
-                command += (
-                    f"execute store result storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_TEMP} "
-                    f"int 1 "
-                    f"run scoreboard players get {SB_Name2Code[g_conf.SB_TEMP][ns]} {g_conf.SB_TEMP}\n"
-                )
-                command += (
-                    f"data modify storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_LOCAL_TEMP} "
-                    f"append from storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_TEMP}\n"
-                )
+                command += _store(ScoreRef(symbols.lookup(ns, g_conf.SB_TEMP), g_conf.SB_TEMP), g_conf.DS_LOCAL_TEMP)
 
             return command
 
-        def load() -> str:
+        def load() -> Commands:
             nonlocal ns_ls
-            command = ''
+            command = Commands()
             command += comment_gen("LocalVars.Load")
             for ns in ns_ls[::-1]:
-                command += (
-                    f"execute store result score "
-                    f"{SB_Name2Code[g_conf.SB_VARS][ns]} {g_conf.SB_VARS} "
-                    f"run data get storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_LOCAL_VARS}[-1] 1\n"
-                )
-                command += (
-                    f"data remove storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_LOCAL_VARS}[-1]\n"
-                )
+                command += _load(ScoreRef(symbols.lookup(ns, g_conf.SB_VARS), g_conf.SB_VARS), g_conf.DS_LOCAL_VARS)
             command += comment_gen("LocalTemp.Load")
             for ns in self.temp_ns[namespace][::-1]:
-                command += (
-                    f"execute store result score "
-                    f"{SB_Name2Code[g_conf.SB_TEMP][ns]} {g_conf.SB_TEMP} "
-                    f"run data get storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_LOCAL_TEMP}[-1] 1\n"
-                )
-                command += (
-                    f"data remove storage "
-                    f"{g_conf.DS_ROOT} {g_conf.DS_LOCAL_TEMP}[-1]\n"
-                )
+                command += _load(ScoreRef(symbols.lookup(ns, g_conf.SB_TEMP), g_conf.SB_TEMP), g_conf.DS_LOCAL_TEMP)
 
             return command
 
         return store(), load()
 
+    @staticmethod
+    def _store_frame(
+            g_conf: GlobalConfiguration,
+            comment_gen: Callable[[str], Commands],
+            scores: list[ScoreRef]
+    ) -> tuple[Commands, Commands]:
+        """
+        将所有值作为一个复合标签的字段压入 LocalFrames 栈, 恢复时按字段读取后弹出整个复合标签
+        """
+        store = Commands()
+        load = Commands()
+        if not scores:
+            return store, load
+
+        frame_path = f"{g_conf.DS_LOCAL_FRAMES}[-1]"
+        store += comment_gen("LocalFrame.Store")
+        store += DataModifyStorageValue(g_conf.DS_ROOT, g_conf.DS_LOCAL_FRAMES, "append", "{}")
+        load += comment_gen("LocalFrame.Load")
+        for i, score in enumerate(scores):
+            store += ExecuteStoreStorage(g_conf.DS_ROOT, f"{frame_path}.s{i}", ScoreGet(score))
+            load += ExecuteStoreScore(score, DataGetStorage(g_conf.DS_ROOT, f"{frame_path}.s{i}", 1))
+        load += DataRemoveStorage(g_conf.DS_ROOT, frame_path)
+
+        return store, load
+
 
 class FileNamespace(ABCFileNamespace):
     """
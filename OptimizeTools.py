@@ -0,0 +1,1344 @@
+# -*- coding: utf-8 -*-
+# cython: language_level = 3
+"""
+编译优化
+
+* 代码生成前在语法树上内联较小的函数, 折叠常量表达式, 删除不会执行的语句, 将尾递归转换为循环
+* 分析函数中每次调用之后仍会被读取的局部变量, 调用函数时只保存这些变量
+* 分析函数中的return需要如何离开if块生成的函数, 用于生成原生return命令
+* 写入文件前对生成的命令进行窥孔优化, 只在单个MCF文件内的直线代码上进行,
+  不会改变任何计分目标在函数调用等屏障命令处和文件末尾的状态
+"""
+
+import ast
+import copy
+from typing import Callable
+
+from CommandTypes import Command
+from CommandTypes import Commands
+from CommandTypes import Comment
+from CommandTypes import DataGetStorage
+from CommandTypes import DataModifyStorage
+from CommandTypes import DataModifyStorageValue
+from CommandTypes import DataRemoveStorage
+from CommandTypes import ExecuteIfScore
+from CommandTypes import ExecuteIfScoreMatches
+from CommandTypes import RawCommand
+from CommandTypes import ScoreAdd
+from CommandTypes import ScoreGet
+from CommandTypes import ScoreOperation
+from CommandTypes import ScoreRef
+from CommandTypes import ScoreReset
+from CommandTypes import ScoreSet
+
+INT_MIN: int = -2 ** 31
+INT_MAX: int = 2 ** 31 - 1
+
+
+def wrap_int(value: int) -> int:
+    """
+    按32位有符号整数溢出规则截断
+
+    :param value: 整数
+    :type value: int
+    :return: 截断后的整数
+    :rtype: int
+    """
+    return (value - INT_MIN) % 2 ** 32 + INT_MIN
+
+
+def score_operation(operation: str, a: int, b: int) -> int | None:
+    """
+    按MC的规则计算计分板操作的结果
+
+    :param operation: 操作类型 (SBOperationType, 不包括交换)
+    :type operation: str
+    :param a: 目标分数
+    :type a: int
+    :param b: 源分数
+    :type b: int
+    :return: 计算结果, 命令会失败 (除以0) 或无法计算时返回None
+    :rtype: int | None
+    """
+    if operation == "=":
+        return b
+    if operation == "+=":
+        return wrap_int(a + b)
+    if operation == "-=":
+        return wrap_int(a - b)
+    if operation == "*=":
+        return wrap_int(a * b)
+    if operation == "/=":
+        return None if b == 0 else wrap_int(a // b)
+    if operation == "%=":
+        return None if b == 0 else wrap_int(a % b)
+    if operation == "<":
+        return min(a, b)
+    if operation == ">":
+        return max(a, b)
+    return None
+
+
+def score_compare(compare_op: str, a: int, b: int) -> bool | None:
+    """
+    计算分数比较的结果
+
+    :param compare_op: 比较类型 (SBCompareType)
+    :type compare_op: str
+    :param a: 左侧分数
+    :type a: int
+    :param b: 右侧分数
+    :type b: int
+    :return: 比较结果, 未知的比较类型返回None
+    :rtype: bool | None
+    """
+    return {
+        "=": a == b,
+        "<": a < b,
+        ">": a > b,
+        "<=": a <= b,
+        ">=": a >= b,
+    }.get(compare_op)
+
+
+def constant_value(node: ast.AST) -> int | None:
+    """
+    获取可以直接写入计分板的常量值
+
+    :param node: AST节点
+    :type node: ast.AST
+    :return: 常量值 (布尔值会转换为1/0), 不是常量或超出32位整数范围时返回None
+    :rtype: int | None
+    """
+    if not isinstance(node, ast.Constant):
+        return None
+    value = node.value
+    if type(value) is bool:
+        return 1 if value else 0
+    if type(value) is int and INT_MIN <= value <= INT_MAX:
+        return value
+    return None
+
+
+_BIN_OPERATIONS: dict[type[ast.operator], str] = {
+    ast.Add: "+=",
+    ast.Sub: "-=",
+    ast.Mult: "*=",
+    ast.Div: "/=",
+}
+
+_COMPARE_OPERATIONS: dict[type[ast.cmpop], tuple[bool, str]] = {
+    ast.Eq: (False, "="),
+    ast.NotEq: (True, "="),
+    ast.Gt: (False, ">"),
+    ast.Lt: (False, "<"),
+    ast.GtE: (False, ">="),
+    ast.LtE: (False, "<="),
+}
+
+
+class ConstantFolder(ast.NodeTransformer):
+    """
+    按照生成的计分板命令的语义 (32位整数溢出, 向下取整除法) 计算常量子表达式,
+    并删除条件为常量的if语句中不会执行的分支
+
+    只折叠代码生成器支持的运算, 运行时会失败的运算 (除以0) 保持原样
+    """
+
+    @staticmethod
+    def _constant(value: int, node: ast.AST) -> ast.Constant:
+        return ast.copy_location(ast.Constant(value=value), node)
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        left = constant_value(node.left)
+        right = constant_value(node.right)
+        operation = _BIN_OPERATIONS.get(type(node.op))
+        if left is None or right is None or operation is None:
+            return node
+
+        result = score_operation(operation, left, right)
+        if result is None:
+            return node
+        return self._constant(result, node)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        self.generic_visit(node)
+        value = constant_value(node.operand)
+        if value is None:
+            return node
+
+        if isinstance(node.op, ast.Not):
+            return self._constant(1 if value == 0 else 0, node)
+        if isinstance(node.op, ast.USub):
+            return self._constant(wrap_int(-value), node)
+        return node
+
+    def visit_Compare(self, node: ast.Compare) -> ast.AST:
+        self.generic_visit(node)
+        if len(node.ops) != 1:
+            return node
+        left = constant_value(node.left)
+        right = constant_value(node.comparators[0])
+        operation = _COMPARE_OPERATIONS.get(type(node.ops[0]))
+        if left is None or right is None or operation is None:
+            return node
+
+        negate, compare_op = operation
+        result = score_compare(compare_op, left, right)
+        if result is None:
+            return node
+        return self._constant(1 if result != negate else 0, node)
+
+    def visit_If(self, node: ast.If) -> ast.AST | list[ast.stmt]:
+        self.generic_visit(node)
+        value = constant_value(node.test)
+        if value is None:
+            return node
+        return node.body if value != 0 else node.orelse
+
+    def visit_While(self, node: ast.While) -> ast.AST | list[ast.stmt]:
+        self.generic_visit(node)
+        if constant_value(node.test) == 0:
+            return node.orelse
+        return node
+
+
+def fold_constants(tree: ast.AST) -> ast.AST:
+    """
+    折叠语法树中的常量表达式 (会直接修改传入的语法树)
+
+    :param tree: 语法树
+    :type tree: ast.AST
+    :return: 折叠后的语法树
+    :rtype: ast.AST
+    """
+    return ConstantFolder().visit(tree)
+
+
+class TailReturn(ast.Return):
+    """
+    位于函数末尾的return语句, 执行后函数不会再执行其他命令, 不需要通过断点跳过后续代码
+    """
+
+
+def _stmt_lists(node: ast.AST) -> list[list[ast.stmt]]:
+    return [
+        value for _, value in ast.iter_fields(node)
+        if isinstance(value, list) and value and all(isinstance(item, ast.stmt) for item in value)
+    ]
+
+
+_LOOP_OR_SCOPE_TYPES = (ast.While, ast.For, ast.AsyncFor, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def _has_break(statements: list[ast.stmt]) -> bool:
+    """
+    检查语句中是否有跳出当前循环的break (不检查嵌套的循环和函数)
+    """
+    for statement in statements:
+        if isinstance(statement, ast.Break):
+            return True
+        if isinstance(statement, _LOOP_OR_SCOPE_TYPES):
+            continue
+        if any(_has_break(body) for body in _stmt_lists(statement)):
+            return True
+    return False
+
+
+def terminates(statement: ast.stmt) -> bool:
+    """
+    检查语句执行后是否一定不会继续执行同一代码块中的下一条语句
+
+    :param statement: 语句
+    :type statement: ast.stmt
+    :return: 是否一定不会继续执行
+    :rtype: bool
+    """
+    if isinstance(statement, (ast.Return, ast.Raise, ast.Break, ast.Continue)):
+        return True
+    if isinstance(statement, ast.If):
+        if not (statement.body and statement.orelse):
+            return False
+        return terminates(statement.body[-1]) and terminates(statement.orelse[-1])
+    if isinstance(statement, ast.While):
+        test = constant_value(statement.test)
+        return test is not None and test != 0 and not _has_break(statement.body)
+    return False
+
+
+class UnreachableCodeEliminator(ast.NodeTransformer):
+    """
+    删除return, break, 死循环等语句之后不会执行的语句, 并将函数末尾的return替换为 :class:`TailReturn`
+    """
+
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        super().generic_visit(node)
+        for statements in _stmt_lists(node):
+            for i, statement in enumerate(statements):
+                if terminates(statement):
+                    del statements[i + 1:]
+                    break
+        return node
+
+    @classmethod
+    def _mark_tail(cls, statements: list[ast.stmt]) -> None:
+        if not statements:
+            return
+        last = statements[-1]
+        if type(last) is ast.Return:
+            statements[-1] = ast.copy_location(TailReturn(value=last.value), last)
+        elif isinstance(last, ast.If):
+            cls._mark_tail(last.body)
+            cls._mark_tail(last.orelse)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.AST:
+        self.generic_visit(node)
+        self._mark_tail(node.body)
+        return node
+
+
+def eliminate_unreachable(tree: ast.AST) -> ast.AST:
+    """
+    删除语法树中不会执行的语句 (会直接修改传入的语法树)
+
+    :param tree: 语法树
+    :type tree: ast.AST
+    :return: 处理后的语法树
+    :rtype: ast.AST
+    """
+    return UnreachableCodeEliminator().visit(tree)
+
+
+_INLINE_FORBIDDEN_TYPES = (
+    ast.Return, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda,
+    ast.Global, ast.Nonlocal, ast.Import, ast.ImportFrom,
+    ast.While, ast.For, ast.AsyncFor, ast.Break, ast.Continue,
+    ast.Yield, ast.YieldFrom, ast.Await,
+)
+
+_PURE_TYPES = (
+    ast.Constant, ast.Name, ast.Attribute, ast.BinOp, ast.UnaryOp, ast.Compare,
+    ast.operator, ast.unaryop, ast.cmpop, ast.expr_context,
+)
+
+
+def _is_pure(node: ast.expr) -> bool:
+    """
+    检查表达式是否没有副作用 (不包含函数调用), 可以被复制或延后计算
+    """
+    return all(isinstance(child, _PURE_TYPES) for child in ast.walk(node))
+
+
+def _assigned_names(func: ast.FunctionDef) -> set[str]:
+    """
+    获取函数的参数和函数体中被赋值的变量名 (不检查嵌套的函数)
+    """
+    names = {arg.arg for arg in func.args.posonlyargs + func.args.args + func.args.kwonlyargs}
+    for arg in (func.args.vararg, func.args.kwarg):
+        if arg is not None:
+            names.add(arg.arg)
+
+    waiting: list[ast.AST] = list(func.body)
+    while waiting:
+        node = waiting.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            continue
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        waiting.extend(ast.iter_child_nodes(node))
+    return names
+
+
+def _called_names(func: ast.FunctionDef) -> set[str]:
+    return {
+        node.func.id for node in ast.walk(func)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+    }
+
+
+class _InlineFunction:
+    """
+    可以被内联的函数
+    """
+
+    def __init__(self, node: ast.FunctionDef) -> None:
+        self.params: list[str] = [arg.arg for arg in node.args.args]
+        # 调用处展开的是未经内联处理的函数体
+        self.body: list[ast.stmt] = copy.deepcopy(node.body)
+        self.locals: set[str] = _assigned_names(node)
+        self.free_names: set[str] = {
+            child.id for child in ast.walk(node)
+            if isinstance(child, ast.Name) and child.id not in self.locals
+        }
+
+    @property
+    def return_value(self) -> ast.expr | None:
+        """
+        函数体只有一条return语句时返回其返回值, 否则返回None
+        """
+        if len(self.body) == 1 and isinstance(self.body[0], ast.Return):
+            return self.body[0].value
+        return None
+
+
+def _inline_candidate(node: ast.FunctionDef, max_nodes: int, max_statements: int) -> bool:
+    """
+    检查函数是否满足内联条件: 只有位置参数, 没有装饰器, 函数体足够小,
+    且只在函数体末尾有return语句
+    """
+    args = node.args
+    if args.posonlyargs or args.vararg or args.kwonlyargs or args.kwarg or args.defaults:
+        return False
+    if node.decorator_list or len(node.body) > max_statements:
+        return False
+    if sum(1 for statement in node.body for _ in ast.walk(statement)) > max_nodes:
+        return False
+
+    *statements, last = node.body
+    if isinstance(last, ast.Return):
+        statements.extend(ast.iter_child_nodes(last))
+    else:
+        statements.append(last)
+    return not any(isinstance(child, _INLINE_FORBIDDEN_TYPES) for stmt in statements for child in ast.walk(stmt))
+
+
+def _inline_functions(module: ast.Module, max_nodes: int, max_statements: int) -> dict[str, _InlineFunction]:
+    """
+    获取模块顶层定义的可以被内联的函数, 排除在模块内直接或间接递归调用的函数和被多次绑定的名称
+    """
+    bindings: dict[str, int] = {}
+    for statement in module.body:
+        names: set[str] = set()
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(statement.name)
+        elif isinstance(statement, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split('.')[0] for alias in statement.names)
+        for child in ast.walk(statement):
+            if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                names.add(child.id)
+        for name in names:
+            bindings[name] = bindings.get(name, 0) + 1
+
+    functions: dict[str, ast.FunctionDef] = {
+        statement.name: statement for statement in module.body
+        if isinstance(statement, ast.FunctionDef) and bindings[statement.name] == 1
+    }
+    calls: dict[str, set[str]] = {
+        name: _called_names(func) & functions.keys() for name, func in functions.items()
+    }
+
+    def recursive(name: str) -> bool:
+        visited: set[str] = set()
+        waiting = list(calls[name])
+        while waiting:
+            callee = waiting.pop()
+            if callee == name:
+                return True
+            if callee not in visited:
+                visited.add(callee)
+                waiting.extend(calls[callee])
+        return False
+
+    return {
+        name: _InlineFunction(func) for name, func in functions.items()
+        if _inline_candidate(func, max_nodes, max_statements) and not recursive(name)
+    }
+
+
+class _Substitution(ast.NodeTransformer):
+    """
+    将变量名替换为新的变量名或表达式
+    """
+
+    def __init__(self, mapping: dict[str, str | ast.expr]) -> None:
+        self.mapping = mapping
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        value = self.mapping.get(node.id)
+        if value is None:
+            return node
+        if isinstance(value, str):
+            return ast.Name(id=value, ctx=node.ctx)
+        return copy.deepcopy(value)
+
+
+class FunctionInliner(ast.NodeTransformer):
+    """
+    在调用处展开模块内定义的较小的非递归函数
+
+    * 函数体只有一条return语句且参数都没有副作用时, 在表达式中直接替换为代入参数后的返回值
+    * 否则只展开作为单独语句, 赋值语句的值或return语句的值的调用,
+      参数先按顺序赋值给重命名后的局部变量, 再执行重命名局部变量后的函数体
+
+    调用处所在函数的局部变量与被调用函数使用的外部名称冲突时不进行内联
+    """
+
+    def __init__(self, functions: dict[str, _InlineFunction]) -> None:
+        self.functions = functions
+        self._scopes: list[set[str]] = []
+        self._counter: int = 0
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.AST:
+        self._scopes.append(_assigned_names(node))
+        self.generic_visit(node)
+        self._scopes.pop()
+        return node
+
+    def _target(self, node: ast.Call) -> _InlineFunction | None:
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            return None
+        func = self.functions.get(node.func.id)
+        if func is None or len(node.args) != len(func.params):
+            return None
+        if any(isinstance(arg, ast.Starred) for arg in node.args):
+            return None
+        for scope in self._scopes:
+            if node.func.id in scope or func.free_names & scope:
+                return None
+        return func
+
+    @staticmethod
+    def _locate(nodes: list[ast.AST], location: ast.AST) -> None:
+        # 展开后的代码在调用处执行, 报错信息使用调用处的行号
+        for node in nodes:
+            for child in ast.walk(node):
+                if "lineno" in child._attributes:
+                    ast.copy_location(child, location)
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        func = self._target(node)
+        if func is None or func.return_value is None:
+            return node
+        if not all(_is_pure(arg) for arg in node.args):
+            return node
+
+        mapping: dict[str, str | ast.expr] = dict(zip(func.params, node.args))
+        value = _Substitution(mapping).visit(copy.deepcopy(func.return_value))
+        self._locate([value], node)
+        return self.visit(value)
+
+    def _expand(
+            self,
+            node: ast.Call,
+            result: Callable[[ast.expr | None], list[ast.stmt] | None]
+    ) -> list[ast.stmt] | None:
+        func = self._target(node)
+        if func is None:
+            return None
+
+        prefix = f"_inline{self._counter}_"
+        mapping: dict[str, str | ast.expr] = {name: f"{prefix}{name}" for name in func.locals}
+        body = [_Substitution(mapping).visit(copy.deepcopy(statement)) for statement in func.body]
+
+        value = None
+        if isinstance(body[-1], ast.Return):
+            value = body.pop().value
+        tail = result(value)
+        if tail is None:
+            return None
+        self._counter += 1
+
+        statements: list[ast.stmt] = [
+            ast.Assign(targets=[ast.Name(id=f"{prefix}{param}", ctx=ast.Store())], value=arg)
+            for param, arg in zip(func.params, node.args)
+        ]
+        self._locate(statements + body + tail, node)
+        for statement in body + tail:
+            visited = self.visit(statement)
+            statements.extend(visited if isinstance(visited, list) else [visited])
+        return statements
+
+    def visit_Expr(self, node: ast.Expr) -> ast.AST | list[ast.stmt]:
+        self.generic_visit(node)
+        if not isinstance(node.value, ast.Call):
+            return node
+
+        def result(value: ast.expr | None) -> list[ast.stmt]:
+            if value is None or _is_pure(value):
+                return []
+            return [ast.Expr(value=value)]
+
+        expanded = self._expand(node.value, result)
+        return node if expanded is None else expanded
+
+    def visit_Assign(self, node: ast.Assign) -> ast.AST | list[ast.stmt]:
+        self.generic_visit(node)
+        if not isinstance(node.value, ast.Call):
+            return node
+
+        def result(value: ast.expr | None) -> list[ast.stmt] | None:
+            if value is None:
+                return None
+            return [ast.Assign(targets=node.targets, value=value)]
+
+        expanded = self._expand(node.value, result)
+        return node if expanded is None else expanded
+
+    def visit_Return(self, node: ast.Return) -> ast.AST | list[ast.stmt]:
+        self.generic_visit(node)
+        if not isinstance(node.value, ast.Call):
+            return node
+        expanded = self._expand(node.value, lambda value: [ast.Return(value=value)])
+        return node if expanded is None else expanded
+
+
+def inline_functions(tree: ast.Module, max_nodes: int, max_statements: int) -> ast.Module:
+    """
+    在调用处展开模块内定义的较小的非递归函数 (会直接修改传入的语法树)
+
+    :param tree: 模块语法树
+    :type tree: ast.Module
+    :param max_nodes: 被内联的函数体的最大语法树节点数
+    :type max_nodes: int
+    :param max_statements: 被内联的函数体的最大语句数
+    :type max_statements: int
+    :return: 处理后的语法树
+    :rtype: ast.Module
+    """
+    functions = _inline_functions(tree, max_nodes, max_statements)
+    if not functions:
+        return tree
+    return FunctionInliner(functions).visit(tree)
+
+
+class SelfTailCall(TailReturn):
+    """
+    函数末尾调用函数自身并直接返回其返回值的return语句 (value为调用节点)
+
+    调用后当前函数不会再执行其他命令, 只需要传递新的参数并重新执行函数, 不需要保存和恢复局部变量,
+    也不需要传递返回值
+    """
+
+
+_ACCUMULATE_OPERATIONS: dict[type[ast.operator], int] = {
+    ast.Add: 0,
+    ast.Mult: 1,
+}
+
+
+def _self_call(node: ast.AST | None, name: str) -> bool:
+    return (
+            isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == name
+            and not node.keywords and not any(isinstance(arg, ast.Starred) for arg in node.args)
+    )
+
+
+def _tail_recursive_returns(func: ast.FunctionDef) -> list[tuple[TailReturn, ast.Call, ast.BinOp | None]] | None:
+    """
+    获取函数末尾调用自身的return语句
+
+    return语句的值可以是对自身的调用, 也可以是没有副作用的表达式与对自身的调用进行加法或乘法运算的结果,
+    函数中其他位置调用自身时返回None
+
+    :return: [(return语句, 调用节点, 运算节点或None)], 不能转换为循环时返回None
+    """
+    name = func.name
+    if name in _assigned_names(func):
+        return None
+    # 嵌套的函数中的return语句不属于当前函数
+    if any(isinstance(node, _LOOP_OR_SCOPE_TYPES + (ast.Lambda,)) for node in ast.walk(ast.Module(body=func.body))):
+        return None
+
+    calls = sum(1 for node in ast.walk(func) if _self_call(node, name))
+    found: list[tuple[TailReturn, ast.Call, ast.BinOp | None]] = []
+    for node in ast.walk(func):
+        if not isinstance(node, TailReturn):
+            continue
+        value = node.value
+        if _self_call(value, name):
+            found.append((node, value, None))
+            continue
+        if not (isinstance(value, ast.BinOp) and type(value.op) in _ACCUMULATE_OPERATIONS):
+            continue
+        for call, other in ((value.right, value.left), (value.left, value.right)):
+            if _self_call(call, name) and _is_pure(other):
+                found.append((node, call, value))
+                break
+
+    if not found or len(found) != calls:
+        return None
+    return found
+
+
+class TailRecursionConverter(ast.NodeTransformer):
+    """
+    将只在函数末尾调用自身的函数转换为循环 (重新执行自身的函数, 见 :class:`SelfTailCall`)
+
+    * 尾递归: 将 ``return f(...)`` 替换为 :class:`SelfTailCall`
+    * 可以使用累加器的递归 (如 ``return n * f(n - 1)``):
+      生成带有累加器参数的循环函数, 原函数只以运算的单位元作为累加器的初始值调用循环函数,
+      递归调用改为将运算结果累积到累加器中, 其余return语句返回与累加器运算后的值
+    """
+
+    def __init__(self, tree: ast.AST) -> None:
+        self._names: set[str] = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                self._names.add(node.id)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                self._names.add(node.name)
+            elif isinstance(node, ast.arg):
+                self._names.add(node.arg)
+            elif isinstance(node, ast.alias):
+                self._names.add(node.asname or node.name)
+
+    def _unique_name(self, name: str) -> str:
+        unique, i = name, 0
+        while unique in self._names:
+            i += 1
+            unique = f"{name}{i}"
+        self._names.add(unique)
+        return unique
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.AST | list[ast.stmt]:
+        self.generic_visit(node)
+        returns = _tail_recursive_returns(node)
+        if returns is None:
+            return node
+
+        operations = {type(operation.op) for _, _, operation in returns if operation is not None}
+        if not operations:
+            for statement, _, _ in returns:
+                statement.__class__ = SelfTailCall
+            return node
+        if len(operations) > 1 or not (node.body and terminates(node.body[-1])):
+            return node
+        return self._accumulate(node, returns, operations.pop())
+
+    def _accumulate(
+            self,
+            node: ast.FunctionDef,
+            returns: list[tuple[TailReturn, ast.Call, ast.BinOp | None]],
+            operation: type[ast.operator]) -> list[ast.stmt]:
+        # 非递归的return语句需要先检查, 之后才能修改语法树
+        recursive = {id(statement) for statement, _, _ in returns}
+        base_returns = [
+            statement for statement in ast.walk(node)
+            if isinstance(statement, ast.Return) and id(statement) not in recursive
+        ]
+        if any(statement.value is None for statement in base_returns):
+            return [node]
+
+        loop_name = self._unique_name(f"{node.name}_loop")
+        accumulator = self._unique_name("_accumulator")
+        identity = _ACCUMULATE_OPERATIONS[operation]
+
+        def accumulate(value: ast.expr) -> ast.expr:
+            if constant_value(value) == identity:
+                return ast.Name(id=accumulator, ctx=ast.Load())
+            return ast.BinOp(left=ast.Name(id=accumulator, ctx=ast.Load()), op=operation(), right=value)
+
+        for statement, call, binop in returns:
+            call.func = ast.Name(id=loop_name, ctx=ast.Load())
+            if binop is None:
+                call.args.append(ast.Name(id=accumulator, ctx=ast.Load()))
+            else:
+                call.args.append(accumulate(binop.left if binop.right is call else binop.right))
+            statement.value = call
+            statement.__class__ = SelfTailCall
+        for statement in base_returns:
+            statement.value = accumulate(statement.value)
+
+        loop_args = copy.deepcopy(node.args)
+        loop_args.args.append(ast.arg(arg=accumulator))
+        loop = ast.FunctionDef(
+            name=loop_name, args=loop_args, body=node.body, decorator_list=[], returns=None, type_params=[]
+        )
+
+        start = ast.Call(
+            func=ast.Name(id=loop_name, ctx=ast.Load()),
+            args=[ast.Name(id=arg.arg, ctx=ast.Load()) for arg in node.args.args] + [ast.Constant(value=identity)],
+            keywords=[]
+        )
+        node.body = [TailReturn(value=start)]
+
+        for new_node in (loop, node):
+            for child in ast.walk(new_node):
+                if "lineno" in child._attributes and not hasattr(child, "lineno"):
+                    ast.copy_location(child, node)
+        return [loop, node]
+
+
+def convert_tail_recursion(tree: ast.AST) -> ast.AST:
+    """
+    将只在末尾调用自身的函数转换为循环 (会直接修改传入的语法树, 需要在 :func:`eliminate_unreachable` 之后进行)
+
+    :param tree: 语法树
+    :type tree: ast.AST
+    :return: 处理后的语法树
+    :rtype: ast.AST
+    """
+    return TailRecursionConverter(tree).visit(tree)
+
+
+def _evaluation_order(node: ast.AST, events: list[ast.Name | ast.Call]) -> None:
+    """
+    按照代码生成器计算表达式的顺序记录读取变量和调用函数的节点
+    """
+    if isinstance(node, ast.Name):
+        if isinstance(node.ctx, ast.Load):
+            events.append(node)
+        return
+    if isinstance(node, ast.Call):
+        for arg in node.args:
+            _evaluation_order(arg, events)
+        for keyword in node.keywords:
+            _evaluation_order(keyword.value, events)
+        events.append(node)
+        return
+    for child in ast.iter_child_nodes(node):
+        _evaluation_order(child, events)
+
+
+class CallLiveness:
+    """
+    从后向前分析函数体, 为每个调用节点标注调用返回后仍会被读取的局部变量名 (``live_locals`` 属性)
+
+    函数体中包含嵌套的函数或类时, 调用可能通过闭包读取任意变量, 不进行标注
+    """
+
+    ATTRIBUTE = "live_locals"
+
+    def statements(self, statements: list[ast.stmt], live: set[str]) -> set[str]:
+        for statement in reversed(statements):
+            live = self.statement(statement, live)
+        return live
+
+    def statement(self, statement: ast.stmt, live: set[str]) -> set[str]:
+        if isinstance(statement, (ast.Return, ast.Raise)):
+            # 执行后函数结束, 之后不再读取任何变量
+            return self.expression(statement, set())
+        if isinstance(statement, ast.If):
+            after = self.statements(statement.body, live) | self.statements(statement.orelse, live)
+            return self.expression(statement.test, after)
+        if isinstance(statement, ast.Assign):
+            after = set(live)
+            for target in statement.targets:
+                if isinstance(target, ast.Name):
+                    after.discard(target.id)
+                else:
+                    after = self.expression(target, after)
+            return self.expression(statement.value, after)
+        if isinstance(statement, ast.AugAssign):
+            # 先计算右值, 再读取并修改目标变量
+            after = set(live)
+            if isinstance(statement.target, ast.Name):
+                after.add(statement.target.id)
+            else:
+                after = self.expression(statement.target, after)
+            return self.expression(statement.value, after)
+        if isinstance(statement, ast.Expr):
+            return self.expression(statement.value, live)
+        # 其他语句: 认为语句中读取的变量在语句中的所有调用之后仍会被读取
+        used = {node.id for node in ast.walk(statement) if isinstance(node, ast.Name)}
+        return self.expression(statement, live | used)
+
+    def expression(self, node: ast.AST, live: set[str]) -> set[str]:
+        events: list[ast.Name | ast.Call] = []
+        _evaluation_order(node, events)
+        for event in reversed(events):
+            if isinstance(event, ast.Call):
+                setattr(event, self.ATTRIBUTE, set(live))
+            else:
+                live = live | {event.id}
+        return live
+
+
+def annotate_call_liveness(func: ast.FunctionDef) -> None:
+    """
+    为函数体中的调用节点标注调用返回后仍会被读取的局部变量名 (见 :class:`CallLiveness`)
+
+    :param func: 函数定义节点
+    :type func: ast.FunctionDef
+    :return: None
+    :rtype: None
+    """
+    for statement in func.body:
+        for node in ast.walk(statement):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+                return
+    CallLiveness().statements(func.body, set())
+
+
+def _contains_return(statements: list[ast.stmt]) -> bool:
+    """
+    检查语句中是否有return (不检查嵌套的函数和类)
+    """
+    for statement in statements:
+        if isinstance(statement, ast.Return):
+            return True
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if any(_contains_return(body) for body in _stmt_lists(statement)):
+            return True
+    return False
+
+
+class ReturnFlow:
+    """
+    标注函数体中的return如何通过原生return命令离开if块生成的函数
+
+    * if语句的 ``return_branches`` 属性: (if分支, else分支) 分别为 NONE (没有return), ALWAYS (一定会return) 或 MIXED
+    * if语句和return语句的 ``return_flagged`` 属性: 是否位于MIXED分支中,
+      此时return先写入返回值和标记位, 再由MIXED分支的调用处检查标记位后继续返回
+    """
+
+    BRANCHES = "return_branches"
+    FLAGGED = "return_flagged"
+
+    NONE = 0
+    ALWAYS = 1
+    MIXED = 2
+
+    @classmethod
+    def branch_kind(cls, statements: list[ast.stmt]) -> int:
+        if not _contains_return(statements):
+            return cls.NONE
+        if any(terminates(statement) for statement in statements):
+            return cls.ALWAYS
+        return cls.MIXED
+
+    def statements(self, statements: list[ast.stmt], flagged: bool) -> None:
+        for statement in statements:
+            self.statement(statement, flagged)
+
+    def statement(self, statement: ast.stmt, flagged: bool) -> None:
+        if isinstance(statement, ast.Return):
+            setattr(statement, self.FLAGGED, flagged)
+        elif isinstance(statement, ast.If):
+            kinds = (self.branch_kind(statement.body), self.branch_kind(statement.orelse))
+            setattr(statement, self.BRANCHES, kinds)
+            setattr(statement, self.FLAGGED, flagged)
+            self.statements(statement.body, flagged or kinds[0] == self.MIXED)
+            self.statements(statement.orelse, flagged or kinds[1] == self.MIXED)
+        elif not isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            for body in _stmt_lists(statement):
+                self.statements(body, flagged)
+
+
+def annotate_return_flow(func: ast.FunctionDef) -> None:
+    """
+    为函数体中的if语句和return语句标注原生return的传递方式 (见 :class:`ReturnFlow`)
+
+    :param func: 函数定义节点
+    :type func: ast.FunctionDef
+    :return: None
+    :rtype: None
+    """
+    ReturnFlow().statements(func.body, False)
+
+
+def optimize_tree(tree: ast.Module, inline_max_nodes: int = 0, inline_max_statements: int = 0) -> ast.Module:
+    """
+    代码生成前对语法树进行优化: 内联较小的函数, 折叠常量表达式, 删除不会执行的语句, 将尾递归转换为循环
+
+    :param tree: 模块语法树
+    :type tree: ast.Module
+    :param inline_max_nodes: 被内联的函数体的最大语法树节点数, 为0时不进行函数内联
+    :type inline_max_nodes: int
+    :param inline_max_statements: 被内联的函数体的最大语句数
+    :type inline_max_statements: int
+    :return: 优化后的语法树
+    :rtype: ast.Module
+    """
+    if inline_max_nodes > 0 and inline_max_statements > 0:
+        tree = inline_functions(tree, inline_max_nodes, inline_max_statements)
+    return convert_tail_recursion(eliminate_unreachable(fold_constants(tree)))
+
+
+class Effects:
+    """
+    命令对计分板的影响
+
+    * reads: 读取值的分数
+    * writes: 完全覆盖 (set, 赋值, reset) 的分数
+    * modifies: 部分修改 (读取后修改, 或条件执行) 的分数
+    * creates: 不存在时会被创建为0的分数 (scoreboard players operation 会创建目标和源)
+    * observes: 会检查是否存在的分数 (execute if score, scoreboard players get)
+    * barrier: 可能读写任意分数 (函数调用, 未解析的命令等)
+    """
+
+    __slots__ = ("reads", "writes", "modifies", "creates", "observes", "barrier")
+
+    def __init__(self, *, barrier: bool = False) -> None:
+        self.reads: set[ScoreRef] = set()
+        self.writes: set[ScoreRef] = set()
+        self.modifies: set[ScoreRef] = set()
+        self.creates: set[ScoreRef] = set()
+        self.observes: set[ScoreRef] = set()
+        self.barrier = barrier
+
+    def refs(self) -> set[ScoreRef]:
+        """
+        :return: 涉及的所有分数
+        :rtype: set[ScoreRef]
+        """
+        return self.reads | self.writes | self.modifies | self.creates | self.observes
+
+
+_NEUTRAL_TYPES = (Comment, DataGetStorage, DataModifyStorage, DataModifyStorageValue, DataRemoveStorage)
+
+
+def command_effects(command: Command) -> Effects:
+    """
+    分析命令对计分板的影响
+
+    :param command: 命令
+    :type command: Command
+    :return: 影响
+    :rtype: Effects
+    """
+    effects = Effects()
+    if isinstance(command, _NEUTRAL_TYPES):
+        return effects
+    if isinstance(command, RawCommand):
+        # 空行
+        effects.barrier = bool(command.text)
+        return effects
+
+    if isinstance(command, ScoreSet):
+        effects.writes.add(command.target)
+        effects.creates.add(command.target)
+    elif isinstance(command, ScoreAdd):
+        effects.reads.add(command.target)
+        effects.modifies.add(command.target)
+        effects.creates.add(command.target)
+    elif isinstance(command, ScoreReset):
+        effects.writes.add(command.target)
+    elif isinstance(command, ScoreGet):
+        effects.reads.add(command.target)
+        effects.observes.add(command.target)
+    elif isinstance(command, ScoreOperation):
+        effects.reads.add(command.source)
+        effects.creates.update((command.target, command.source))
+        if command.operation == "=" and command.target != command.source:
+            effects.writes.add(command.target)
+        else:
+            effects.reads.add(command.target)
+            effects.modifies.add(command.target)
+        if command.operation == "><":
+            effects.modifies.add(command.source)
+    elif isinstance(command, (ExecuteIfScore, ExecuteIfScoreMatches)):
+        checked = (command.left, command.right) if isinstance(command, ExecuteIfScore) else (command.target,)
+        run_effects = command_effects(command.run)
+        effects.barrier = run_effects.barrier
+        effects.reads.update(checked, run_effects.reads, run_effects.observes)
+        effects.observes.update(checked, run_effects.refs())
+        # 条件执行的写入只能视为部分修改
+        effects.modifies.update(run_effects.writes, run_effects.modifies, run_effects.creates)
+    else:
+        effects.barrier = True
+    return effects
+
+
+def sink_resets(commands: Commands) -> Commands:
+    """
+    将 reset 命令尽量后移到下一条涉及该分数的命令之前 (不越过屏障命令)
+
+    :param commands: 命令列表
+    :type commands: Commands
+    :return: 新的命令列表
+    :rtype: Commands
+    """
+    result = Commands()
+    pending: list[ScoreReset] = []
+
+    for command in commands:
+        if isinstance(command, ScoreReset) and all(reset.target != command.target for reset in pending):
+            pending.append(command)
+            continue
+
+        effects = command_effects(command)
+        if effects.barrier or isinstance(command, ScoreReset):
+            result.extend(pending)
+            pending.clear()
+        else:
+            refs = effects.refs()
+            if refs:
+                flush = [reset for reset in pending if reset.target in refs]
+                if flush:
+                    result.extend(flush)
+                    pending = [reset for reset in pending if reset.target not in refs]
+
+        result.append(command)
+
+    result.extend(pending)
+    return result
+
+
+class _ForwardState:
+    """
+    向前传播时已知的分数信息
+    """
+
+    def __init__(self) -> None:
+        self.consts: dict[ScoreRef, int] = {}
+        self.copies: dict[ScoreRef, ScoreRef] = {}
+        self.known_set: set[ScoreRef] = set()
+        self.known_unset: set[ScoreRef] = set()
+
+    def clear(self) -> None:
+        self.consts.clear()
+        self.copies.clear()
+        self.known_set.clear()
+        self.known_unset.clear()
+
+    def invalidate(self, ref: ScoreRef) -> None:
+        """
+        分数的值发生变化
+        """
+        self.consts.pop(ref, None)
+        self.copies.pop(ref, None)
+        for alias in [alias for alias, source in self.copies.items() if source == ref]:
+            del self.copies[alias]
+
+    def resolve(self, ref: ScoreRef) -> ScoreRef:
+        """
+        获取与分数值相同且仍然有效的源分数
+        """
+        return self.copies.get(ref, ref)
+
+    def created(self, *refs: ScoreRef) -> None:
+        self.known_set.update(refs)
+        self.known_unset.difference_update(refs)
+
+
+def _fold_operation(state: _ForwardState, command: ScoreOperation) -> Command | None:
+    """
+    替换源分数为其副本的来源, 并尝试将常量源折叠为 set/add
+
+    :return: 替换后的命令, 命令无效果时返回None
+    """
+    target = command.target
+    operation = command.operation
+    if operation == "><":
+        # 交换会修改源分数, 不能替换为副本的来源
+        return command
+
+    source = state.resolve(command.source)
+    if source == target:
+        if operation == "=" and target in state.known_set:
+            return None
+        return ScoreOperation(target, operation, source)
+
+    if source in state.consts:
+        value = state.consts[source]
+        if target in state.consts:
+            result = score_operation(operation, state.consts[target], value)
+            if result is not None:
+                return ScoreSet(target, result)
+        if operation == "=":
+            return ScoreSet(target, value)
+        if operation in ("+=", "-="):
+            delta = value if operation == "+=" else -value
+            if delta == 0 and target in state.known_set:
+                return None
+            if -INT_MAX <= delta <= INT_MAX:
+                return ScoreAdd(target, delta)
+
+    return ScoreOperation(target, operation, source)
+
+
+def _forward_command(state: _ForwardState, command: Command, conditional: bool = False) -> Command | None:
+    """
+    处理单条命令并更新已知信息
+
+    :param state: 已知信息
+    :param command: 命令
+    :param conditional: 命令是否为条件执行
+    :return: 替换后的命令, 命令可以删除时返回None
+    """
+    if isinstance(command, ScoreSet):
+        new = command
+    elif isinstance(command, ScoreAdd):
+        new = command
+        if command.target in state.consts:
+            new = ScoreSet(command.target, wrap_int(state.consts[command.target] + command.value))
+    elif isinstance(command, ScoreReset):
+        if command.target in state.known_unset:
+            return None
+        new = command
+    elif isinstance(command, ScoreOperation):
+        new = _fold_operation(state, command)
+        if new is None:
+            return None
+    elif isinstance(command, ScoreGet):
+        new = ScoreGet(state.resolve(command.target))
+    else:
+        new = command
+
+    effects = command_effects(new)
+    for ref in effects.writes | effects.modifies:
+        state.invalidate(ref)
+    if conditional:
+        state.known_set.difference_update(effects.writes)
+        state.known_unset.difference_update(effects.writes | effects.modifies | effects.creates)
+        return new
+
+    # 嵌套的条件 reset 等只记录为部分修改
+    state.known_set.difference_update(effects.modifies - effects.creates)
+    state.known_unset.difference_update(effects.modifies)
+    state.created(*effects.creates)
+    if isinstance(new, ScoreSet):
+        state.consts[new.target] = new.value
+    elif isinstance(new, ScoreAdd) and new.target in state.consts:
+        state.consts[new.target] = wrap_int(state.consts[new.target] + new.value)
+    elif isinstance(new, ScoreReset):
+        state.known_set.discard(new.target)
+        state.known_unset.add(new.target)
+    elif isinstance(new, ScoreOperation) and new.operation == "=" and new.source != new.target:
+        state.copies[new.target] = new.source
+    return new
+
+
+def forward_pass(commands: Commands) -> Commands:
+    """
+    向前传播副本和常量: 删除多余的赋值和 reset, 将常量运算折叠为 set/add/remove
+
+    :param commands: 命令列表
+    :type commands: Commands
+    :return: 新的命令列表
+    :rtype: Commands
+    """
+    state = _ForwardState()
+    result = Commands()
+
+    for command in commands:
+        if isinstance(command, ExecuteIfScore):
+            left = state.resolve(command.left)
+            right = state.resolve(command.right)
+            if left in state.consts and right in state.consts:
+                passed = score_compare(command.compare_op, state.consts[left], state.consts[right])
+                if passed is not None:
+                    if passed == (command.check_type == "unless"):
+                        continue
+                    command = command.run
+            else:
+                run = command.run
+                if not command_effects(run).barrier:
+                    run = _forward_command(state, run, conditional=True) or run
+                command = ExecuteIfScore(command.check_type, left, command.compare_op, right, run)
+                if command_effects(command).barrier:
+                    state.clear()
+                result.append(command)
+                continue
+
+        if isinstance(command, ExecuteIfScoreMatches):
+            target = state.resolve(command.target)
+            if target in state.consts:
+                if command.contains(state.consts[target]) == (command.check_type == "unless"):
+                    continue
+                command = command.run
+            else:
+                run = command.run
+                if not command_effects(run).barrier:
+                    run = _forward_command(state, run, conditional=True) or run
+                command = ExecuteIfScoreMatches(command.check_type, target, command.low, command.high, run)
+                if command_effects(command).barrier:
+                    state.clear()
+                result.append(command)
+                continue
+
+        if command_effects(command).barrier:
+            state.clear()
+            result.append(command)
+            continue
+
+        new = _forward_command(state, command)
+        if new is not None:
+            result.append(new)
+
+    return result
+
+
+def dead_store_pass(commands: Commands) -> Commands:
+    """
+    删除结果在被读取前就被覆盖的命令 (文件末尾和屏障命令处所有分数都视为会被读取)
+
+    :param commands: 命令列表
+    :type commands: Commands
+    :return: 新的命令列表
+    :rtype: Commands
+    """
+    dead: set[ScoreRef] = set()
+    determined: set[ScoreRef] = set()
+    kept: list[Command] = []
+
+    for command in reversed(commands):
+        effects = command_effects(command)
+        if effects.barrier:
+            dead.clear()
+            determined.clear()
+            kept.append(command)
+            continue
+
+        changed = effects.writes | effects.modifies
+        if changed and changed <= dead and (effects.creates | changed) <= determined and not effects.observes:
+            continue
+
+        dead -= effects.reads | effects.observes
+        dead -= effects.modifies
+        dead |= effects.writes
+        determined -= effects.observes
+        determined |= effects.writes | effects.creates
+        kept.append(command)
+
+    kept.reverse()
+    return Commands(kept)
+
+
+def peephole(commands: Commands, max_rounds: int = 8) -> Commands:
+    """
+    对一个MCF文件的命令进行窥孔优化, 重复进行直到不再变化
+
+    :param commands: 命令列表
+    :type commands: Commands
+    :param max_rounds: 最大轮数
+    :type max_rounds: int
+    :return: 优化后的命令列表
+    :rtype: Commands
+    """
+    for _ in range(max_rounds):
+        optimized = dead_store_pass(forward_pass(sink_resets(commands)))
+        if optimized == commands:
+            break
+        commands = optimized
+    return commands
+
+
+__all__ = (
+    "INT_MIN",
+    "INT_MAX",
+    "wrap_int",
+    "score_operation",
+    "score_compare",
+
+    "constant_value",
+    "ConstantFolder",
+    "fold_constants",
+    "TailReturn",
+    "terminates",
+    "UnreachableCodeEliminator",
+    "eliminate_unreachable",
+    "SelfTailCall",
+    "TailRecursionConverter",
+    "convert_tail_recursion",
+    "FunctionInliner",
+    "inline_functions",
+    "optimize_tree",
+    "CallLiveness",
+    "annotate_call_liveness",
+    "ReturnFlow",
+    "annotate_return_flow",
+
+    "Effects",
+    "command_effects",
+
+    "sink_resets",
+    "forward_pass",
+    "dead_store_pass",
+    "peephole",
+)
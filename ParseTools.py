@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# cython: language_level = 3
+"""
+解析源码文件并缓存解析结果
+"""
+
+import ast
+import hashlib
+import os
+import pickle
+import warnings
+from typing import Any
+from typing import Iterator
+
+from Configuration import CompileConfiguration
+from Template import check_template
+
+PARSE_CACHE_VERSION: int = 1
+"""解析缓存格式版本, 修改缓存内容结构时需要增加"""
+
+
+def iter_import_names(tree: ast.AST) -> Iterator[str]:
+    """
+    遍历语法树中所有可能被导入的名称
+
+    :param tree: 语法树
+    :type tree: ast.AST
+    :return: 导入名称 (from-import 会同时给出模块本身和 模块.名称)
+    :rtype: Iterator[str]
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for n in node.names:
+                yield n.name
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            yield node.module
+            for n in node.names:
+                yield f"{node.module}.{n.name}"
+
+
+class ParseCache:
+    """
+    缓存源码文件的语法树, 导入名称和模板标记
+
+    缓存条目使用文件的修改时间和大小校验, 传入 cache_path 时同时保存到磁盘
+    语法树以pickle形式保存, 每次读取都会得到新的语法树, 修改读取到的语法树不会影响缓存
+    """
+
+    def __init__(self, cache_path: str | None = None) -> None:
+        """
+        初始化
+
+        :param cache_path: 缓存文件夹, 为None时仅缓存在内存中
+        :type cache_path: str | None
+        :return: None
+        :rtype: None
+        """
+        self.cache_dir = None if cache_path is None else os.path.join(cache_path, "parse")
+        self._entries: dict[str, dict[str, Any]] = {}
+
+        self.hits: dict[str, int] = {"tree": 0, "imports": 0, "template": 0}
+        self.misses: dict[str, int] = {"tree": 0, "imports": 0, "template": 0}
+
+    def _entry_path(self, path: str) -> str:
+        name = hashlib.sha256(path.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{name}.pickle")
+
+    def _entry(self, path: str) -> dict[str, Any]:
+        """
+        获取文件对应的缓存条目, 文件被修改过时返回新的空条目
+
+        :param path: 文件绝对路径
+        :type path: str
+        :return: 缓存条目
+        :rtype: dict[str, Any]
+        """
+        stat = os.stat(path)
+        signature = (PARSE_CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+
+        entry = self._entries.get(path)
+        if (entry is None) and (self.cache_dir is not None):
+            try:
+                with open(self._entry_path(path), mode="rb") as f:
+                    entry = pickle.load(f)
+            except FileNotFoundError:
+                pass
+            except Exception as err:
+                warnings.warn(f"无法读取解析缓存 {self._entry_path(path)}: {err!r}", UserWarning)
+
+        if (entry is None) or (entry["signature"] != signature):
+            entry = {"signature": signature}
+        self._entries[path] = entry
+        return entry
+
+    def _save(self, path: str, entry: dict[str, Any]) -> None:
+        """
+        保存缓存条目到磁盘 (先写入临时文件再替换, 多个进程同时写入时不会损坏缓存)
+
+        :param path: 文件绝对路径
+        :type path: str
+        :param entry: 缓存条目
+        :type entry: dict[str, Any]
+        :return: None
+        :rtype: None
+        """
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self._entry_path(path)
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(temp_path, mode="wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, entry_path)
+
+    def _parse(self, path: str, entry: dict[str, Any], encoding: str) -> ast.Module:
+        with open(path, mode='r', encoding=encoding) as f:
+            tree = ast.parse(f.read())
+        entry["tree"] = pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+        entry["imports"] = list(iter_import_names(tree))
+        return tree
+
+    def parse(self, path: str, encoding: str = "utf-8") -> ast.Module:
+        """
+        解析源码文件
+
+        :param path: 源码文件路径
+        :type path: str
+        :param encoding: 文件编码
+        :type encoding: str
+        :return: 语法树
+        :rtype: ast.Module
+        """
+        path = os.path.abspath(path)
+        entry = self._entry(path)
+        if "tree" in entry:
+            self.hits["tree"] += 1
+            return pickle.loads(entry["tree"])
+
+        self.misses["tree"] += 1
+        tree = self._parse(path, entry, encoding)
+        self._save(path, entry)
+        return tree
+
+    def import_names(self, path: str, encoding: str = "utf-8") -> list[str]:
+        """
+        获取源码文件中所有可能被导入的名称
+
+        :param path: 源码文件路径
+        :type path: str
+        :param encoding: 文件编码
+        :type encoding: str
+        :return: 导入名称
+        :rtype: list[str]
+
+        .. seealso::
+            :func:`iter_import_names`
+        """
+        path = os.path.abspath(path)
+        entry = self._entry(path)
+        if "imports" in entry:
+            self.hits["imports"] += 1
+            return list(entry["imports"])
+
+        self.misses["imports"] += 1
+        self._parse(path, entry, encoding)
+        self._save(path, entry)
+        return list(entry["imports"])
+
+    def is_template(self, path: str) -> bool:
+        """
+        检查文件是否为模板文件
+
+        :param path: 要检查的文件路径
+        :type path: str
+        :return: 是否为模版文件
+        :rtype: bool
+
+        .. seealso::
+            :func:`Template.check_template`
+        """
+        path = os.path.abspath(path)
+        entry = self._entry(path)
+        if "template" in entry:
+            self.hits["template"] += 1
+            return entry["template"]
+
+        self.misses["template"] += 1
+        entry["template"] = check_template(path)
+        self._save(path, entry)
+        return entry["template"]
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """
+        获取缓存命中统计
+
+        :return: {类型: {"hits": 命中次数, "misses": 未命中次数}}
+        :rtype: dict[str, dict[str, int]]
+        """
+        return {kind: {"hits": self.hits[kind], "misses": self.misses[kind]} for kind in self.hits}
+
+
+_parse_caches: dict[str | None, ParseCache] = {}
+
+
+def get_parse_cache(c_conf: CompileConfiguration) -> ParseCache:
+    """
+    获取编译配置对应的解析缓存 (同一进程中相同缓存文件夹共用一个解析缓存)
+
+    :param c_conf: 编译配置
+    :type c_conf: CompileConfiguration
+    :return: 解析缓存
+    :rtype: ParseCache
+    """
+    key = None if c_conf.CACHE_PATH is None else os.path.abspath(c_conf.CACHE_PATH)
+    if key not in _parse_caches:
+        _parse_caches[key] = ParseCache(key)
+    return _parse_caches[key]
+
+
+__all__ = (
+    "PARSE_CACHE_VERSION",
+
+    "iter_import_names",
+    "ParseCache",
+    "get_parse_cache",
+)
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+# cython: language_level = 3
+"""
+编译性能分析
+"""
+
+import functools
+import json
+import os
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+
+from CommandTypes import Command
+from CommandTypes import Commands
+
+
+def count_commands(text: str) -> int:
+    """
+    统计文本中的命令数量 (不包含空行和注释)
+
+    :param text: MCF文本
+    :type text: str
+    :return: 命令数量
+    :rtype: int
+    """
+    count = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            count += 1
+    return count
+
+
+class _Frame:
+    """
+    正在记录的节点或区间
+    """
+
+    __slots__ = ("kind", "name", "module", "start", "child_time", "child_commands", "mem_base", "peak")
+
+    def __init__(self, kind: str, name: str, module: str, start: int, mem_base: int) -> None:
+        self.kind = kind
+        self.name = name
+        self.module = module
+        self.start = start
+        self.child_time: int = 0
+        self.child_commands: int = 0
+        self.mem_base = mem_base
+        self.peak = mem_base
+
+
+def _new_stats() -> dict[str, int]:
+    return {"count": 0, "wall": 0, "self": 0, "commands": 0, "self_commands": 0, "bytes": 0, "peak_memory": 0}
+
+
+def _new_module_stats() -> dict[str, int]:
+    return {"count": 0, "self": 0, "commands": 0, "bytes": 0, "peak_memory": 0}
+
+
+class CompileProfiler:
+    """
+    记录编译时每种AST节点和每个模块的耗时, 生成命令数, 生成字节数和内存峰值
+
+    节点按 Environment.generate_code 的调用嵌套记录, 命名空间操作和文件写入作为区间记录在所在节点之下
+    wall 为包含子节点的耗时, self 为扣除子节点和区间后的耗时
+    节点的 commands/bytes 为节点返回文本的统计, self_commands 扣除了子节点返回的部分
+    模块的 commands/bytes 为该模块实际写入文件的统计
+    时间单位为纳秒, 内存单位为字节
+    """
+
+    def __init__(self, *, trace_memory: bool = True) -> None:
+        """
+        初始化
+
+        :param trace_memory: 是否使用tracemalloc记录内存峰值
+        :type trace_memory: bool
+        :return: None
+        :rtype: None
+        """
+        self.trace_memory = trace_memory
+        self._stack: list[_Frame] = []
+        self._origin = time.perf_counter_ns()
+
+        self.nodes: dict[str, dict[str, int]] = {}
+        self.modules: dict[str, dict[str, int]] = {}
+        self.spans: dict[str, dict[str, int]] = {}
+        self.events: list[dict[str, Any]] = []
+
+        self._started_tracing: bool = False
+        """tracemalloc是否由该分析器启动, 只有这时 stop 才会停止tracemalloc"""
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self) -> None:
+        """
+        停止记录内存, 由该分析器启动的tracemalloc会被停止 (编译结束后调用, 避免之后的代码一直被追踪)
+
+        :return: None
+        :rtype: None
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.trace_memory = False
+
+    def _memory(self) -> tuple[int, int]:
+        if not self.trace_memory:
+            return 0, 0
+        return tracemalloc.get_traced_memory()
+
+    def enter(self, kind: str, name: str, module: str | None = None) -> _Frame:
+        """
+        开始记录
+
+        :param kind: "node" 或 区间类别 (如 "namespace", "io")
+        :type kind: str
+        :param name: 节点类型名或区间名
+        :type name: str
+        :param module: 所属模块, 为None时继承上一层
+        :type module: str | None
+        :return: 记录帧, 需要传给 exit
+        :rtype: _Frame
+        """
+        current, peak = self._memory()
+        if self._stack:
+            parent = self._stack[-1]
+            parent.peak = max(parent.peak, peak)
+            if module is None:
+                module = parent.module
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+        frame = _Frame(kind, name, module or '', time.perf_counter_ns(), current)
+        self._stack.append(frame)
+        return frame
+
+    def exit(self, frame: _Frame, result: Commands | Command | str | None = None) -> None:
+        """
+        结束记录
+
+        :param frame: enter 返回的记录帧
+        :type frame: _Frame
+        :param result: 节点返回的命令 或 区间写入文件的命令
+        :type result: Commands | Command | str | None
+        :return: None
+        :rtype: None
+        """
+        end = time.perf_counter_ns()
+        frame.peak = max(frame.peak, self._memory()[1])
+        popped = self._stack.pop()
+        assert popped is frame, "CompileProfiler: enter/exit 不匹配"
+
+        if isinstance(result, (Command, Commands)):
+            result = str(result)
+
+        wall = end - frame.start
+        self_time = wall - frame.child_time
+        commands = count_commands(result) if result else 0
+        size = len(result.encode("utf-8")) if result else 0
+        self_commands = max(0, commands - frame.child_commands)
+        peak = frame.peak - frame.mem_base
+
+        if self._stack:
+            parent = self._stack[-1]
+            parent.child_time += wall
+            parent.peak = max(parent.peak, frame.peak)
+            if frame.kind == "node":
+                parent.child_commands += commands
+
+        if frame.kind == "node":
+            stats = self.nodes.setdefault(frame.name, _new_stats())
+        else:
+            stats = self.spans.setdefault(f"{frame.kind}.{frame.name}", _new_stats())
+        stats["count"] += 1
+        stats["wall"] += wall
+        stats["self"] += self_time
+        stats["commands"] += commands
+        stats["self_commands"] += self_commands
+        stats["bytes"] += size
+        stats["peak_memory"] = max(stats["peak_memory"], peak)
+
+        module_stats = self.modules.setdefault(frame.module, _new_module_stats())
+        module_stats["self"] += self_time
+        module_stats["peak_memory"] = max(module_stats["peak_memory"], peak)
+        if frame.kind == "node":
+            module_stats["count"] += 1
+        else:
+            module_stats["commands"] += commands
+            module_stats["bytes"] += size
+
+        self.events.append({
+            "name": frame.name,
+            "cat": frame.kind,
+            "ph": 'X',
+            "ts": (frame.start - self._origin) / 1000,
+            "dur": wall / 1000,
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": {"module": frame.module, "commands": commands, "bytes": size, "peak_memory": peak},
+        })
+
+    @contextmanager
+    def span(self, kind: str, name: str, module: str | None = None) -> Iterator[None]:
+        """
+        记录一个区间
+
+        :param kind: 区间类别
+        :type kind: str
+        :param name: 区间名
+        :type name: str
+        :param module: 所属模块, 为None时继承上一层
+        :type module: str | None
+        :return: 上下文管理器
+        :rtype: Iterator[None]
+        """
+        frame = self.enter(kind, name, module)
+        try:
+            yield
+        finally:
+            self.exit(frame)
+
+    def instrument(self, obj: Any, methods: Iterable[str], kind: str, *, measure_text: bool = False) -> None:
+        """
+        替换对象上的方法, 使每次调用都记录为区间
+
+        :param obj: 需要记录的对象
+        :type obj: Any
+        :param methods: 方法名
+        :type methods: Iterable[str]
+        :param kind: 区间类别
+        :type kind: str
+        :param measure_text: 是否把第一个参数 (写入的命令) 计入区间的命令数和字节数
+        :type measure_text: bool
+        :return: None
+        :rtype: None
+        """
+        for method_name in methods:
+            method = getattr(obj, method_name)
+
+            def _wrapper(*args, __method=method, __name=method_name, **kwargs):
+                frame = self.enter(kind, __name)
+                text = None
+                if measure_text and args and isinstance(args[0], (str, Command, Commands)):
+                    text = args[0]
+                try:
+                    return __method(*args, **kwargs)
+                finally:
+                    self.exit(frame, text)
+
+            setattr(obj, method_name, functools.wraps(method)(_wrapper))
+
+    def to_json(self) -> OrderedDict[str, Any]:
+        """
+        导出统计结果
+
+        :return: 统计结果 (各项按 self 耗时降序排列)
+        :rtype: OrderedDict[str, Any]
+        """
+
+        def _sorted(stats: dict[str, dict[str, int]]) -> OrderedDict[str, dict[str, int]]:
+            return OrderedDict(sorted(stats.items(), key=lambda item: item[1]["self"], reverse=True))
+
+        return OrderedDict([
+            ("unit", {"time": "ns", "memory": "byte"}),
+            ("nodes", _sorted(self.nodes)),
+            ("modules", _sorted(self.modules)),
+            ("spans", _sorted(self.spans)),
+        ])
+
+    def dump_json(self, path: str) -> None:
+        """
+        将统计结果保存为JSON文件
+
+        :param path: 文件路径
+        :type path: str
+        :return: None
+        :rtype: None
+        """
+        with open(path, mode='w', encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=4, ensure_ascii=False)
+
+    def dump_chrome_trace(self, path: str) -> None:
+        """
+        将所有记录保存为Chrome Trace文件 (可在 chrome://tracing 或 Perfetto 中打开)
+
+        :param path: 文件路径
+        :type path: str
+        :return: None
+        :rtype: None
+        """
+        with open(path, mode='w', encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def print_summary(self, limit: int = 10) -> None:
+        """
+        打印耗时最多的节点类型, 模块和区间
+
+        :param limit: 每类最多打印的条目数
+        :type limit: int
+        :return: None
+        :rtype: None
+        """
+        data = self.to_json()
+        for title in ("nodes", "modules", "spans"):
+            print(f"[PROFILE] {title}:")
+            for name, stats in list(data[title].items())[:limit]:
+                wall = f" wall={stats['wall'] / 1e6:.3f}ms" if "wall" in stats else ''
+                print(
+                    f"    {name or '<root>':<32}"
+                    f" count={stats['count']:<6}"
+                    f" self={stats['self'] / 1e6:.3f}ms{wall}"
+                    f" commands={stats.get('self_commands', stats['commands'])}"
+                    f" bytes={stats['bytes']}"
+                    f" peak={stats['peak_memory']}"
+                )
+
+
+__all__ = (
+    "count_commands",
+    "CompileProfiler",
+)
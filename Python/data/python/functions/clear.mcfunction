@@ -5,6 +5,7 @@ scoreboard objectives remove ${SB:Flags}
 scoreboard objectives remove ${SB:Input}
 scoreboard objectives remove ${SB:Vars}
 scoreboard objectives remove ${SB:FuncResult}
+scoreboard objectives remove ${SB:Consts}
 data remove storage ${DS:Root} ${DS:Temp}
 data remove storage ${DS:Root} ${DS:LocalVars}
 data remove storage ${DS:Root} ${DS:LocalTemp}
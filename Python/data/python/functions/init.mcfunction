@@ -9,6 +9,7 @@ scoreboard players set Neg ${SB:Flags} -1
 scoreboard players set DEBUG ${SB:Flags} 0
 scoreboard objectives add ${SB:Input} trigger
 scoreboard objectives add ${SB:FuncResult} dummy
+scoreboard objectives add ${SB:Consts} dummy
 data modify storage ${DS:Root} ${DS:LocalVars} set value []
 data modify storage ${DS:Root} ${DS:LocalTemp} set value []
 tellraw @a { "text": "" , "extra": [ ${RAWJSON:Prefix}, { "text": " ${CHAT:InitializationComplete}" }], "color": "gold", ${RAWJSON.HoverEvent:Author} }
\ No newline at end of file
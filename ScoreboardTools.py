@@ -4,10 +4,289 @@
 计分板相关工具函数
 """
 
+import warnings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from CommandTypes import Command
+from CommandTypes import Commands
+from CommandTypes import ExecuteIfScore
+from CommandTypes import ExecuteIfScoreMatches
+from CommandTypes import ScoreAdd
+from CommandTypes import ScoreOperation
+from CommandTypes import ScoreRef
+from CommandTypes import ScoreReset
+from CommandTypes import ScoreSet
 from Constant import ScoreBoards
 
-SB_Name2Code: dict[str, dict[str, str]] = {}
-SB_Code2Name: dict[str, dict[str, str]] = {}
+IgnoreEncode: bool = False
+
+# 计分目标编码使用的字符 (编码为这些字符组成的 base-62 数字)
+CODE_ALPHABET: str = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def encode_id(value: int) -> str:
+    """
+    将编号转换为计分目标编码
+
+    :param value: 编号 (非负整数)
+    :type value: int
+    :return: 编码
+    :rtype: str
+    """
+    base = len(CODE_ALPHABET)
+    code = CODE_ALPHABET[value % base]
+    value //= base
+    while value:
+        code = CODE_ALPHABET[value % base] + code
+        value //= base
+    return code
+
+
+def decode_id(code: str) -> int | None:
+    """
+    将计分目标编码转换为编号
+
+    :param code: 编码
+    :type code: str
+    :return: 编号, 不是有效的编码时返回None
+    :rtype: int | None
+    """
+    value = 0
+    for char in code:
+        digit = CODE_ALPHABET.find(char)
+        if digit < 0:
+            return None
+        value = value * len(CODE_ALPHABET) + digit
+    return value if code else None
+
+
+class SymbolTable:
+    """
+    计分目标编码表
+
+    为每个计分项中的计分目标按分配顺序依次分配尽可能短的编码 (Flag计分项和常量计分项不会被编码),
+    每个编译环境持有自己的编码表, 同一个编码表中相同的计分目标总是得到相同的编码
+    """
+
+    def __init__(self, start: int = 0, stop: int | None = None) -> None:
+        """
+        初始化
+
+        :param start: 每个计分项的起始编号 (用于避免同时编译的不同编码表之间的编码冲突)
+        :type start: int
+        :param stop: 每个计分项可分配的编号上限 (不包含), 为None时不限制
+        :type stop: int | None
+        :return: None
+        :rtype: None
+        """
+        self.start: int = start
+        self.stop: int | None = stop
+        self.name2code: dict[str, dict[str, str]] = {}
+        self.code2name: dict[str, dict[str, str]] = {}
+        self._next_ids: dict[str, int] = {}
+        self._recorders: list[set[tuple[str, str]]] = []
+
+    def init_objective(self, objective: str) -> None:
+        """
+        初始化计分项
+
+        :param objective: 计分项id
+        :type objective: str
+        :return: None
+        :rtype: None
+        """
+        if objective not in self.name2code:
+            self.name2code[objective] = {}
+            self.code2name[objective] = {}
+            self._next_ids[objective] = self.start
+
+    def _in_range(self, value: int) -> bool:
+        return (value >= self.start) and ((self.stop is None) or (value < self.stop))
+
+    def _record(self, name: str, objective: str) -> None:
+        if self._recorders:
+            self._recorders[-1].add((objective, name))
+
+    def init_name(self, name: str, objective: str) -> None:
+        """
+        初始化不编码的计分目标
+
+        :param name: 目标
+        :type name: str
+        :param objective: 计分项
+        :type objective: str
+        :return: None
+        :rtype: None
+        """
+        self.init_objective(objective)
+        if self.code2name[objective].get(name, name) != name:
+            raise Exception(f"计分目标 '{name}' 与计分项 '{objective}' 中已分配的编码冲突")
+        self.name2code[objective][name] = name
+        self.code2name[objective][name] = name
+        self._record(name, objective)
+
+    def code(self, name: str, objective: str) -> str:
+        """
+        编码计分目标, 没有编码时分配新的编码
+
+        :param name: 目标
+        :type name: str
+        :param objective: 计分项
+        :type objective: str
+        :return: 编码后的计分目标
+        :rtype: str
+        """
+        self.init_objective(objective)
+
+        name2code = self.name2code[objective]
+        if name in name2code:
+            self._record(name, objective)
+            return name2code[name]
+
+        if IgnoreEncode or (objective in (ScoreBoards.Flags, ScoreBoards.Consts)):
+            self.init_name(name, objective)
+            return name
+
+        code2name = self.code2name[objective]
+        next_id = self._next_ids[objective]
+        code = encode_id(next_id)
+        while code in code2name:
+            next_id += 1
+            code = encode_id(next_id)
+        if not self._in_range(next_id):
+            raise OverflowError(
+                f"计分项 '{objective}' 的计分目标编码超出了编码表的范围 ({self.start} ~ {self.stop - 1})"
+            )
+        self._next_ids[objective] = next_id + 1
+
+        name2code[name] = code
+        code2name[code] = name
+        self._record(name, objective)
+        return code
+
+    def lookup(self, name: str, objective: str) -> str:
+        """
+        获取已编码的计分目标
+
+        :param name: 目标
+        :type name: str
+        :param objective: 计分项
+        :type objective: str
+        :return: 编码后的计分目标
+        :rtype: str
+        :raises KeyError: 计分目标没有编码
+        """
+        code = self.name2code[objective][name]
+        self._record(name, objective)
+        return code
+
+    def register(self, name: str, objective: str, code: str) -> None:
+        """
+        登记已有的编码 (用于从缓存恢复), 之后不会再分配该编码
+
+        :param name: 目标
+        :type name: str
+        :param objective: 计分项
+        :type objective: str
+        :param code: 编码
+        :type code: str
+        :return: None
+        :rtype: None
+        """
+        self.init_objective(objective)
+        self.name2code[objective][name] = code
+        self.code2name[objective][code] = name
+        value = decode_id(code) if code != name else None
+        if value is not None:
+            self._next_ids[objective] = max(self._next_ids[objective], value + 1)
+
+    def conflicts(self, scoreboard: dict[str, dict[str, str]]) -> bool:
+        """
+        检查编码是否与编码表冲突 (超出编码表范围的编码也视为冲突)
+
+        :param scoreboard: {计分项: {目标: 编码}}
+        :type scoreboard: dict[str, dict[str, str]]
+        :return: 是否冲突
+        :rtype: bool
+        """
+        for objective, names in scoreboard.items():
+            name2code = self.name2code.get(objective, {})
+            code2name = self.code2name.get(objective, {})
+            for name, code in names.items():
+                if name in name2code:
+                    if name2code[name] != code:
+                        return True
+                elif code in code2name:
+                    return True
+                value = decode_id(code) if code != name else None
+                if (value is not None) and not self._in_range(value):
+                    return True
+        return False
+
+    @contextmanager
+    def recording(self) -> Iterator[set[tuple[str, str]]]:
+        """
+        记录期间编码或读取的计分目标 (嵌套记录时只记录到最内层)
+
+        :return: 上下文管理器, 返回记录的 {(计分项, 目标)}
+        :rtype: Iterator[set[tuple[str, str]]]
+        """
+        used: set[tuple[str, str]] = set()
+        self._recorders.append(used)
+        try:
+            yield used
+        finally:
+            self._recorders.pop()
+
+    def export(self, used: set[tuple[str, str]]) -> dict[str, dict[str, str]]:
+        """
+        导出计分目标的编码
+
+        :param used: {(计分项, 目标)}
+        :type used: set[tuple[str, str]]
+        :return: {计分项: {目标: 编码}}
+        :rtype: dict[str, dict[str, str]]
+        """
+        scoreboard: dict[str, dict[str, str]] = {}
+        for objective, name in sorted(used):
+            scoreboard.setdefault(objective, {})[name] = self.name2code[objective][name]
+        return scoreboard
+
+
+_active_symbols: ContextVar[SymbolTable] = ContextVar("_active_symbols")
+
+
+def current_symbols() -> SymbolTable:
+    """
+    获取当前使用的计分目标编码表 (编译时为编译环境的编码表)
+
+    :return: 编码表
+    :rtype: SymbolTable
+    :raises Exception: 没有正在使用的编码表时抛出
+    """
+    try:
+        return _active_symbols.get()
+    except LookupError:
+        raise Exception("没有正在使用的计分目标编码表, 请在 use_symbols 上下文中生成计分板命令") from None
+
+
+@contextmanager
+def use_symbols(symbols: SymbolTable) -> Iterator[SymbolTable]:
+    """
+    在上下文中使用指定的计分目标编码表 (每个线程和协程互不影响)
+
+    :param symbols: 编码表
+    :type symbols: SymbolTable
+    :return: 上下文管理器
+    :rtype: Iterator[SymbolTable]
+    """
+    token = _active_symbols.set(symbols)
+    try:
+        yield symbols
+    finally:
+        _active_symbols.reset(token)
 
 
 def init_objective(objective: str) -> None:
@@ -19,9 +298,7 @@ def init_objective(objective: str) -> None:
     :return: None
     :rtype: None
     """
-    if objective not in SB_Name2Code:
-        SB_Name2Code[objective] = {}
-        SB_Code2Name[objective] = {}
+    current_symbols().init_objective(objective)
 
 
 def init_name(name: str, objective: str) -> None:
@@ -35,14 +312,12 @@ def init_name(name: str, objective: str) -> None:
     :return: None
     :rtype: None
     """
-    init_objective(objective)
-    SB_Name2Code[objective][name] = name
-    SB_Code2Name[objective][name] = name
+    current_symbols().init_name(name, objective)
 
 
 def _init_flags(name: str, objective: str) -> None:
     """
-    如果是标记位计分项，则初始化计分目标
+    如果是标记位或常量计分项，则初始化计分目标
 
     :param name: 目标
     :type name: str
@@ -51,18 +326,13 @@ def _init_flags(name: str, objective: str) -> None:
     :return: None
     :rtype: None
     """
-    if objective == ScoreBoards.Flags:
+    if objective in (ScoreBoards.Flags, ScoreBoards.Consts):
         init_name(name, objective)
 
 
-IgnoreEncode: bool = False
-
-_SB_ID = 0
-
-
 def gen_code(name: str, objective: str) -> str:
     """
-    编码计分目标 (Flag计分项不会被编码)
+    编码计分目标 (Flag计分项和常量计分项不会被编码)
 
     :param name: 目标
     :type name: str
@@ -71,27 +341,7 @@ def gen_code(name: str, objective: str) -> str:
     :return: 编码后的计分目标
     :rtype: str
     """
-    global _SB_ID
-
-    init_objective(objective)
-
-    if name in SB_Name2Code[objective]:
-        return SB_Name2Code[objective][name]
-
-    if objective == ScoreBoards.Flags:
-        _init_flags(name, objective)
-        return name
-
-    if IgnoreEncode:
-        init_name(name, objective)
-        return name
-
-    _SB_ID += 1
-    code = hex(_SB_ID)
-    SB_Name2Code[objective][name] = code
-    SB_Code2Name[objective][code] = name
-
-    return code
+    return current_symbols().code(name, objective)
 
 
 class SBCheckType:
@@ -115,15 +365,42 @@ class SBCompareType:
     MORE_EQUAL = ">="
 
 
+def _deprecated_line_break(line_break: bool | None) -> None:
+    if line_break is not None:
+        warnings.warn(
+            "line_break is deprecated, commands no longer contain line breaks",
+            DeprecationWarning,
+            stacklevel=3
+        )
+
+
+def _single_command(cmd: Command | Commands | str) -> Command:
+    """
+    将cmd转换为单条命令
+
+    :param cmd: 命令对象 或 单行MCF文本
+    :type cmd: Command | Commands | str
+    :return: 命令对象
+    :rtype: Command
+    """
+    if isinstance(cmd, Command):
+        return cmd
+
+    commands = Commands.coerce(cmd)
+    if len(commands) != 1:
+        raise ValueError("cmd can't have more than one line")
+    return commands[0]
+
+
 def CHECK_SB(
         check_type: str,
         a_name: str, a_objective: str,
         compare_op: str,
         b_name: str, b_objective: str,
-        cmd: str,
+        cmd: Command | Commands | str,
         *,
-        line_break: bool = True
-) -> str:
+        line_break: bool | None = None
+) -> ExecuteIfScore:
     """
     如果检查条件成立, 就执行cmd
 
@@ -139,35 +416,67 @@ def CHECK_SB(
     :type b_name: str
     :param b_objective: 计分项B
     :type b_objective: str
-    :param cmd: 要执行的命令
-    :type cmd: str
-    :param line_break: 是否进行换行
-    :type line_break: bool
+    :param cmd: 要执行的命令 (命令对象 或 单行MCF文本)
+    :type cmd: Command | Commands | str
+    :param line_break: 已弃用, 命令对象不再包含换行符
+    :type line_break: bool | None
     :return: 生成的命令
-    :rtype: str
+    :rtype: ExecuteIfScore
     """
-    count_line = cmd.count('\n')
-    if (count_line > 1) or (count_line == 1 and (not cmd.endswith('\n'))):
-        raise ValueError("cmd can't have more than one line")
-
-    if cmd.endswith("\n"):
-        cmd = cmd[:-1]
+    _deprecated_line_break(line_break)
+    cmd = _single_command(cmd)
 
     _init_flags(b_name, b_objective)
-    command = (
-        f"execute {check_type} score "
-        f"{SB_Name2Code[a_objective][a_name]} {a_objective} "
-        f"{compare_op} "
-        f"{SB_Name2Code[b_objective][b_name]} {b_objective} "
-        f"run {cmd}"
+    return ExecuteIfScore(
+        check_type,
+        ScoreRef(current_symbols().lookup(a_name, a_objective), a_objective),
+        compare_op,
+        ScoreRef(current_symbols().lookup(b_name, b_objective), b_objective),
+        cmd
     )
-    if line_break:
-        command += "\n"
 
-    return command
 
+def CHECK_SB_RANGE(
+        check_type: str,
+        name: str, objective: str,
+        low: int | None, high: int | None,
+        cmd: Command | Commands | str
+) -> ExecuteIfScoreMatches:
+    """
+    如果分数在范围内 (检查类型为UNLESS时不在范围内), 就执行cmd
 
-def SB_ASSIGN(to_name: str, to_objective: str, from_name: str, from_objective: str, *, line_break: bool = True) -> str:
+    :param check_type: 检查类型 (SBCheckType)
+    :type check_type: str
+    :param name: 目标
+    :type name: str
+    :param objective: 计分项
+    :type objective: str
+    :param low: 范围下界 (包含), 为None时没有下界
+    :type low: int | None
+    :param high: 范围上界 (包含), 为None时没有上界
+    :type high: int | None
+    :param cmd: 要执行的命令 (命令对象 或 单行MCF文本)
+    :type cmd: Command | Commands | str
+    :return: 生成的命令
+    :rtype: ExecuteIfScoreMatches
+    """
+    cmd = _single_command(cmd)
+
+    _init_flags(name, objective)
+    return ExecuteIfScoreMatches(
+        check_type,
+        ScoreRef(current_symbols().lookup(name, objective), objective),
+        low, high,
+        cmd
+    )
+
+
+def SB_ASSIGN(
+        to_name: str, to_objective: str,
+        from_name: str, from_objective: str,
+        *,
+        line_break: bool | None = None
+) -> ScoreOperation:
     """
     将from_name的值赋给to_name
 
@@ -179,22 +488,18 @@ def SB_ASSIGN(to_name: str, to_objective: str, from_name: str, from_objective: s
     :type from_name: str
     :param from_objective: 源计分项
     :type from_objective: str
-    :param line_break: 是否进行换行
-    :type line_break: bool
+    :param line_break: 已弃用, 命令对象不再包含换行符
+    :type line_break: bool | None
     :return: 生成的命令
-    :rtype: str
+    :rtype: ScoreOperation
     """
+    _deprecated_line_break(line_break)
     _init_flags(from_name, from_objective)
-    command = (
-        f"scoreboard players operation "
-        f"{gen_code(to_name, to_objective)} {to_objective} "
-        f"= "
-        f"{SB_Name2Code[from_objective][from_name]} {from_objective}"
+    return ScoreOperation(
+        ScoreRef(gen_code(to_name, to_objective), to_objective),
+        SBOperationType.ASSIGN,
+        ScoreRef(current_symbols().lookup(from_name, from_objective), from_objective)
     )
-    if line_break:
-        command += "\n"
-
-    return command
 
 
 class SBOperationType:
@@ -220,8 +525,8 @@ def SB_OP(
         target_name: str, target_objective: str,
         selector: str, objective: str,
         *,
-        line_break: bool = True
-) -> str:
+        line_break: bool | None = None
+) -> ScoreOperation:
     """
     对两个计分目标做任意支持的操作
 
@@ -235,29 +540,27 @@ def SB_OP(
     :type selector: str
     :param objective: 记分项
     :type objective: str
-    :param line_break: 是否进行换行
-    :type line_break: bool
+    :param line_break: 已弃用, 命令对象不再包含换行符
+    :type line_break: bool | None
     :return: 生成的命令
-    :rtype: str
+    :rtype: ScoreOperation
     """
+    _deprecated_line_break(line_break)
 
     _init_flags(selector, objective)
-    if selector in SB_Name2Code[objective]:
-        selector = SB_Name2Code[objective][selector]
-
-    command = (
-        f"scoreboard players operation "
-        f"{gen_code(target_name, target_objective)} {target_objective} "
-        f"{operation} "
-        f"{selector} {objective}"
+    try:
+        selector = current_symbols().lookup(selector, objective)
+    except KeyError:
+        pass
+
+    return ScoreOperation(
+        ScoreRef(gen_code(target_name, target_objective), target_objective),
+        operation,
+        ScoreRef(selector, objective)
     )
-    if line_break:
-        command += "\n"
 
-    return command
 
-
-def SB_RESET(name: str, objective: str, *, line_break: bool = True) -> str:
+def SB_RESET(name: str, objective: str, *, line_break: bool | None = None) -> ScoreReset:
     """
     重置计分目标
 
@@ -265,20 +568,17 @@ def SB_RESET(name: str, objective: str, *, line_break: bool = True) -> str:
     :type name: str
     :param objective: 计分项
     :type objective: str
-    :param line_break: 是否进行换行
-    :type line_break: bool
+    :param line_break: 已弃用, 命令对象不再包含换行符
+    :type line_break: bool | None
     :return: 生成的命令
-    :rtype: str
+    :rtype: ScoreReset
     """
+    _deprecated_line_break(line_break)
     init_objective(objective)
-    command = f"scoreboard players reset {SB_Name2Code[objective][name]} {objective}"
-    if line_break:
-        command += "\n"
-
-    return command
+    return ScoreReset(ScoreRef(current_symbols().lookup(name, objective), objective))
 
 
-def SB_CONSTANT(name: str, objective: str, value: int, *, line_break: bool = True) -> str:
+def SB_CONSTANT(name: str, objective: str, value: int, *, line_break: bool | None = None) -> ScoreSet:
     """
     将计分目标设置为常量
 
@@ -288,16 +588,29 @@ def SB_CONSTANT(name: str, objective: str, value: int, *, line_break: bool = Tru
     :type objective: str
     :param value: 常量值
     :type value: int
-    :param line_break: 是否换行
-    :type line_break: bool
+    :param line_break: 已弃用, 命令对象不再包含换行符
+    :type line_break: bool | None
     :return: 生成的命令
-    :rtype: str
+    :rtype: ScoreSet
     """
-    command = f"scoreboard players set {gen_code(name, objective)} {objective} {value}"
-    if line_break:
-        command += "\n"
+    _deprecated_line_break(line_break)
+    return ScoreSet(ScoreRef(gen_code(name, objective), objective), value)
+
 
-    return command
+def SB_ADD(name: str, objective: str, value: int) -> ScoreAdd:
+    """
+    将计分目标加上常量 (常量为负数时减去其绝对值)
+
+    :param name: 目标
+    :type name: str
+    :param objective: 计分项
+    :type objective: str
+    :param value: 常量值
+    :type value: int
+    :return: 生成的命令
+    :rtype: ScoreAdd
+    """
+    return ScoreAdd(ScoreRef(gen_code(name, objective), objective), value)
 
 
 __all__ = (
@@ -305,16 +618,22 @@ __all__ = (
     "SBCompareType",
 
     "CHECK_SB",
+    "CHECK_SB_RANGE",
     "SB_ASSIGN",
     "SBOperationType",
     "SB_OP",
     "SB_RESET",
     "SB_CONSTANT",
+    "SB_ADD",
 
     "IgnoreEncode",
+    "CODE_ALPHABET",
 
-    "SB_Name2Code",
-    "SB_Code2Name",
+    "SymbolTable",
+    "current_symbols",
+    "use_symbols",
+    "encode_id",
+    "decode_id",
 
     "init_objective",
     "init_name",
@@ -8,18 +8,32 @@ import ast
 import functools
 import importlib
 import inspect
+import re
 from typing import Any
 from typing import Callable
 from typing import TypeVar
 
 from ABCTypes import ABCEnvironment
+from CommandTypes import Command
+from CommandTypes import Commands
+from CommandTypes import ExecuteStoreStorage
+from CommandTypes import FunctionCall
+from CommandTypes import MacroCommand
+from CommandTypes import ScoreGet
+from CommandTypes import ScoreOperation
+from CommandTypes import ScoreRef
+from CommandTypes import ScoreReset
+from CommandTypes import parse_commands
 from Configuration import CompileConfiguration
 from Configuration import GlobalConfiguration
+from DispatchTools import build_adapter
+from NamespaceTools import join_file_ns
 from ScoreboardTools import SB_ASSIGN
-from ScoreboardTools import SB_Name2Code
 from ScoreboardTools import SB_RESET
+from ScoreboardTools import current_symbols
 
-template_funcs = {}
+template_funcs: dict[str, Callable] = {}
+"""{模板函数名: 编译用函数}, 导入模板文件时注册, 编译时只能使用复制到编译环境中的函数"""
 
 
 class ArgData:
@@ -49,9 +63,9 @@ class ArgData:
         :return: 计分目标编码结果
         :rtype: str
         """
-        return SB_Name2Code[self.objective][self.name]
+        return current_symbols().lookup(self.name, self.objective)
 
-    def toResult(self, name: str, objective: str) -> str:
+    def toResult(self, name: str, objective: str) -> ScoreOperation:
         """
         生成将计分目标赋值给 name, objective 的指令
 
@@ -60,13 +74,32 @@ class ArgData:
         :param objective: 计分目标对象
         :type objective: str
         :return: 生成的指令
-        :rtype: str
+        :rtype: ScoreOperation
         """
         return SB_ASSIGN(
             name, objective,
             self.name, self.objective
         )
 
+    @property
+    def macro_key(self) -> str:
+        """
+        获取计分目标在函数宏中使用的键
+
+        :return: 函数宏的键
+        :rtype: str
+        """
+        return re.sub(r"[^0-9A-Za-z_]", '_', f"{self.objective}_{self.code}")
+
+    def toMacro(self) -> str:
+        """
+        生成在函数宏命令中引用计分目标值的文本 (需要目标版本支持函数宏)
+
+        :return: 函数宏参数引用
+        :rtype: str
+        """
+        return f"$({self.macro_key})"
+
     def toJson(self) -> dict:
         """
         生成计分目标的原始JSON文本
@@ -76,12 +109,12 @@ class ArgData:
         """
         return {"score": {"name": f"{self.code}", "objective": self.objective}}
 
-    def ReSet(self) -> str:
+    def ReSet(self) -> ScoreReset:
         """
         生成将计分目标重置的指令
 
         :return: 生成的指令
-        :rtype: str
+        :rtype: ScoreReset
         """
         return SB_RESET(
             self.name, self.objective
@@ -126,7 +159,9 @@ def register_func(func_for_compile: Callable[..., str]) -> Callable[[Callable_T]
     :return: 装饰器
     :rtype: Callable[[Callable_T], Callable_T]
     """
-    parameter_set = set(inspect.signature(func_for_compile).parameters.keys())
+    call = build_adapter(
+        func_for_compile, ("namespace", "file_namespace", "env", "c_conf", "g_conf"), passthrough=True
+    )
 
     @functools.wraps(func_for_compile)
     def compile_func_wrapper(
@@ -138,7 +173,7 @@ def register_func(func_for_compile: Callable[..., str]) -> Callable[[Callable_T]
             g_conf,
             namespace: str,
             file_namespace: str
-    ) -> str:
+    ) -> Commands:
         """
         包装编译用函数, 对参数和返回值进行处理
 
@@ -156,35 +191,24 @@ def register_func(func_for_compile: Callable[..., str]) -> Callable[[Callable_T]
         :type namespace: str
         :param file_namespace: 调用者文件命名空间
         :type file_namespace: str
-        :return: 编译出的命令字符串 (末尾自带换行符)
-        :rtype: str
+        :return: 编译出的命令 (返回的字符串会被解析为命令, 为None或不以换行符结尾时补充换行符)
+        :rtype: Commands
         """
 
-        data = {
-            "namespace": namespace,
-            "file_namespace": file_namespace,
-
-            "env": env,
-            "c_conf": c_conf,
-            "g_conf": g_conf
-        }
-
-        optional_parameters = set(data.keys())
-        required_parameters = parameter_set & optional_parameters
-
-        required_kwargs = {k: data[k] for k in required_parameters}
-
-        command = func_for_compile(*args, **kwargs, **required_kwargs)
+        command = call(args, kwargs, namespace, file_namespace, env, c_conf, g_conf)
         if command is None:
             command = '\n'
 
+        if isinstance(command, (Command, Commands)):
+            return Commands.coerce(command)
+
         if type(command) is not str:
             raise TypeError(f"invalid return type {type(command)}")
 
         if not command.endswith('\n'):
             command += '\n'
 
-        return command
+        return parse_commands(command)
 
     def decorator(func_for_python: Callable_T) -> Callable_T:
         """
@@ -243,8 +267,19 @@ def init_template(name: str, env: ABCEnvironment, c_conf: CompileConfiguration,
     :return: None
     :rtype: None
     """
+    from BreakPointTools import BreakPointProcessor
+
     module = importlib.import_module(name)
 
+    # 只把该模板文件注册的模板函数和断点处理函数复制到编译环境中
+    prefix = f"{module.__name__}\\module."
+    for func_name, func in template_funcs.items():
+        if func_name.startswith(prefix):
+            env.template_funcs[func_name] = func
+    for processor_name, processor in BreakPointProcessor.items():
+        if (processor.__module__ == module.__name__) and (processor_name not in env.breakpoint_processors):
+            env.breakpoint_processors[processor_name] = processor
+
     if not hasattr(module, "init"):
         return None
 
@@ -260,6 +295,71 @@ def init_template(name: str, env: ABCEnvironment, c_conf: CompileConfiguration,
     module.init(**{k: data[k] for k in required_parameters})
 
 
+def _call_macro_template(
+        env: ABCEnvironment,
+        c_conf: CompileConfiguration,
+        g_conf: GlobalConfiguration,
+        template_commands: Commands,
+        arguments: tuple,
+        namespace: str,
+        file_namespace: str) -> Commands:
+    """
+    将包含函数宏命令的模板函数输出写入单独的函数, 并通过 function ... with storage 传入参数
+
+    :param env: 运行环境
+    :type env: Environment
+    :param c_conf: 编译配置
+    :type c_conf: CompileConfiguration
+    :param g_conf: 全局配置
+    :type g_conf: GlobalConfiguration
+    :param template_commands: 模板函数生成的命令
+    :type template_commands: Commands
+    :param arguments: 传入模板函数的参数
+    :type arguments: tuple
+    :param namespace: 调用所在命名空间
+    :type namespace: str
+    :param file_namespace: 调用所在文件命名空间
+    :type file_namespace: str
+    :return: 生成的命令
+    :rtype: Commands
+    """
+    if not c_conf.MACRO_SUPPORTED:
+        raise Exception(f"目标版本 {'.'.join(map(str, c_conf.TARGET_VERSION))} 不支持函数宏 (需要1.20.2+)")
+
+    macro_id = env.newID("Template.Call.Macro")
+    macro_path = f"{g_conf.DS_MACRO_ARGS}.template{macro_id}"
+
+    # 注册路径
+    f_ns, f_name = file_namespace.rsplit('\\', maxsplit=1)
+    if ".macro" not in env.file_ns_getter(f_name, f_ns, ret_raw=True)[0]:
+        env.file_ns_setter(
+            ".macro", join_file_ns(file_namespace, ".macro"),
+            file_namespace,
+            "macro", "folder", namespace
+        )
+        env.mkdirs_file_ns(file_namespace, ".macro")
+    macro_file_ns = join_file_ns(file_namespace, ".macro", f"{macro_id}.mcfunction")
+    env.file_ns_setter(
+        f"{macro_id}.mcfunction", macro_file_ns,
+        join_file_ns(file_namespace, ".macro"),
+        "macro", "mcfunction", namespace
+    )
+    with env.writeable_file_namespace(macro_file_ns, namespace) as f:
+        f.write(template_commands)
+
+    commands = Commands()
+    commands += env.COMMENT("Template.Call:传递函数宏参数")
+    for arg in arguments:
+        if not isinstance(arg, ArgData):
+            continue
+        commands += ExecuteStoreStorage(
+            g_conf.DS_ROOT, f"{macro_path}.{arg.macro_key}", ScoreGet(ScoreRef(arg.code, arg.objective))
+        )
+    func_path = env.ns_join_base(join_file_ns(file_namespace, ".macro", str(macro_id))).replace('\\', '/')
+    commands += FunctionCall(func_path, (g_conf.DS_ROOT, macro_path))
+    return commands
+
+
 def call_template(
         env: ABCEnvironment,
         c_conf: CompileConfiguration,
@@ -267,7 +367,7 @@ def call_template(
         template_func_name: str,
         node: ast.Call,
         namespace: str,
-        file_namespace: str) -> str:
+        file_namespace: str) -> Commands:
     """
     调用模板函数
 
@@ -285,21 +385,21 @@ def call_template(
     :type namespace: str
     :param file_namespace: 调用所在文件命名空间
     :type file_namespace: str
-    :return: 生成的MCF
-    :rtype: str
+    :return: 生成的命令
+    :rtype: Commands
     """
-    func = template_funcs[template_func_name]
-    commands = ''
+    func = env.template_funcs[template_func_name]
+    commands = Commands()
     commands += env.COMMENT(f"Template.Call:调用模板函数", func=template_func_name)
 
     args = []
     kwargs = {}
 
-    def _parse(value_node: Any) -> tuple[str, ArgData]:
+    def _parse(value_node: Any) -> tuple[Commands, ArgData]:
         if type(value_node) in {ast.Constant, ast.Dict, ast.Name}:
-            return '', _parse_node(g_conf, value_node, namespace)
+            return Commands(), _parse_node(g_conf, value_node, namespace)
         if type(value_node) not in env.code_generators:
-            return '', _parse_node(g_conf, value_node, namespace)
+            return Commands(), _parse_node(g_conf, value_node, namespace)
         cmd = env.COMMENT("Template.Call:计算参数值")
         cmd += env.generate_code(value_node, namespace, file_namespace)
 
@@ -328,11 +428,17 @@ def call_template(
         commands += cmds
         kwargs[kwarg.arg] = arg_data
 
-    commands += func(
+    template_commands = func(
         args, kwargs,
         env=env, c_conf=c_conf, g_conf=g_conf,
         namespace=namespace, file_namespace=file_namespace
     )
+    if any(isinstance(command, MacroCommand) for command in template_commands):
+        commands += _call_macro_template(
+            env, c_conf, g_conf, template_commands, (*args, *kwargs.values()), namespace, file_namespace
+        )
+    else:
+        commands += template_commands
     commands += env.COMMENT(f"Template.Call:调用模版函数结束")
     for arg in args:
         if not isinstance(arg, ArgData):
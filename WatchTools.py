@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# cython: language_level = 3
+"""
+监视源码和模板文件, 只重新编译受影响的入口文件
+"""
+
+import os
+import time
+import traceback
+from typing import Iterable
+
+from BatchCompiler import BatchCompiler
+from BatchCompiler import expand_entries
+from BatchCompiler import group_entries
+from BatchCompiler import print_results
+from Configuration import CompileConfiguration
+from DependencyTools import is_parent_path
+
+
+def snapshot_sources(*paths: str) -> dict[str, tuple[int, int]]:
+    """
+    记录文件夹下所有python文件的修改时间和大小
+
+    :param paths: 文件夹
+    :type paths: str
+    :return: {文件绝对路径: (修改时间, 大小)}
+    :rtype: dict[str, tuple[int, int]]
+    """
+    snapshot: dict[str, tuple[int, int]] = {}
+    for path in paths:
+        for root, _, files in os.walk(path):
+            for file in files:
+                if not file.endswith(".py"):
+                    continue
+                file_path = os.path.abspath(os.path.join(root, file))
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def changed_files(old: dict[str, tuple[int, int]], new: dict[str, tuple[int, int]]) -> set[str]:
+    """
+    比较两次快照, 获取新增, 删除或修改过的文件
+
+    :param old: 旧快照
+    :type old: dict[str, tuple[int, int]]
+    :param new: 新快照
+    :type new: dict[str, tuple[int, int]]
+    :return: 文件绝对路径集合
+    :rtype: set[str]
+    """
+    return {path for path in old.keys() | new.keys() if old.get(path) != new.get(path)}
+
+
+class CompileWatcher:
+    """
+    轮询 READ_PATH 和 TEMPLATE_PATH, 文件变化时只重新编译修改过的模块及导入它们的入口文件
+
+    导入关系来自编译时 import_as 记录的 import_graph, 每次编译都在新的进程中进行
+    配合模块编译缓存使用时, 未修改的模块直接从缓存恢复, 内容未变化的文件不会被重写
+    """
+
+    def __init__(
+            self,
+            c_conf: CompileConfiguration,
+            entries: Iterable[str],
+            *,
+            jobs: int | None = None,
+            interval: float = 1.0
+    ) -> None:
+        """
+        初始化
+
+        :param c_conf: 编译配置 (建议设置 CACHE_PATH)
+        :type c_conf: CompileConfiguration
+        :param entries: 入口文件名或通配符
+        :type entries: Iterable[str]
+        :param jobs: 最大进程数
+        :type jobs: int | None
+        :param interval: 轮询间隔 (秒)
+        :type interval: float
+        :return: None
+        :rtype: None
+        """
+        self.c_conf = c_conf
+        self.entries = list(entries)
+        self.interval = interval
+        self.batch = BatchCompiler(c_conf, jobs, isolate=True)
+
+        self._snapshot: dict[str, tuple[int, int]] = {}
+
+    def _watched_paths(self) -> tuple[str, str]:
+        return self.c_conf.READ_PATH, self.c_conf.TEMPLATE_PATH
+
+    def affected_entries(self, changed: set[str]) -> list[str] | None:
+        """
+        获取受文件变化影响的入口文件
+
+        :param changed: 变化的文件绝对路径
+        :type changed: set[str]
+        :return: 受影响的入口文件名, 需要全部重新编译时返回None
+        :rtype: list[str] | None
+        """
+        # 模板之间的依赖不经过 import_as, 模板变化时全部重新编译
+        if any(is_parent_path(self.c_conf.TEMPLATE_PATH, path) for path in changed):
+            return None
+
+        entries = expand_entries(self.c_conf.READ_PATH, self.entries)
+        groups = group_entries(self.c_conf, entries)
+        if groups != self.batch.groups:
+            return None
+
+        importers: dict[str, set[str]] = {}
+        for importer, imported in self.batch.import_graph.items():
+            for path in imported:
+                importers.setdefault(path, set()).add(importer)
+
+        dirty = set(changed)
+        waiting = list(changed)
+        while waiting:
+            for importer in importers.get(waiting.pop(), ()):
+                if importer not in dirty:
+                    dirty.add(importer)
+                    waiting.append(importer)
+
+        return [
+            entry for entry in entries
+            if os.path.abspath(os.path.join(self.c_conf.READ_PATH, f"{entry}.py")) in dirty
+        ]
+
+    def build(self, only: list[str] | None = None) -> dict[str, bool]:
+        """
+        编译入口文件
+
+        :param only: 仅编译这些入口文件所在的编译组, 为None时全部编译
+        :type only: list[str] | None
+        :return: {入口文件名: 是否编译成功}
+        :rtype: dict[str, bool]
+        """
+        start_t = time.time()
+        results = self.batch.compile(self.entries, only)
+        print_results(results)
+        print(f"[WATCH] 编译耗时{time.time() - start_t:.3f}秒")
+        return results
+
+    def poll(self) -> bool:
+        """
+        检查一次文件变化, 有变化时重新编译受影响的入口文件
+
+        :return: 是否有文件变化
+        :rtype: bool
+        """
+        snapshot = snapshot_sources(*self._watched_paths())
+        changed = changed_files(self._snapshot, snapshot)
+        if not changed:
+            return False
+        self._snapshot = snapshot
+
+        for path in sorted(changed):
+            print(f"[WATCH] 文件变化: {path}")
+
+        affected = self.affected_entries(changed)
+        if affected is None:
+            print("[WATCH] 重新编译全部入口文件")
+            self.build()
+        elif affected:
+            print(f"[WATCH] 重新编译: {', '.join(affected)}")
+            self.build(affected)
+        else:
+            print("[WATCH] 没有受影响的入口文件")
+        return True
+
+    def run(self) -> None:
+        """
+        编译全部入口文件, 然后持续监视文件变化直到 KeyboardInterrupt
+
+        :return: None
+        :rtype: None
+        """
+        self._snapshot = snapshot_sources(*self._watched_paths())
+        self.build()
+        print(f"[WATCH] 正在监视 {', '.join(self._watched_paths())} (Ctrl+C 退出)")
+
+        while True:
+            try:
+                time.sleep(self.interval)
+                self.poll()
+            except KeyboardInterrupt:
+                break
+            except Exception:
+                traceback.print_exc()
+
+
+__all__ = (
+    "snapshot_sources",
+    "changed_files",
+    "CompileWatcher",
+)
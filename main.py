@@ -1,17 +1,79 @@
 # -*- coding: utf-8 -*-
+import argparse
+import tempfile
+
+from BatchCompiler import BatchCompiler
+from BatchCompiler import print_results
 from Compiler import Compiler
 from Configuration import CompileConfiguration
 from Environment import Environment
+from WatchTools import CompileWatcher
+
+
+def _parse_version(text: str) -> tuple[int, int, int]:
+    try:
+        version = tuple(int(part) for part in text.split('.'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的版本号: {text}")
+    if not 2 <= len(version) <= 3:
+        raise argparse.ArgumentTypeError(f"无效的版本号: {text}")
+    return (*version, 0)[:3]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="将Python代码编译成Minecraft Function")
+    parser.add_argument(
+        "entries", nargs='*',
+        help="入口文件名 (不含.py后缀) 或通配符, 例如: func_add \"*\"; 传入多个时使用进程池批量编译"
+    )
+    parser.add_argument("-r", "--read-path", default="./tests", help="源码文件夹")
+    parser.add_argument("-o", "--save-path", default="./.output/", help="编译后的文件保存路径")
+    parser.add_argument("-n", "--base-namespace", default="source_code:", help="命名空间前缀")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="批量编译时的最大进程数, 默认为CPU核心数")
+    parser.add_argument("--cache-path", default=None, help="模块编译缓存文件夹, 不传入时不使用缓存")
+    parser.add_argument(
+        "--profile-path", default=None, help="编译性能分析结果保存文件夹 (JSON统计和Chrome Trace), 不传入时不进行性能分析"
+    )
+    parser.add_argument("--watch", action="store_true", help="持续监视源码和模板文件, 只重新编译受影响的入口文件")
+    parser.add_argument("--interval", type=float, default=1.0, help="监视模式的轮询间隔 (秒)")
+    parser.add_argument("--no-optimize", action="store_true", help="不对生成的命令进行优化")
+    parser.add_argument(
+        "--local-frame", action="store_true", help="调用函数时将局部变量打包为一个复合标签保存 (每次调用只压入和弹出一次)"
+    )
+    parser.add_argument(
+        "--target-version", type=_parse_version, default=(1, 16, 5),
+        help="目标Minecraft版本, 例如: 1.20.2 (1.20.2+ 通过函数宏传递函数参数)"
+    )
+    parser.add_argument("--no-debug", action="store_true", help="关闭调试模式 (不打印编译耗时和调试信息)")
+    return parser.parse_args(argv)
 
 
 def main():
-    save_path = "./.output/"
+    args = parse_args()
+    save_path = args.save_path
+    cache_path = args.cache_path
+    if args.watch and cache_path is None:
+        cache_path = tempfile.mkdtemp(prefix="mcfc-cache-")
     # save_path = r"D:\game\Minecraft\.minecraft\versions\1.16.5投影\saves\函数\datapacks\函数测试\data\source_code\functions"
 
-    read_path = "./tests"
-    file_name = "func_add"
+    compile_configuration = CompileConfiguration(
+        args.base_namespace, args.read_path, save_path, debug_mode=not args.no_debug,
+        cache_path=cache_path, profile_path=args.profile_path, optimize=not args.no_optimize,
+        local_frame=args.local_frame, target_version=args.target_version
+    )
+
+    if args.watch:
+        CompileWatcher(
+            compile_configuration, args.entries or ["func_add"], jobs=args.jobs, interval=args.interval
+        ).run()
+        return
+
+    if len(args.entries) > 1 or any(c in entry for entry in args.entries for c in "*?["):
+        print_results(BatchCompiler(compile_configuration, args.jobs).compile(args.entries))
+        return
+
+    file_name = args.entries[0] if args.entries else "func_add"
 
-    compile_configuration = CompileConfiguration("source_code:", read_path, save_path, debug_mode=True)
     environment = Environment(compile_configuration)
 
     compiler = Compiler(environment)
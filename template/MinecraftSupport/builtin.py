@@ -9,11 +9,13 @@ import json
 from typing import Any
 
 from ABCTypes import ABCEnvironment
-from BreakPointTools import BreakPointFlag
 from BreakPointTools import raiseBreakPoint
 from BreakPointTools import register_processor
+from CommandTypes import BreakPointMarker
+from CommandTypes import Commands
+from CommandTypes import FunctionCall
+from CommandTypes import RawCommand
 from Configuration import GlobalConfiguration
-from DebuggingTools import FORCE_COMMENT
 from ScoreboardTools import CHECK_SB
 from ScoreboardTools import SBCheckType
 from ScoreboardTools import SBCompareType
@@ -25,8 +27,9 @@ from Template import register_func
 print_end: bool = True
 
 
-def _tprint(*objects, sep: str = ' ', end: str = '\n'):
-    global print_end
+def _tprint(*objects, env: ABCEnvironment, sep: str = ' ', end: str = '\n'):
+    # 编译时的换行状态保存在编译环境中, print_end 只用于python环境
+    state = env.template_states.setdefault(__name__, {"print_end": True})
 
     if not isinstance(sep, str):
         raise TypeError("sep must be str")
@@ -35,7 +38,7 @@ def _tprint(*objects, sep: str = ' ', end: str = '\n'):
         raise TypeError("end must be str")
 
     obj_json: list[dict] = []
-    if not print_end:
+    if not state["print_end"]:
         obj_json.append({"text": '↳'})
 
     for obj in objects:
@@ -51,7 +54,7 @@ def _tprint(*objects, sep: str = ' ', end: str = '\n'):
 
     if '\n' not in end:
         obj_json.append({"text": '↴'})
-        print_end = False
+        state["print_end"] = False
     else:
         safe_end = end.replace('\n', '')
         obj_json.append({"text": safe_end})
@@ -59,9 +62,7 @@ def _tprint(*objects, sep: str = ' ', end: str = '\n'):
     json_text = json.dumps({"text": '', "extra": obj_json})
     if '\n' in json_text:
         raise Exception("json text must not contain '\\n'")
-    command = f"tellraw @a {json_text}\n"
-
-    return command
+    return RawCommand(f"tellraw @a {json_text}")
 
 
 @register_func(_tprint)
@@ -118,13 +119,13 @@ def _sbp_breakpoint(
         objective: str
 ):
     def _process_raise():
-        command = ''
+        command = Commands()
         keep_raise = True
-        command += FORCE_COMMENT(BreakPointFlag(
+        command += BreakPointMarker(
             "breakpoint",
             name=name,
             objective=objective
-        ))
+        )
         if level == "module":
             command += env.COMMENT("BP:breakpoint.Reset")
             command += SB_RESET(name, objective)
@@ -133,14 +134,14 @@ def _sbp_breakpoint(
         return command, keep_raise
 
     def _process_split():
-        command = ''
+        command = Commands()
         command += env.COMMENT("BP:breakpoint.Split")
         command += CHECK_SB(
             SBCheckType.UNLESS,
             name, objective,
             SBCompareType.EQUAL,
             g_conf.Flags.TRUE, g_conf.SB_FLAGS,
-            f"function {func_path}"
+            FunctionCall(func_path)
         )
         continue_json = {
             "text": '',
@@ -163,7 +164,7 @@ def _sbp_breakpoint(
             ]
         }
 
-        command += f"tellraw @a {json.dumps(continue_json)}\n"
+        command += RawCommand(f"tellraw @a {json.dumps(continue_json)}")
         return command
 
     if func_path is None:
@@ -174,7 +175,7 @@ def _sbp_breakpoint(
 
 
 def _tbreakpoint(*, g_conf: GlobalConfiguration, env: ABCEnvironment, file_namespace: str):
-    command = ''
+    command = Commands()
 
     breakpoint_id = f"BreakPoint:{file_namespace}\\{env.newID("tbreakpoint")}"
 
@@ -183,11 +184,11 @@ def _tbreakpoint(*, g_conf: GlobalConfiguration, env: ABCEnvironment, file_names
         breakpoint_id, g_conf.SB_TEMP,
         g_conf.Flags.TRUE, g_conf.SB_FLAGS
     )
-    command += FORCE_COMMENT(BreakPointFlag(
+    command += BreakPointMarker(
         "breakpoint",
         name=breakpoint_id,
         objective=g_conf.SB_TEMP
-    ))
+    )
     raiseBreakPoint(env, file_namespace, "breakpoint", name=breakpoint_id, objective=g_conf.SB_TEMP)
 
     return command
@@ -5,6 +5,7 @@
 对计分板操作的支持
 """
 
+from CommandTypes import Commands
 from Configuration import GlobalConfiguration
 from ScoreboardTools import SB_ASSIGN
 from ScoreboardTools import SB_CONSTANT
@@ -12,12 +13,9 @@ from ScoreboardTools import init_name
 from Template import ArgData
 from Template import register_func
 
-SB_MAP: dict[str, dict[str, int]] = {}
 
-
-def init(g_conf: GlobalConfiguration):
-    global SB_MAP
-    SB_MAP = {
+def _default_sb_map(g_conf: GlobalConfiguration) -> dict[str, dict[str, int]]:
+    return {
         g_conf.SB_FLAGS: {
             g_conf.Flags.TRUE: 1,
             g_conf.Flags.FALSE: 0,
@@ -31,6 +29,10 @@ def init(g_conf: GlobalConfiguration):
     }
 
 
+# python环境下的计分板, 导入时初始化一次, 编译时不会修改
+SB_MAP: dict[str, dict[str, int]] = _default_sb_map(GlobalConfiguration())
+
+
 def _get_default(self: dict, key: str, default):
     if key in self:
         return self[key]
@@ -42,7 +44,7 @@ def _get_score(name: str, objective: str, *, g_conf: GlobalConfiguration, namesp
     if namespace is None:
         raise ValueError("namespace is None")
 
-    command = ''
+    command = Commands()
 
     init_name(name, objective)
     command += SB_ASSIGN(
@@ -65,7 +67,7 @@ def get_score(name: str, objective: str):
 
 
 def _write_score(name: str, objective: str, value: int, *, g_conf: GlobalConfiguration, namespace: str):
-    command = ''
+    command = Commands()
 
     if isinstance(value, ArgData):
         command += value.toResult(f"{namespace}{g_conf.ResultExt}", g_conf.SB_TEMP)
@@ -0,0 +1,4 @@
+import mult
+from template.MinecraftSupport.builtin import tprint
+
+tprint(mult.area(1, 2), mult.area(3, 4))
@@ -0,0 +1,5 @@
+import scale
+
+
+def area(w, h):
+    return scale.scale(w, h) * 3